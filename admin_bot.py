@@ -1,5 +1,8 @@
+import csv
+import io
 import os
 import logging
+import tempfile
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import (
     Application,
@@ -10,27 +13,42 @@ from telegram.ext import (
     filters,
     ConversationHandler
 )
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from bot import Base, Payment, VPNKey
+from db import init_db, run_db
+from logging_setup import setup_logging
+from notifier import get_notifier, shutdown_notifiers
+from launch import TELEGRAM_API_URL, run_application
+from update_processor import update_processor_for
+import repository
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timedelta
+from cache import TTLCache
 
 # Загрузка переменных окружения
 load_dotenv()
 
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# Настройка логирования: запись в файл и консоль идет через очередь в отдельном потоке
+setup_logging({'': 'logs/admin_bot.log'})
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+# Инициализируем базу данных при запуске
+init_db()
 
 # Состояния для ConversationHandler
 WAITING_KEY = 1
 
-# Создание базы данных
-engine = create_engine('sqlite:///vpn_keys.db')
-Session = sessionmaker(bind=engine)
+# Сколько пачек загрузки ключей перечислять в ответе
+KEY_BATCHES_SHOWN = 20
+
+# Сколько ожидающих платежей показывать за раз
+PENDING_PAGE_SIZE = int(os.getenv('PENDING_PAGE_SIZE', '1'))
+
+# Статистика: глубина рядов по дням, цена подписки для выручки и время жизни кэша
+STATS_DAYS = 30
+PAYMENT_PRICE = int(os.getenv('PAYMENT_PRICE', '200'))
+SPARK_CHARS = '▁▂▃▄▅▆▇█'
+# Готовый ответ статистики и число ключей для заголовков списков; действия
+# админа в этом процессе сбрасывают их сразу
+stats_cache = TTLCache(maxsize=2, ttl=float(os.getenv('STATS_CACHE_TTL', '30')))
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if str(update.effective_user.id) != os.getenv('ADMIN_ID'):
@@ -50,43 +68,82 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup=reply_markup
     )
 
-async def show_pending_payments(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    session = Session()
-    pending_payments = session.query(Payment).filter_by(status='pending').all()
+def _next_payment_button(payment_id: int) -> InlineKeyboardButton:
+    return InlineKeyboardButton("▶️ Следующий платеж", callback_data=f"pending_next:{payment_id}")
+
+async def show_pending_payments(update: Update, context: ContextTypes.DEFAULT_TYPE, after_id: int = None):
+    """Очередь ожидающих платежей: PENDING_PAGE_SIZE платежей по дате, затем кнопка перехода дальше"""
+    pending_payments, has_more, pending_count = await run_db(
+        repository.get_pending_payments_page, after_id, PENDING_PAGE_SIZE
+    )
     
     if not pending_payments:
+        if after_id is not None and pending_count:
+            # Дошли до конца, но пропущенные платежи еще ждут
+            await update.callback_query.message.reply_text(
+                f"📭 *Дальше платежей нет\.* В очереди осталось: `{pending_count}`",
+                parse_mode='MarkdownV2',
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("🔁 С начала очереди", callback_data="show_payments")
+                ]])
+            )
+            return
         await update.callback_query.message.reply_text(
             "📭 *Нет ожидающих подтверждения платежей\.*",
             parse_mode='MarkdownV2'
         )
         return
 
-    for payment in pending_payments:
+    for index, payment in enumerate(pending_payments):
         keyboard = [
             [
                 InlineKeyboardButton("✅ Подтвердить", callback_data=f"approve_{payment.id}"),
                 InlineKeyboardButton("❌ Отклонить", callback_data=f"reject_{payment.id}")
             ]
         ]
+        if has_more and index == len(pending_payments) - 1:
+            keyboard.append([_next_payment_button(payment.id)])
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        try:
-            with open(payment.receipt_path, 'rb') as photo:
-                await update.callback_query.message.reply_photo(
-                    photo=photo,
-                    caption=f"📨 *Новый платеж*\n\n"
-                           f"👤 *Пользователь:* `{payment.user_id}`\n"
-                           f"🆔 *ID платежа:* `{payment.id}`\n"
-                           f"📊 *Статус:* Ожидает подтверждения",
-                    parse_mode='MarkdownV2',
-                    reply_markup=reply_markup
+        caption = (
+            f"📨 *Новый платеж*\n\n"
+            f"👤 *Пользователь:* `{payment.user_id}`\n"
+            f"🆔 *ID платежа:* `{payment.id}`\n"
+            f"📊 *Статус:* Ожидает подтверждения\n"
+            f"📋 *В очереди:* `{pending_count}`"
+        )
+        receipt_found = True
+        if payment.admin_receipt_file_id:
+            # Чек уже загружен в админ-бота, отправляем по ссылке
+            await update.callback_query.message.reply_photo(
+                photo=payment.admin_receipt_file_id,
+                caption=caption,
+                parse_mode='MarkdownV2',
+                reply_markup=reply_markup
+            )
+        elif payment.receipt_path is not None:
+            # Старые платежи и платежи, уведомление о которых не отправилось: чек есть только на диске
+            try:
+                with open(payment.receipt_path, 'rb') as photo:
+                    message = await update.callback_query.message.reply_photo(
+                        photo=photo,
+                        caption=caption,
+                        parse_mode='MarkdownV2',
+                        reply_markup=reply_markup
+                    )
+            except FileNotFoundError:
+                receipt_found = False
+            else:
+                await run_db(
+                    repository.set_receipt_info,
+                    payment.id,
+                    admin_receipt_file_id=message.photo[-1].file_id
                 )
-        except FileNotFoundError:
+        else:
+            receipt_found = False
+        if not receipt_found:
             await update.callback_query.message.reply_text(
-                f"📨 *Новый платеж*\n\n"
-                f"👤 *Пользователь:* `{payment.user_id}`\n"
-                f"🆔 *ID платежа:* `{payment.id}`\n"
-                f"📊 *Статус:* Ожидает подтверждения\n"
+                f"{caption}\n"
                 f"❌ *Ошибка:* Чек не найден",
                 parse_mode='MarkdownV2',
                 reply_markup=reply_markup
@@ -121,32 +178,42 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if query.data == "show_payments":
         await show_pending_payments(update, context)
+    elif query.data.startswith("pending_next:"):
+        await show_pending_payments(update, context, after_id=int(query.data.split(':')[1]))
     elif query.data == "manage_keys":
         await show_keys_management(update, context)
     elif query.data == "show_stats":
         await show_keys_statistics(update, context)
     elif query.data == "list_all_keys":
-        await list_all_keys(update, context)
+        await show_keys_page(update, context, 'all')
     elif query.data == "list_free_keys":
-        await list_free_keys(update, context)
+        await show_keys_page(update, context, 'free')
     elif query.data == "list_used_keys":
-        await list_used_keys(update, context)
+        await show_keys_page(update, context, 'used')
+    elif query.data.startswith("keys:"):
+        _, kind, direction, key_id = query.data.split(':')
+        if direction == 'n':
+            await show_keys_page(update, context, kind, after_id=int(key_id))
+        else:
+            await show_keys_page(update, context, kind, before_id=int(key_id))
+    elif query.data.startswith("keys_export:"):
+        await export_keys(update, context, query.data.split(':')[1])
     elif query.data.startswith("approve_") or query.data.startswith("reject_"):
         action, payment_id = query.data.split('_')
         payment_id = int(payment_id)
         await handle_payment_action(update, context, action, payment_id)
 
 async def handle_payment_action(update: Update, context: ContextTypes.DEFAULT_TYPE, action: str, payment_id: int):
-    session = Session()
-    payment = session.query(Payment).filter_by(id=payment_id).first()
-    
-    if not payment:
-        await update.callback_query.message.reply_text("❌ *Платеж не найден\.*", parse_mode='MarkdownV2')
-        return
-
     if action == "approve":
-        # Проверяем наличие свободного ключа
-        available_key = session.query(VPNKey).filter_by(is_used=False).first()
+        # Подтверждаем платеж и выдаем свободный ключ
+        payment, available_key = await run_db(repository.approve_payment, payment_id)
+        stats_cache.clear()
+        if not payment:
+            await update.callback_query.message.reply_text("❌ *Платеж не найден\.*", parse_mode='MarkdownV2')
+            return
+        if not available_key and payment.status != 'pending':
+            await update.callback_query.message.reply_text("⚠️ *Платеж уже обработан\.*", parse_mode='MarkdownV2')
+            return
         if not available_key:
             await update.callback_query.message.reply_text(
                 "❌ *Ошибка\! Нет доступных ключей\.*\n"
@@ -155,38 +222,12 @@ async def handle_payment_action(update: Update, context: ContextTypes.DEFAULT_TY
             )
             return
 
-        # Обновляем статус платежа
-        payment.status = 'approved'
-        
         # Генерируем email для x-ui
         email = f"user_{payment.user_id}@amegavpn.com"
         
-        # Выдаем ключ пользователю
-        available_key.is_used = True
-        available_key.user_id = payment.user_id
-        available_key.username = payment.username
-        available_key.phone = payment.phone
-        # Извлекаем идентификатор для x-ui
-        key = available_key.key
-        identifier = key.split('#')[-1] if '#' in key else None
-        if identifier and identifier.startswith('AmegaVPN-'):
-            identifier = identifier[len('AmegaVPN-'):]
-        available_key.xui_email = identifier
-        # Извлекаем xui_id (между '://' и '@')
-        xui_id = None
-        try:
-            xui_id = key.split('://')[1].split('@')[0]
-        except Exception:
-            pass
-        available_key.xui_id = xui_id
-        available_key.activation_date = datetime.utcnow()
-        available_key.expiration_date = payment.next_payment_date
-        
-        session.commit()
-        
         # Отправляем уведомление пользователю через основной бот
         try:
-            main_bot = Application.builder().token(os.getenv('TELEGRAM_TOKEN')).build()
+            main_bot = get_notifier(os.getenv('TELEGRAM_TOKEN'))
             
             # Создаем кнопку для копирования ключа
             keyboard = [[
@@ -209,7 +250,7 @@ async def handle_payment_action(update: Update, context: ContextTypes.DEFAULT_TY
                 f"📅 *Срок действия:* до {expiration_date}"
             )
             
-            await main_bot.bot.send_message(
+            await main_bot.send_message(
                 chat_id=payment.user_id,
                 text=key_message,
                 parse_mode='MarkdownV2',
@@ -219,7 +260,7 @@ async def handle_payment_action(update: Update, context: ContextTypes.DEFAULT_TY
             logging.error(f"Ошибка при отправке уведомления пользователю: {e}")
             # Отправляем сообщение без кнопки в случае ошибки
             try:
-                await main_bot.bot.send_message(
+                await main_bot.send_message(
                     chat_id=payment.user_id,
                     text=key_message,
                     parse_mode='MarkdownV2'
@@ -249,16 +290,19 @@ async def handle_payment_action(update: Update, context: ContextTypes.DEFAULT_TY
         
         await update.callback_query.message.edit_caption(
             caption=caption,
-            parse_mode='MarkdownV2'
+            parse_mode='MarkdownV2',
+            reply_markup=InlineKeyboardMarkup([[_next_payment_button(payment.id)]])
         )
     else:
-        payment.status = 'rejected'
-        session.commit()
+        payment = await run_db(repository.set_payment_status, payment_id, 'rejected')
+        stats_cache.clear()
+        if not payment:
+            await update.callback_query.message.reply_text("❌ *Платеж не найден\.*", parse_mode='MarkdownV2')
+            return
         
         # Отправляем уведомление пользователю через основной бот
         try:
-            main_bot = Application.builder().token(os.getenv('TELEGRAM_TOKEN')).build()
-            await main_bot.bot.send_message(
+            await get_notifier(os.getenv('TELEGRAM_TOKEN')).send_message(
                 chat_id=payment.user_id,
                 text="❌ *Платеж отклонен\!*\n\n"
                      "Пожалуйста, проверьте правильность оплаты и попробуйте снова или обратитесь в техподдержку\.",
@@ -283,88 +327,151 @@ async def handle_payment_action(update: Update, context: ContextTypes.DEFAULT_TY
         
         await update.callback_query.message.edit_caption(
             caption=caption,
-            parse_mode='MarkdownV2'
+            parse_mode='MarkdownV2',
+            reply_markup=InlineKeyboardMarkup([[_next_payment_button(payment.id)]])
         )
 
-async def list_all_keys(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    session = Session()
-    keys = session.query(VPNKey).all()
-    
-    if not keys:
-        await update.callback_query.message.reply_text(
-            "❌ *Нет доступных ключей\.*",
-            parse_mode='MarkdownV2'
-        )
-        return
-
-    message = "📋 *Список всех ключей:*\n\n"
-    for key in keys:
-        status = "✅ Свободен" if not key.is_used else "🔒 Использован"
-        message += f"🆔 *ID:* `{key.id}`\n"
-        message += f"🔑 *Ключ:* `{key.key}`\n"
-        message += f"📊 *Статус:* {status}\n\n"
-
-    await update.callback_query.message.reply_text(
-        message,
-        parse_mode='MarkdownV2'
+# Списки ключей: фильтр по is_used, заголовок и текст для пустого списка
+KEY_LISTS = {
+    'all': (None, "📋 *Список всех ключей*", "❌ *Нет доступных ключей\.*"),
+    'free': (False, "🔍 *Список свободных ключей*", "❌ *Нет свободных ключей\.*"),
+    'used': (True, "🔒 *Список использованных ключей*", "❌ *Нет использованных ключей\.*"),
+}
+
+def _code(text) -> str:
+    """Экранирование для `моноширинного` фрагмента MarkdownV2"""
+    return str(text).replace('\\', '\\\\').replace('`', '\\`')
+
+async def show_keys_page(update: Update, context: ContextTypes.DEFAULT_TYPE, kind: str,
+                         after_id: int = None, before_id: int = None):
+    """Страница списка ключей с кнопками ◀️/▶️; навигация редактирует то же сообщение"""
+    is_used, title, empty_text = KEY_LISTS[kind]
+    rows, has_prev, has_next = await run_db(
+        repository.list_keys_page, is_used, after_id=after_id, before_id=before_id
     )
-
-async def list_free_keys(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    session = Session()
-    keys = session.query(VPNKey).filter_by(is_used=False).all()
-    
-    if not keys:
-        await update.callback_query.message.reply_text(
-            "❌ *Нет свободных ключей\.*",
-            parse_mode='MarkdownV2'
-        )
+    message = update.callback_query.message
+    navigating = after_id is not None or before_id is not None
+
+    if not rows:
+        if navigating:
+            await message.edit_text(empty_text, parse_mode='MarkdownV2')
+        else:
+            await message.reply_text(empty_text, parse_mode='MarkdownV2')
         return
 
-    message = "🔍 *Список свободных ключей:*\n\n"
-    for key in keys:
-        message += f"🆔 *ID:* `{key.id}`\n"
-        message += f"🔑 *Ключ:* `{key.key}`\n\n"
-
-    await update.callback_query.message.reply_text(
-        message,
-        parse_mode='MarkdownV2'
-    )
-
-async def list_used_keys(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    session = Session()
-    keys = session.query(VPNKey).filter_by(is_used=True).all()
-    
-    if not keys:
-        await update.callback_query.message.reply_text(
-            "❌ *Нет использованных ключей\.*",
-            parse_mode='MarkdownV2'
-        )
-        return
+    # Подсчет проходит по всему индексу, поэтому ◀️/▶️ берут число из кэша
+    counts = stats_cache.get('key_counts')
+    if counts is None:
+        counts = await run_db(repository.count_keys)
+        stats_cache.set('key_counts', counts)
+    total_keys, used_keys = counts
+    count = {'all': total_keys, 'free': total_keys - used_keys, 'used': used_keys}[kind]
+
+    text = f"{title} \\(всего {count}\\):\n\n"
+    for row in rows:
+        text += f"🆔 *ID:* `{row.id}`\n"
+        text += f"🔑 *Ключ:* `{_code(row.key)}`\n"
+        if kind == 'all':
+            text += f"📊 *Статус:* {'🔒 Использован' if row.is_used else '✅ Свободен'}\n"
+        elif kind == 'used':
+            text += f"👤 *Пользователь:* `{row.user_id}`\n"
+        text += "\n"
+
+    navigation = []
+    if has_prev:
+        navigation.append(InlineKeyboardButton("◀️", callback_data=f"keys:{kind}:p:{rows[0].id}"))
+    if has_next:
+        navigation.append(InlineKeyboardButton("▶️", callback_data=f"keys:{kind}:n:{rows[-1].id}"))
+    keyboard = [navigation] if navigation else []
+    keyboard.append([InlineKeyboardButton("📄 Выгрузить CSV", callback_data=f"keys_export:{kind}")])
+    reply_markup = InlineKeyboardMarkup(keyboard)
 
-    message = "🔒 *Список использованных ключей:*\n\n"
-    for key in keys:
-        message += f"🆔 *ID:* `{key.id}`\n"
-        message += f"🔑 *Ключ:* `{key.key}`\n"
-        message += f"👤 *Пользователь:* `{key.user_id}`\n\n"
+    if navigating:
+        await message.edit_text(text, parse_mode='MarkdownV2', reply_markup=reply_markup)
+    else:
+        await message.reply_text(text, parse_mode='MarkdownV2', reply_markup=reply_markup)
+
+def _write_keys_csv(path: str, is_used: bool = None) -> int:
+    """Пишет ключи в CSV построчно, не загружая весь список в память"""
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['id', 'key', 'is_used', 'user_id', 'username', 'xui_email',
+                         'location', 'activation_date', 'expiration_date'])
+        for row in repository.iter_keys(is_used):
+            writer.writerow(row)
+            count += 1
+    return count
+
+async def export_keys(update: Update, context: ContextTypes.DEFAULT_TYPE, kind: str):
+    """Выгрузка всего списка ключей CSV-документом"""
+    is_used = KEY_LISTS[kind][0]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"keys_{kind}_{datetime.now():%Y%m%d_%H%M}.csv")
+        count = await run_db(_write_keys_csv, path, is_used)
+        with open(path, 'rb') as document:
+            await update.callback_query.message.reply_document(
+                document,
+                filename=os.path.basename(path),
+                caption=f"📄 Выгружено ключей: {count}"
+            )
 
-    await update.callback_query.message.reply_text(
-        message,
-        parse_mode='MarkdownV2'
+def _sparkline(values) -> str:
+    """Ряд значений в виде строки из символов ▁▂▃▄▅▆▇█"""
+    peak = max(values, default=0)
+    if not peak:
+        return SPARK_CHARS[0] * len(values)
+    return ''.join(SPARK_CHARS[round(value / peak * (len(SPARK_CHARS) - 1))] for value in values)
+
+def _daily_series(counts: dict, start: datetime, days: int) -> list:
+    """Значения по дням начиная со start; в counts ключи - даты YYYY-MM-DD"""
+    return [counts.get((start + timedelta(days=i)).date().isoformat(), 0) for i in range(days)]
+
+def _format_statistics(stats: dict, now: datetime) -> str:
+    keys = stats['keys']
+    payments = stats['payments']
+    usage = keys['used'] / keys['total'] * 100 if keys['total'] else 0.0
+    new_payments = _daily_series(stats['new_payments'], now - timedelta(days=STATS_DAYS - 1), STATS_DAYS)
+    approvals = _daily_series(stats['approvals'], now - timedelta(days=STATS_DAYS - 1), STATS_DAYS)
+    expiries = _daily_series(stats['expiries'], now, STATS_DAYS)
+    approved_total = payments.get('approved', 0)
+
+    expiry_days = "\n".join(
+        f"{(now + timedelta(days=i)):%d.%m} {count:>4}"
+        for i, count in enumerate(expiries) if count
+    ) or "нет"
+    return (
+        "📊 *Статистика AmegaVPN*\n\n"
+        "🔑 *Ключи*\n"
+        f"📦 Всего: `{keys['total']}`\n"
+        f"🔒 Использовано: `{keys['used']}`\n"
+        f"✅ Свободно: `{keys['free']}`\n"
+        f"📈 Процент использования: `{usage:.1f}%`\n\n"
+        "💳 *Платежи*\n"
+        f"⏳ Ожидают: `{payments.get('pending', 0)}`\n"
+        f"✅ Подтверждено: `{approved_total}`\n"
+        f"❌ Отклонено: `{payments.get('rejected', 0)}`\n"
+        f"💰 Выручка: `{approved_total * PAYMENT_PRICE} ₽`, "
+        f"за {STATS_DAYS} дней `{sum(approvals) * PAYMENT_PRICE} ₽`\n\n"
+        f"📅 *По дням за {STATS_DAYS} дней*\n"
+        "```\n"
+        f"новые  {_sparkline(new_payments)} {sum(new_payments)}\n"
+        f"подтв. {_sparkline(approvals)} {sum(approvals)}\n"
+        "```\n"
+        f"⌛ *Истекают в ближайшие {STATS_DAYS} дней:* `{sum(expiries)}`\n"
+        "```\n"
+        f"{_sparkline(expiries)}\n"
+        f"{expiry_days}\n"
+        "```"
     )
 
 async def show_keys_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    session = Session()
-    total_keys = session.query(VPNKey).count()
-    used_keys = session.query(VPNKey).filter_by(is_used=True).count()
-    free_keys = total_keys - used_keys
-
-    message = (
-        "📊 *Статистика ключей VPN:*\n\n"
-        f"📦 *Всего ключей:* `{total_keys}`\n"
-        f"🔒 *Использовано:* `{used_keys}`\n"
-        f"✅ *Свободно:* `{free_keys}`\n"
-        f"📈 *Процент использования:* `{(used_keys/total_keys*100):.1f}%`"
-    )
+    message = stats_cache.get('statistics')
+    if message is None:
+        now = datetime.utcnow()
+        stats = await run_db(repository.get_statistics, now, STATS_DAYS)
+        message = _format_statistics(stats, now)
+        stats_cache.set('statistics', message)
 
     await update.callback_query.message.reply_text(
         message,
@@ -374,39 +481,60 @@ async def show_keys_statistics(update: Update, context: ContextTypes.DEFAULT_TYP
 async def add_keys(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.callback_query.message.reply_text(
         "➕ *Добавление новых ключей*\n\n"
-        "Пожалуйста, отправьте список ключей VPN, каждый с новой строки\.",
+        "Пожалуйста, отправьте список ключей VPN, каждый с новой строки, "
+        "или файл \.txt для большого количества ключей\.",
         parse_mode='MarkdownV2'
     )
     return WAITING_KEY
 
+def _import_keys(lines):
+    """Загружает ключи и возвращает (итоговые счетчики, счетчики по пачкам)"""
+    batches = []
+    totals = repository.import_keys(lines, on_chunk=batches.append)
+    return totals, batches
+
+def _format_import_result(totals: dict, batches: list) -> str:
+    lines = [
+        f"✅ *Добавлено {totals['inserted']} новых ключей\.*",
+        f"Уже были в базе: {totals['duplicate']}",
+        f"Неверный формат: {totals['invalid']}",
+    ]
+    if len(batches) > 1:
+        lines.append("")
+        for number, counts in enumerate(batches[:KEY_BATCHES_SHOWN], start=1):
+            lines.append(
+                f"Пачка {number}: \+{counts['inserted']}, повторов {counts['duplicate']}, "
+                f"неверных {counts['invalid']}"
+            )
+        if len(batches) > KEY_BATCHES_SHOWN:
+            lines.append(f"\.\.\. и еще {len(batches) - KEY_BATCHES_SHOWN} пачек")
+    return "\n".join(lines)
+
 async def handle_new_keys(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not update.message.text:
+    if update.message.document:
+        # Файл скачивается в память, а декодируется и разбирается вместе с загрузкой в потоке БД
+        file = await update.message.document.get_file()
+        data = await file.download_as_bytearray()
+        lines = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8-sig', errors='replace')
+    elif update.message.text:
+        lines = update.message.text.splitlines()
+    else:
         await update.message.reply_text(
             "❌ *Ошибка\!*\n"
-            "Пожалуйста, отправьте список ключей\.",
+            "Пожалуйста, отправьте список ключей или файл \.txt\.",
             parse_mode='MarkdownV2'
         )
         return WAITING_KEY
 
-    keys = update.message.text.strip().split('\n')
-    session = Session()
-    added_count = 0
-
-    for key in keys:
-        key = key.strip()
-        if key:
-            try:
-                new_key = VPNKey(key=key, is_used=False)
-                session.add(new_key)
-                added_count += 1
-            except Exception as e:
-                logging.error(f"Ошибка при добавлении ключа {key}: {e}")
-
-    session.commit()
-    session.close()
+    totals, batches = await run_db(_import_keys, lines)
+    stats_cache.clear()
+    logging.info(
+        f"Загружены ключи: добавлено {totals['inserted']}, повторов {totals['duplicate']}, "
+        f"неверный формат {totals['invalid']}"
+    )
 
     await update.message.reply_text(
-        f"✅ *Добавлено {added_count} новых ключей\.*",
+        _format_import_result(totals, batches),
         parse_mode='MarkdownV2',
         reply_markup=InlineKeyboardMarkup([[
             InlineKeyboardButton("🔙 Назад", callback_data="manage_keys")
@@ -414,15 +542,25 @@ async def handle_new_keys(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return ConversationHandler.END
 
-def main():
-    # Создание приложения
-    application = Application.builder().token(os.getenv('ADMIN_BOT_TOKEN')).build()
+def build_application() -> Application:
+    """Создает приложение админ-бота со всеми обработчиками"""
+    application = (
+        Application.builder()
+        .token(os.getenv('ADMIN_BOT_TOKEN'))
+        .base_url(TELEGRAM_API_URL)
+        .concurrent_updates(update_processor_for('ADMIN_BOT'))  # Пользователи параллельно, каждый по очереди
+        .post_shutdown(shutdown_notifiers)  # Закрываем соединения уведомителя основного бота
+        .build()
+    )
 
     # Создание ConversationHandler для добавления ключей
     add_keys_handler = ConversationHandler(
         entry_points=[CallbackQueryHandler(add_keys, pattern="^add_keys$")],
         states={
-            WAITING_KEY: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_new_keys)]
+            WAITING_KEY: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_new_keys),
+                MessageHandler(filters.Document.FileExtension('txt'), handle_new_keys)
+            ]
         },
         fallbacks=[CommandHandler("start", start)]
     )
@@ -431,9 +569,11 @@ def main():
     application.add_handler(CommandHandler("start", start))
     application.add_handler(add_keys_handler)
     application.add_handler(CallbackQueryHandler(handle_callback))
+    return application
 
+def main():
     # Запуск бота
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    run_application(build_application(), 'ADMIN_BOT', 8444)
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
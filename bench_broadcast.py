@@ -0,0 +1,88 @@
+"""Пропускная способность рассылки на поддельном сервере Bot API.
+
+Сервер отвечает с задержкой 50 мс, часть чатов получает 429 (RetryAfter)
+или 403 (бот заблокирован). Сравнивается прежняя последовательная отправка
+и broadcast(); затем рассылка перезапускается, чтобы проверить продолжение
+по контрольным точкам. Запуск: python bench_broadcast.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from fake_bot_api import FakeBotApi, api_url, error, start_server
+
+MESSAGES = 300
+LATENCY = 0.05
+
+class SlowBotApi(FakeBotApi):
+    """Отвечает с задержкой, часть чатов получает 429 при первой попытке или 403"""
+    limited = set()
+    lock = threading.Lock()
+
+    def respond(self, method, params):
+        if method == 'getMe':
+            return super().respond(method, params)
+        time.sleep(LATENCY)
+        chat_id = int(params['chat_id'])
+        if chat_id % 97 == 0:
+            return error(403, 'Forbidden: bot was blocked by the user')
+        with SlowBotApi.lock:
+            first_attempt = chat_id not in SlowBotApi.limited
+            SlowBotApi.limited.add(chat_id)
+        if chat_id % 50 == 0 and first_attempt:
+            return error(429, 'Too Many Requests: retry after 1', retry_after=1)
+        return super().respond(method, params)
+
+def messages():
+    for chat_id in range(1, MESSAGES + 1):
+        yield chat_id, {'text': f'Напоминание для {chat_id}'}
+
+async def run(base_url):
+    from telegram import Bot
+    from telegram.request import HTTPXRequest
+    from broadcast import broadcast
+
+    bot = Bot('123:test', base_url=base_url,
+              request=HTTPXRequest(connection_pool_size=20, pool_timeout=30.0))
+    await bot.initialize()
+
+    started = time.perf_counter()
+    failed = 0
+    for chat_id, kwargs in messages():
+        try:
+            await bot.send_message(chat_id=chat_id, **kwargs)
+        except Exception:
+            failed += 1
+    elapsed = time.perf_counter() - started
+    print(f"Последовательно: {MESSAGES / elapsed:.1f} сообщений/с, ошибок {failed}")
+
+    SlowBotApi.limited.clear()
+    started = time.perf_counter()
+    counters = await broadcast(bot, 'bench', messages())
+    elapsed = time.perf_counter() - started
+    print(f"broadcast: {MESSAGES / elapsed:.1f} сообщений/с, {counters}")
+
+    rerun = await broadcast(bot, 'bench', messages())
+    print(f"Повторный запуск: {rerun}")
+    await bot.shutdown()
+    return counters, rerun
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'broadcast.db')}"
+        from db import init_db
+        init_db()
+        server = start_server(SlowBotApi)
+        try:
+            counters, rerun = asyncio.run(run(api_url(server)))
+        finally:
+            server.shutdown()
+    if counters['failed'] or rerun['skipped'] != MESSAGES:
+        print('❌ Рассылка доставила не все сообщения или не продолжилась с контрольной точки')
+        sys.exit(1)
+    print('✅ Все сообщения доставлены, повторный запуск ничего не отправил')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Задержка обработки обновления при интенсивном логировании.
+
+Сравнивает прежнюю схему (синхронные FileHandler на event loop) и очередь
+logging_setup: имитирует обработчик, который, как vpn_status, пишет шесть
+строк лога на обновление, и печатает p50/p99 времени обработки.
+Запуск: python bench_logging.py
+"""
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+import logging_setup
+
+UPDATES = 5_000
+CONCURRENCY = 50
+
+logger = logging.getLogger('bench')
+
+async def handle_update(user_id: int):
+    # Измеряется время, на которое обработчик занимает event loop
+    started = time.perf_counter()
+    logger.info("Получен запрос статуса VPN от пользователя %s", user_id)
+    logger.debug("Поиск ключа VPN для пользователя %s в базе данных", user_id)
+    logger.info("Найден ключ VPN для пользователя %s: vless://%032x@host:443", user_id, user_id)
+    logger.info("Ключ активен для пользователя %s", user_id)
+    logger.debug("Отправка сообщения со статусом VPN пользователю %s", user_id)
+    logger.info("Сообщение со статусом VPN успешно отправлено пользователю %s", user_id)
+    blocked = time.perf_counter() - started
+    await asyncio.sleep(0)
+    return blocked
+
+async def run_updates():
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def limited(user_id):
+        async with semaphore:
+            return await handle_update(user_id)
+
+    return await asyncio.gather(*(limited(user_id) for user_id in range(UPDATES)))
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1_000_000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1_000_000
+    print(f"{name}: p50 {p50:.1f} мкс, p99 {p99:.1f} мкс на обновление")
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        root = logging.getLogger()
+        root.setLevel(logging.DEBUG)
+
+        # Прежняя схема: два FileHandler, запись прямо в потоке event loop
+        handlers = [
+            logging.FileHandler(os.path.join(tmp, 'log.txt'), encoding='utf-8'),
+            logging.FileHandler(os.path.join(tmp, 'bot.log'), encoding='utf-8'),
+        ]
+        for handler in handlers:
+            handler.setFormatter(logging.Formatter(logging_setup.LOG_FORMAT))
+            root.addHandler(handler)
+        report('FileHandler', asyncio.run(run_updates()))
+        for handler in handlers:
+            root.removeHandler(handler)
+            handler.close()
+
+        logging_setup.setup_logging({
+            '': os.path.join(tmp, 'queue_log.txt'),
+            'bench': os.path.join(tmp, 'queue_bot.log'),
+        }, level='DEBUG', console=False)
+        report('QueueHandler', asyncio.run(run_updates()))
+        logging_setup.stop_logging()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Память и время запуска ботов отдельными процессами и в одном процессе.
+
+Запускает bot.py и admin_bot.py как два процесса, затем multibot.py, против
+поддельного сервера Bot API (TELEGRAM_API_URL) и временной базы. Время
+запуска считается до строки "Application started" от обоих приложений,
+память - суммарный RSS процессов после запуска. Каждый режим запускается
+несколько раз, выводится медиана. Запуск: python bench_multibot.py [повторов]
+"""
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from fake_bot_api import api_url, start_server
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+# Сколько ждать после запуска, прежде чем измерить RSS
+SETTLE_TIME = 1.0
+READY_LINE = 'Application started'
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+def rss_kb(pid: int) -> int:
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+def start(scripts: list, env: dict, cwd: str):
+    """Запускает скрипты и ждет READY_LINE от двух приложений; возвращает процессы и время запуска"""
+    ready = threading.Semaphore(0)
+    processes = []
+
+    def watch(process):
+        for line in process.stderr:
+            if READY_LINE in line:
+                ready.release()
+
+    started = time.perf_counter()
+    for script in scripts:
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(REPO, script)], cwd=cwd, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+        )
+        threading.Thread(target=watch, args=(process,), daemon=True).start()
+        processes.append(process)
+    for _ in range(2):
+        if not ready.acquire(timeout=60):
+            raise RuntimeError(f"{' + '.join(scripts)} не запустились за 60 с")
+    return processes, time.perf_counter() - started
+
+def measure(scripts: list, env: dict) -> tuple:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**env, 'DATABASE_URL': f"sqlite:///{os.path.join(tmp, 'vpn_keys.db')}"}
+        processes, startup = start(scripts, env, tmp)
+        try:
+            time.sleep(SETTLE_TIME)
+            rss = sum(rss_kb(process.pid) for process in processes)
+        finally:
+            for process in processes:
+                process.send_signal(signal.SIGTERM)
+            exit_codes = [process.wait(timeout=30) for process in processes]
+    if any(exit_codes):
+        raise RuntimeError(f"{' + '.join(scripts)} завершились с кодами {exit_codes}")
+    return startup, rss
+
+def main():
+    server = start_server()
+    env = {
+        **os.environ,
+        'TELEGRAM_API_URL': api_url(server),
+        'TELEGRAM_TOKEN': '123:main',
+        'ADMIN_BOT_TOKEN': '456:admin',
+        'ADMIN_ID': '1',
+        'XUI_HOST': '',
+        'PYTHONUNBUFFERED': '1',
+    }
+    modes = {
+        'Два процесса (bot.py + admin_bot.py)': ['bot.py', 'admin_bot.py'],
+        'Один процесс (multibot.py)': ['multibot.py'],
+    }
+    results = {}
+    try:
+        for name, scripts in modes.items():
+            runs = [measure(scripts, env) for _ in range(RUNS)]
+            startup = statistics.median(run[0] for run in runs)
+            rss = statistics.median(run[1] for run in runs)
+            results[name] = (startup, rss)
+            print(f"{name}: запуск {startup:.2f} с, RSS {rss / 1024:.1f} МБ")
+    finally:
+        server.shutdown()
+
+    (separate_startup, separate_rss), (single_startup, single_rss) = results.values()
+    print(f"Один процесс: память {single_rss / separate_rss:.0%} от двух процессов, "
+          f"запуск {single_startup / separate_startup:.0%}")
+    if single_rss >= separate_rss:
+        print('❌ Один процесс занимает не меньше памяти, чем два')
+        sys.exit(1)
+    print('✅ Оба режима запускаются и штатно останавливаются по SIGTERM')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Пропускная способность обработки обновлений с сохранением состояний и без него.
+
+Прогоняет через Application синтетический разговор об оплате (покупка ->
+чек -> проверка) для тысяч пользователей, сначала без persistence, затем с
+SQLitePersistence. Часть пользователей останавливается на середине; после
+остановки приложения их состояния должны восстановиться из базы.
+Запуск: python bench_persistence.py [пользователей]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from fake_bot_api import api_url, start_server
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 3_000
+# Каждый десятый пользователь останавливается после отправки чека
+UNFINISHED_EVERY = 10
+BUY, RECEIPT, CHECK = 'buy', 'receipt', 'check'
+WAITING_PAYMENT, CHECKING_PAYMENT = range(1, 3)
+
+def synthetic_updates():
+    """Обновления по шагам: сначала все покупки, потом чеки, потом проверки"""
+    update_id = 0
+    for step in (BUY, RECEIPT, CHECK):
+        for user_id in range(1, USERS + 1):
+            if step == CHECK and user_id % UNFINISHED_EVERY == 0:
+                continue
+            update_id += 1
+            yield {
+                'update_id': update_id,
+                'message': {
+                    'message_id': update_id,
+                    'date': int(time.time()),
+                    'chat': {'id': user_id, 'type': 'private'},
+                    'from': {'id': user_id, 'is_bot': False, 'first_name': 'User'},
+                    'text': step,
+                }
+            }
+
+async def run(base_url: str, persistence):
+    from telegram import Update
+    from telegram.ext import Application, ConversationHandler, MessageHandler, filters
+
+    updates = list(synthetic_updates())
+    processed = 0
+    done = asyncio.Event()
+
+    def step(next_state):
+        async def handler(update, context):
+            nonlocal processed
+            processed += 1
+            if processed == len(updates):
+                done.set()
+            return next_state
+        return handler
+
+    builder = Application.builder().token('123:test').base_url(base_url)
+    application = builder.persistence(persistence).build() if persistence else builder.build()
+    application.add_handler(ConversationHandler(
+        entry_points=[MessageHandler(filters.Regex(f'^{BUY}$'), step(WAITING_PAYMENT))],
+        states={
+            WAITING_PAYMENT: [MessageHandler(filters.Regex(f'^{RECEIPT}$'), step(CHECKING_PAYMENT))],
+            CHECKING_PAYMENT: [MessageHandler(filters.Regex(f'^{CHECK}$'), step(ConversationHandler.END))],
+        },
+        fallbacks=[],
+        name='payment_conversation',
+        persistent=persistence is not None,
+    ))
+
+    await application.initialize()
+    await application.start()
+    started = time.perf_counter()
+    for data in updates:
+        await application.update_queue.put(Update.de_json(data, application.bot))
+    await asyncio.wait_for(done.wait(), timeout=120)
+    elapsed = time.perf_counter() - started
+    await application.stop()
+    await application.shutdown()
+    return len(updates), elapsed
+
+def main():
+    server = start_server()
+    with tempfile.TemporaryDirectory() as tmp:
+        # База выбирается при импорте db, поэтому URL задается до импорта
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'persistence.db')}"
+        from db import init_db
+        from persistence import SQLitePersistence
+        init_db()
+        try:
+            count, elapsed = asyncio.run(run(api_url(server), None))
+            print(f"Без persistence: {count} обновлений, {count / elapsed:,.0f}/с")
+            count, elapsed = asyncio.run(run(api_url(server), SQLitePersistence(update_interval=1)))
+            print(f"SQLitePersistence (запись раз в 1 с): {count} обновлений, {count / elapsed:,.0f}/с")
+            restored = asyncio.run(SQLitePersistence().get_conversations('payment_conversation'))
+        finally:
+            server.shutdown()
+
+    expected = {(user_id, user_id): CHECKING_PAYMENT for user_id in range(UNFINISHED_EVERY, USERS + 1, UNFINISHED_EVERY)}
+    if restored != expected:
+        print(f"❌ Восстановлено {len(restored)} разговоров вместо {len(expected)}")
+        sys.exit(1)
+    print(f"✅ После перезапуска восстановлено {len(restored)} незавершенных разговоров")
+
+if __name__ == '__main__':
+    main()
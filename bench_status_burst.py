@@ -0,0 +1,183 @@
+"""Пропускная способность обработчиков при всплеске нажатий "📊 Статус VPN".
+
+N пользователей с выданными ключами одновременно нажимают "📊 Статус VPN";
+обновления проходят через приложение из bot.build_application, Bot API
+подменяется поддельным сервером с задержкой ответа LATENCY. Режимы:
+
+    до              обновления по одному, запросы к базе в event loop
+    run_db          обновления по одному, запросы в пуле потоков базы
+    параллельно     PerUserUpdateProcessor, запросы в пуле потоков базы
+    параллельно, event loop   PerUserUpdateProcessor, запросы в event loop
+
+и те же два параллельных режима с блокировкой записи: другое соединение
+(как load_keys.py при загрузке ключей) держит блокировку записи LOCK_HOLD
+секунд, а в начале всплеска запускается синхронизация трафика x-ui
+(sync_traffic_stats с поддельной панелью), запись которой ждет блокировку.
+
+Пул потоков базы сам по себе всплеск не ускоряет: пока обновления
+обрабатываются по одному, следующее ждет окончания предыдущего. Индексный
+запрос статуса к SQLite занимает доли миллисекунды, поэтому без блокировки
+event loop и пул потоков почти не различаются. Пул нужен, когда запрос
+ждет: запись, ожидающая блокировку в event loop, останавливает все
+обработчики, а в пуле потоков ждет только она сама.
+Запуск: python bench_status_burst.py [пользователей]
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from fake_bot_api import FakeBotApi, api_url, start_server
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+DATABASE = None
+# Задержка ответа Bot API, секунды
+LATENCY = 0.03
+STATUS_BUTTON = '📊 Статус VPN'
+# Сколько другое соединение держит блокировку записи, секунды
+LOCK_HOLD = 1.0
+
+class SlowBotApi(FakeBotApi):
+    """Отвечает на send* с задержкой и считает ответы"""
+    replies = 0
+    lock = threading.Lock()
+
+    def respond(self, method, params):
+        if method.startswith('send'):
+            time.sleep(LATENCY)
+            with SlowBotApi.lock:
+                SlowBotApi.replies += 1
+        return super().respond(method, params)
+
+def status_update(update_id: int, user_id: int) -> dict:
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'User'},
+            'text': STATUS_BUTTON,
+        }
+    }
+
+class FakeXuiClient:
+    """Панель x-ui, которая сразу отдает трафик всех клиентов"""
+
+    async def refresh_client_index(self):
+        return True
+
+    async def get_clients_stats(self, emails=None, xui_ids=None):
+        return {email: {'up': 1, 'down': 1, 'total': 0, 'expiry': 0} for email in emails or ()}
+
+def hold_write_lock(database: str, locked: threading.Event):
+    """Держит блокировку записи LOCK_HOLD секунд, как загрузка ключей в другом процессе"""
+    conn = sqlite3.connect(database, isolation_level=None)
+    conn.execute('BEGIN IMMEDIATE')
+    locked.set()
+    time.sleep(LOCK_HOLD)
+    conn.execute('COMMIT')
+    conn.close()
+
+def add_users():
+    from db import Session, VPNKey
+    now = datetime.utcnow()
+    with Session() as session:
+        session.add_all(
+            VPNKey(key=f'vless://{user_id}@vpn.example.com:443#AmegaVPN-nl', is_used=True, user_id=user_id,
+                   activation_date=now, expiration_date=now + timedelta(days=30), location='nl',
+                   xui_email=f'user_{user_id}@amegavpn.com')
+            for user_id in range(1, USERS + 1)
+        )
+        session.commit()
+
+async def run_db_inline(func, *args, **kwargs):
+    """Запрос прямо в event loop, как до переноса в пул потоков"""
+    return func(*args, **kwargs)
+
+async def burst(concurrent_updates: int, queries_in_loop: bool, write_locked: bool = False) -> float:
+    import bot
+    from telegram import Update
+    from db import run_db
+
+    os.environ['BOT_CONCURRENT_UPDATES'] = str(concurrent_updates)
+    bot.run_db = run_db_inline if queries_in_loop else run_db
+    bot.vpn_status_cache.clear()
+    SlowBotApi.replies = 0
+
+    application = bot.build_application()
+    await application.initialize()
+    await application.start()
+    started = time.perf_counter()
+    if write_locked:
+        locked = threading.Event()
+        threading.Thread(target=hold_write_lock, args=(DATABASE, locked), daemon=True).start()
+        locked.wait()
+        application.create_task(bot.sync_traffic_stats(None))
+    for user_id in range(1, USERS + 1):
+        await application.update_queue.put(Update.de_json(status_update(user_id, user_id), application.bot))
+    while SlowBotApi.replies < USERS:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    await application.stop()
+    await application.shutdown()
+    bot.run_db = run_db
+    return elapsed
+
+def main():
+    global DATABASE
+    server = start_server(SlowBotApi)
+    with tempfile.TemporaryDirectory() as tmp:
+        DATABASE = os.path.join(tmp, 'vpn_keys.db')
+        # Логи и каталоги бота создаются во временном каталоге, база выбирается при импорте db
+        os.chdir(tmp)
+        os.environ.update({
+            'DATABASE_URL': f"sqlite:///{DATABASE}",
+            'TELEGRAM_API_URL': api_url(server),
+            'TELEGRAM_TOKEN': '123:main',
+            'ADMIN_BOT_TOKEN': '456:admin',
+            'LOG_LEVEL': 'WARNING',
+            'XUI_HOST': '',
+        })
+        import bot  # noqa: F401 - настройка логов и init_db
+        add_users()
+        bot.get_xui_client = FakeXuiClient
+        modes = (
+            ('до: по одному, запросы в event loop', 1, True, False),
+            ('run_db: по одному, запросы в пуле потоков', 1, False, False),
+            ('параллельно (16), запросы в пуле потоков', 16, False, False),
+            ('параллельно (16), запросы в event loop', 16, True, False),
+            ('блокировка записи, запросы в пуле потоков', 16, False, True),
+            ('блокировка записи, запросы в event loop', 16, True, True),
+        )
+        results = {}
+        try:
+            for name, concurrent_updates, queries_in_loop, write_locked in modes:
+                elapsed = asyncio.run(burst(concurrent_updates, queries_in_loop, write_locked))
+                results[name] = USERS / elapsed
+                print(f"{name}: {USERS} нажатий за {elapsed:.2f} с, {USERS / elapsed:.0f} обновлений/с")
+        finally:
+            server.shutdown()
+            os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    before, with_run_db, concurrent, concurrent_in_loop, locked, locked_in_loop = results.values()
+    print(f"Параллельная обработка с run_db: в {concurrent / before:.1f} раза быстрее, чем до; "
+          f"run_db без нее: {with_run_db / before:.2f}x, без блокировки пул против event loop: "
+          f"{concurrent / concurrent_in_loop:.2f}x")
+    print(f"С блокировкой записи пул потоков против event loop: {locked / locked_in_loop:.2f}x")
+    failures = []
+    if concurrent < before * 2:
+        failures.append('всплеск не обрабатывается параллельно')
+    if locked < locked_in_loop * 1.2:
+        failures.append('запись, ждущая блокировку в пуле потоков, задерживает остальные обработчики')
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print('✅ Всплеск нажатий обрабатывается параллельно, ожидание блокировки записи его не останавливает')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""Нагрузочная проверка режима webhook основного бота.
+
+Запускает bot.py отдельным процессом с BOT_UPDATE_MODE=webhook, поэтому
+приложение собирается build_application, а сервер webhook поднимает
+launch.run_application с параметрами из webhook_settings. Bot API подменяется
+поддельным сервером (TELEGRAM_API_URL), база - временной. На webhook с
+заданной параллельностью отправляются команды /help от разных
+пользователей; задержка считается от отправки обновления до ответа бота
+пользователю (sendMessage), выводятся p50/p99. Запрос с неверным секретом
+должен получить 403, webhook должен быть зарегистрирован с секретом, а бот -
+штатно остановиться по SIGTERM. Запуск: python bench_webhook.py [количество]
+"""
+import asyncio
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from fake_bot_api import FakeBotApi, api_url, start_server
+
+UPDATES = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+CONCURRENCY = 50
+SECRET = 'bench-secret'
+READY_LINE = 'Application started'
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+class RecordingBotApi(FakeBotApi):
+    """Запоминает время ответов бота пользователям и параметры setWebhook"""
+    replies = {}  # chat_id -> time.perf_counter() ответа
+    webhook = {}
+    lock = threading.Lock()
+
+    def respond(self, method, params):
+        if method == 'sendMessage':
+            with RecordingBotApi.lock:
+                RecordingBotApi.replies[int(params['chat_id'])] = time.perf_counter()
+        elif method == 'setWebhook':
+            RecordingBotApi.webhook = params
+        return super().respond(method, params)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def help_update(update_id: int) -> dict:
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': update_id, 'type': 'private'},
+            'from': {'id': update_id, 'is_bot': False, 'first_name': 'User'},
+            'text': '/help',
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': 5}],
+        }
+    }
+
+def start_bot(env: dict, cwd: str) -> subprocess.Popen:
+    """Запускает bot.py и ждет запуска приложения"""
+    ready = threading.Event()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(REPO, 'bot.py')], cwd=cwd, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+
+    def watch():
+        for line in process.stderr:
+            if READY_LINE in line:
+                ready.set()
+
+    threading.Thread(target=watch, daemon=True).start()
+    if not ready.wait(timeout=60):
+        process.kill()
+        raise RuntimeError("bot.py не запустился за 60 с")
+    return process
+
+async def load(url: str):
+    import httpx
+
+    sent = {}
+    limits = httpx.Limits(max_connections=CONCURRENCY)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        rejected = await client.post(url, json=help_update(0), headers={'X-Telegram-Bot-Api-Secret-Token': 'wrong'})
+        queue = asyncio.Queue()
+        for update_id in range(1, UPDATES + 1):
+            queue.put_nowait(update_id)
+
+        async def sender():
+            while not queue.empty():
+                update_id = queue.get_nowait()
+                sent[update_id] = time.perf_counter()
+                response = await client.post(
+                    url, json=help_update(update_id),
+                    headers={'X-Telegram-Bot-Api-Secret-Token': SECRET}
+                )
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(sender() for _ in range(CONCURRENCY)))
+        deadline = time.perf_counter() + 60
+        while len(RecordingBotApi.replies) < UPDATES and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+    return rejected.status_code, sent, elapsed
+
+def main():
+    server = start_server(RecordingBotApi)
+    port = free_port()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {
+                **os.environ,
+                'TELEGRAM_API_URL': api_url(server),
+                'TELEGRAM_TOKEN': '123:main',
+                'ADMIN_BOT_TOKEN': '456:admin',
+                'ADMIN_ID': '1',
+                'XUI_HOST': '',
+                'DATABASE_URL': f"sqlite:///{os.path.join(tmp, 'vpn_keys.db')}",
+                'BOT_UPDATE_MODE': 'webhook',
+                'BOT_WEBHOOK_URL': 'https://example.com',
+                'BOT_WEBHOOK_PORT': str(port),
+                'BOT_WEBHOOK_SECRET': SECRET,
+                'BOT_WEBHOOK_MAX_CONNECTIONS': str(CONCURRENCY),
+                'PYTHONUNBUFFERED': '1',
+            }
+            process = start_bot(env, tmp)
+            try:
+                rejected_status, sent, elapsed = asyncio.run(load(f'http://127.0.0.1:{port}/bot'))
+            finally:
+                process.send_signal(signal.SIGTERM)
+                exit_code = process.wait(timeout=30)
+    finally:
+        server.shutdown()
+
+    latencies = sorted(RecordingBotApi.replies[update_id] - sent[update_id]
+                       for update_id in sent if update_id in RecordingBotApi.replies)
+    print(f"Обновлений: {UPDATES}, ответов: {len(latencies)} за {elapsed:.2f} с "
+          f"({len(latencies) / elapsed:.0f}/с), соединений {CONCURRENCY}, "
+          f"обработчиков бота {os.getenv('BOT_CONCURRENT_UPDATES', '16')}")
+    if len(latencies) > 1:
+        quantiles = statistics.quantiles(latencies, n=100)
+        print(f"Задержка до ответа бота: p50 {quantiles[49] * 1000:.1f} мс, p99 {quantiles[98] * 1000:.1f} мс")
+
+    failures = []
+    if len(latencies) != UPDATES:
+        failures.append(f"бот ответил на {len(latencies)} из {UPDATES} обновлений")
+    if rejected_status != 403:
+        failures.append(f"запрос с неверным секретом получил {rejected_status} вместо 403")
+    if RecordingBotApi.webhook.get('url') != 'https://example.com/bot' \
+            or RecordingBotApi.webhook.get('secret_token') != SECRET:
+        failures.append(f"webhook зарегистрирован с параметрами {RecordingBotApi.webhook}")
+    if exit_code != 0:
+        failures.append(f"bot.py завершился с кодом {exit_code} после SIGTERM")
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print('✅ Все обновления обработаны ботом, неверный секрет отклонен, остановка штатная')
+
+if __name__ == '__main__':
+    main()
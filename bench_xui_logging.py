@@ -0,0 +1,75 @@
+"""Микробенчмарк XUIApi.get_client_status с включенным и выключенным DEBUG-логом.
+
+Панель подменяется сессией, возвращающей заранее подготовленный ответ
+inbounds/list, поэтому измеряется только разбор ответа, поиск клиента и
+логирование. Запуск: python bench_xui_logging.py
+"""
+import json
+import logging
+import os
+import tempfile
+import time
+from xui_api import XUIApi
+
+CLIENTS_COUNT = 5_000
+CALLS = 200
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, payload):
+        self.text = json.dumps(payload)
+        self.content = self.text.encode()
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        pass
+
+class FakeSession:
+    def __init__(self, payload):
+        self.response = FakeResponse(payload)
+
+    def get(self, url, **kwargs):
+        return self.response
+
+def build_payload():
+    clients = [
+        {'id': i, 'email': f'user{i}', 'up': i, 'down': i, 'total': 0, 'enable': True, 'expiryTime': 0}
+        for i in range(CLIENTS_COUNT)
+    ]
+    return {'success': True, 'obj': [{'id': 1, 'settings': '{}', 'clientStats': clients}]}
+
+def measure(api, level):
+    logging.getLogger('XUIApi').setLevel(level)
+    started = time.perf_counter()
+    for i in range(CALLS):
+        # force_refresh разбирает полный ответ панели, как до появления индекса
+        api.get_client_status(f'user{i}', force_refresh=True)
+    return (time.perf_counter() - started) / CALLS * 1000
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        handler = logging.FileHandler(os.path.join(tmp, 'xui_api.log'), encoding='utf-8')
+        xui_logger = logging.getLogger('XUIApi')
+        xui_logger.addHandler(handler)
+        xui_logger.propagate = False
+
+        api = XUIApi('127.0.0.1', 0, token='token')
+        api.session = FakeSession(build_payload())
+        measure(api, logging.WARNING)  # прогрев
+
+        for name, level in (('DEBUG', logging.DEBUG), ('INFO', logging.INFO), ('WARNING', logging.WARNING)):
+            print(f"Уровень {name}: {measure(api, level):.2f} мс на вызов")
+
+        cached = time.perf_counter()
+        for i in range(CALLS * 100):
+            api.get_client_status(f'user{i % CLIENTS_COUNT}')
+        print(f"Из индекса: {(time.perf_counter() - cached) / (CALLS * 100) * 1_000_000:.1f} мкс на вызов")
+        xui_logger.removeHandler(handler)
+        handler.close()
+
+if __name__ == '__main__':
+    main()
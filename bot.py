@@ -11,80 +11,64 @@ from telegram.ext import (
     ContextTypes,
     ConversationHandler
 )
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime
-from sqlalchemy.orm import declarative_base, sessionmaker
 from dotenv import load_dotenv
 from datetime import datetime, timedelta, time
-from xui_api import XUIApi
-import httpx
+from xui_api import AsyncXUIApi
+from db import init_db, run_db
+from logging_setup import setup_logging
+from notifier import get_notifier, shutdown_notifiers
+from media_cache import send_cached_photo
+from broadcast import broadcast
+from launch import TELEGRAM_API_URL, run_application
+from persistence import SQLitePersistence
+from update_processor import update_processor_for
+from cache import TTLCache
+import repository
 import traceback
 import sys
 
 # Загрузка переменных окружения
 load_dotenv()
 
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    handlers=[
-        logging.FileHandler('logs/log.txt', encoding='utf-8'),
-        logging.StreamHandler()  # Также выводим в консоль
-    ]
-)
+logger = logging.getLogger(__name__)
+
+# Логи пишутся через очередь в отдельном потоке: общий файл, файл бота и файл клиента x-ui
+setup_logging({
+    '': 'logs/log.txt',
+    __name__: 'logs/bot.log',
+    'XUIApi': 'logs/xui_api.log',
+})
 
 # Настройка логирования для httpx
 httpx_logger = logging.getLogger('httpx')
 httpx_logger.setLevel(logging.WARNING)  # Устанавливаем уровень WARNING для httpx
 
-logger = logging.getLogger(__name__)
+# Уровень логов клиента x-ui задается XUI_LOG_LEVEL
+logging.getLogger('XUIApi').setLevel(os.getenv('XUI_LOG_LEVEL', 'INFO').upper())
 
-# Создаем директорию для логов, если её нет
-os.makedirs('logs', exist_ok=True)
+# Сохранять ли копии чеков в каталог receipts (в фоне, вне обработки сообщения)
+RECEIPTS_ARCHIVE = os.getenv('RECEIPTS_ARCHIVE', '1') == '1'
 
-# Добавляем файловый обработчик для логов
-file_handler = logging.FileHandler('logs/bot.log', encoding='utf-8')
-file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-logger.addHandler(file_handler)
+# Время ежедневной рассылки напоминаний об оплате (UTC) и через сколько секунд
+# после запуска досылать сегодняшнюю, если она не завершилась
+REMINDER_TIME = time(hour=12, minute=0)
+REMINDER_CATCH_UP_DELAY = 30
 
-# Состояния для ConversationHandler
-PAYMENT_INFO, WAITING_PAYMENT, CHECKING_PAYMENT = range(3)
+# Интервал синхронизации трафика с x-ui в секундах
+XUI_SYNC_INTERVAL = int(os.getenv('XUI_SYNC_INTERVAL', '600'))
 
-# Создание базы данных
-Base = declarative_base()
-engine = create_engine('sqlite:///vpn_keys.db')
-Session = sessionmaker(bind=engine)
+# Кэш готовых ответов "Статус VPN" по user_id. Ключи выдает и админ-бот, в том
+# числе из другого процесса, поэтому запись отдается, только если id и срок
+# ключа в базе совпадают с сохраненными вместе с ней (индексный запрос)
+vpn_status_cache = TTLCache(
+    maxsize=int(os.getenv('VPN_STATUS_CACHE_SIZE', '10000')),
+    ttl=float(os.getenv('VPN_STATUS_CACHE_TTL', '60'))
+)
+# Как часто писать в лог счетчики кэша, секунды
+CACHE_STATS_INTERVAL = int(os.getenv('CACHE_STATS_INTERVAL', '3600'))
 
-class VPNKey(Base):
-    __tablename__ = 'vpn_keys'
-    
-    id = Column(Integer, primary_key=True)
-    key = Column(String, unique=True)
-    is_used = Column(Boolean, default=False)
-    user_id = Column(Integer, nullable=True)
-    username = Column(String, nullable=True)
-    phone = Column(String, nullable=True)
-    email = Column(String, nullable=True)  # Старое поле, можно оставить для обратной совместимости
-    xui_email = Column(String, nullable=True)  # Новый идентификатор для x-ui
-    xui_id = Column(String, nullable=True)  # Новый ID клиента из x-ui
-    activation_date = Column(DateTime, default=datetime.utcnow)
-    expiration_date = Column(DateTime)
-
-class Payment(Base):
-    __tablename__ = 'payments'
-    
-    id = Column(Integer, primary_key=True)
-    user_id = Column(Integer)
-    username = Column(String, nullable=True)
-    phone = Column(String, nullable=True)
-    status = Column(String)  # pending, approved, rejected
-    receipt_path = Column(String, nullable=True)
-    payment_date = Column(DateTime, default=datetime.utcnow)
-    next_payment_date = Column(DateTime)
-
-# Создаем таблицы, если они не существуют
-def init_db():
-    Base.metadata.create_all(engine)
+# Состояния для ConversationHandler
+PAYMENT_INFO, WAITING_PAYMENT, CHECKING_PAYMENT = range(3)
 
 # Инициализируем базу данных при запуске
 init_db()
@@ -102,15 +86,17 @@ def get_keyboard():
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Отправляем приветственное изображение
     try:
-        with open('img/1.jpg', 'rb') as photo:
-            await update.message.reply_photo(
-                photo=photo,
-                caption="🌟 *Добро пожаловать в AmegaVPN\\!*\n\n"
-                       "🔐 *Безопасный и быстрый VPN сервис*\n\n"
-                       "Выберите действие в меню ниже:",
-                parse_mode='MarkdownV2',
-                reply_markup=get_keyboard()
-            )
+        # Изображение загружается в Telegram один раз, дальше отправляется по file_id
+        await send_cached_photo(
+            context.bot,
+            update.effective_chat.id,
+            'img/1.jpg',
+            caption="🌟 *Добро пожаловать в AmegaVPN\\!*\n\n"
+                   "🔐 *Безопасный и быстрый VPN сервис*\n\n"
+                   "Выберите действие в меню ниже:",
+            parse_mode='MarkdownV2',
+            reply_markup=get_keyboard()
+        )
     except FileNotFoundError:
         await update.message.reply_text(
             "🌟 *Добро пожаловать в AmegaVPN\\!*\n\n"
@@ -122,57 +108,15 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 async def buy_vpn(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    session = Session()
-    try:
-        # Проверяем наличие активного ключа
-        existing_key = session.query(VPNKey).filter_by(
-            user_id=update.effective_user.id,
-            is_used=True
-        ).first()
-        
-        if existing_key:
-            # Проверяем, не истек ли срок действия
-            if existing_key.activation_date:
-                expiry_date = existing_key.activation_date + timedelta(days=30)
-                if datetime.now() > expiry_date:
-                    # Если срок истек, предлагаем купить новый ключ
-                    payment_text = (
-                        "💳 *Оплата VPN*\n\n"
-                        "💰 *Стоимость:* 200₽ в месяц\n\n"
-                        "📝 *После оплаты вы получите инструкцию с ключом доступа*\n\n"
-                        "⚠️ *ВНИМАНИЕ\\!*\n"
-                        "Ключ рассчитан на *1 пользователя*\\. При активации на других устройствах он будет заблокирован\\.\n\n"
-                        "*Способы оплаты:*\n"
-                        "💳 *Тинькофф:* `2200 7009 0119 7003` \\(ПРИОРИТЕТНЫЙ СПОСОБ ОПЛАТЫ\\) Илья\\.Г\n"
-                        "💳 *Сбер:* `4276 4001 1192 0428` Илья\\.Г\n"
-                        "💰 *Bitcoin:* `1PXFB8LRTBqLLuxLWHA3Fcr3sht99BegwZ`\n"
-                        "💰 *USDT \\(TRC20\\):* `TQJRXxoAG5ikM1t1Qrpfv2RKbtyhnkfJnb`\n"
-                        "💰 *TON:* `UQA4V86WRe3ntN0Bf25mnT4P_CS6JOynw4V8GldE7ofoeCHq`\n\n"
-                        "📸 После оплаты, пожалуйста, пришлите скриншот чека для подтверждения\\."
-                    )
-                    
-                    await update.message.reply_text(
-                        payment_text,
-                        parse_mode='MarkdownV2',
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("📞 Техподдержка", url="https://t.me/ilyshapretty")
-                        ]])
-                    )
-                    return WAITING_PAYMENT
-                else:
-                    # Если срок не истек, предлагаем продлить
-                    days_left = (expiry_date - datetime.now()).days
-                    await update.message.reply_text(
-                        f"⚠️ *У вас уже есть активный ключ VPN\\!*\n\n"
-                        f"🔑 *Ваш текущий ключ:* `{existing_key.key}`\n"
-                        f"⏳ *Осталось дней:* {days_left}\n\n"
-                        "Для продления подписки используйте кнопку '🔄 Продлить подписку' в статусе VPN\\.",
-                        parse_mode='MarkdownV2',
-                        reply_markup=get_keyboard()
-                    )
-                    return ConversationHandler.END
-            else:
-                # Если нет даты активации, предлагаем купить новый ключ
+    # Проверяем наличие активного ключа
+    existing_key = await run_db(repository.get_active_key, update.effective_user.id)
+
+    if existing_key:
+        # Проверяем, не истек ли срок действия (даты в базе хранятся в UTC)
+        if existing_key.expiration_date:
+            expiry_date = existing_key.expiration_date
+            if datetime.utcnow() > expiry_date:
+                # Если срок истек, предлагаем купить новый ключ
                 payment_text = (
                     "💳 *Оплата VPN*\n\n"
                     "💰 *Стоимость:* 200₽ в месяц\n\n"
@@ -196,33 +140,68 @@ async def buy_vpn(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     ]])
                 )
                 return WAITING_PAYMENT
+            else:
+                # Если срок не истек, предлагаем продлить
+                days_left = (expiry_date - datetime.utcnow()).days
+                await update.message.reply_text(
+                    f"⚠️ *У вас уже есть активный ключ VPN\\!*\n\n"
+                    f"🔑 *Ваш текущий ключ:* `{existing_key.key}`\n"
+                    f"⏳ *Осталось дней:* {days_left}\n\n"
+                    "Для продления подписки используйте кнопку '🔄 Продлить подписку' в статусе VPN\\.",
+                    parse_mode='MarkdownV2',
+                    reply_markup=get_keyboard()
+                )
+                return ConversationHandler.END
+        else:
+            # Если срок действия не указан, предлагаем купить новый ключ
+            payment_text = (
+                "💳 *Оплата VPN*\n\n"
+                "💰 *Стоимость:* 200₽ в месяц\n\n"
+                "📝 *После оплаты вы получите инструкцию с ключом доступа*\n\n"
+                "⚠️ *ВНИМАНИЕ\\!*\n"
+                "Ключ рассчитан на *1 пользователя*\\. При активации на других устройствах он будет заблокирован\\.\n\n"
+                "*Способы оплаты:*\n"
+                "💳 *Тинькофф:* `2200 7009 0119 7003` \\(ПРИОРИТЕТНЫЙ СПОСОБ ОПЛАТЫ\\) Илья\\.Г\n"
+                "💳 *Сбер:* `4276 4001 1192 0428` Илья\\.Г\n"
+                "💰 *Bitcoin:* `1PXFB8LRTBqLLuxLWHA3Fcr3sht99BegwZ`\n"
+                "💰 *USDT \\(TRC20\\):* `TQJRXxoAG5ikM1t1Qrpfv2RKbtyhnkfJnb`\n"
+                "💰 *TON:* `UQA4V86WRe3ntN0Bf25mnT4P_CS6JOynw4V8GldE7ofoeCHq`\n\n"
+                "📸 После оплаты, пожалуйста, пришлите скриншот чека для подтверждения\\."
+            )
+            
+            await update.message.reply_text(
+                payment_text,
+                parse_mode='MarkdownV2',
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("📞 Техподдержка", url="https://t.me/ilyshapretty")
+                ]])
+            )
+            return WAITING_PAYMENT
 
-        # Если нет активного ключа, предлагаем купить новый
-        payment_text = (
-            "💳 *Оплата VPN*\n\n"
-            "💰 *Стоимость:* 200₽ в месяц\n\n"
-            "📝 *После оплаты вы получите инструкцию с ключом доступа*\n\n"
-            "⚠️ *ВНИМАНИЕ\\!*\n"
-            "Ключ рассчитан на *1 пользователя*\\. При активации на других устройствах он будет заблокирован\\.\n\n"
-            "*Способы оплаты:*\n"
-            "💳 *Тинькофф:* `2200 7009 0119 7003` \\(ПРИОРИТЕТНЫЙ СПОСОБ ОПЛАТЫ\\) Илья\\.Г\n"
-            "💳 *Сбер:* `4276 4001 1192 0428` Илья\\.Г\n"
-            "💰 *Bitcoin:* `1PXFB8LRTBqLLuxLWHA3Fcr3sht99BegwZ`\n"
-            "💰 *USDT \\(TRC20\\):* `TQJRXxoAG5ikM1t1Qrpfv2RKbtyhnkfJnb`\n"
-            "💰 *TON:* `UQA4V86WRe3ntN0Bf25mnT4P_CS6JOynw4V8GldE7ofoeCHq`\n\n"
-            "📸 После оплаты, пожалуйста, пришлите скриншот чека для подтверждения\\."
-        )
-        
-        await update.message.reply_text(
-            payment_text,
-            parse_mode='MarkdownV2',
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("📞 Техподдержка", url="https://t.me/ilyshapretty")
-            ]])
-        )
-        return WAITING_PAYMENT
-    finally:
-        session.close()
+    # Если нет активного ключа, предлагаем купить новый
+    payment_text = (
+        "💳 *Оплата VPN*\n\n"
+        "💰 *Стоимость:* 200₽ в месяц\n\n"
+        "📝 *После оплаты вы получите инструкцию с ключом доступа*\n\n"
+        "⚠️ *ВНИМАНИЕ\\!*\n"
+        "Ключ рассчитан на *1 пользователя*\\. При активации на других устройствах он будет заблокирован\\.\n\n"
+        "*Способы оплаты:*\n"
+        "💳 *Тинькофф:* `2200 7009 0119 7003` \\(ПРИОРИТЕТНЫЙ СПОСОБ ОПЛАТЫ\\) Илья\\.Г\n"
+        "💳 *Сбер:* `4276 4001 1192 0428` Илья\\.Г\n"
+        "💰 *Bitcoin:* `1PXFB8LRTBqLLuxLWHA3Fcr3sht99BegwZ`\n"
+        "💰 *USDT \\(TRC20\\):* `TQJRXxoAG5ikM1t1Qrpfv2RKbtyhnkfJnb`\n"
+        "💰 *TON:* `UQA4V86WRe3ntN0Bf25mnT4P_CS6JOynw4V8GldE7ofoeCHq`\n\n"
+        "📸 После оплаты, пожалуйста, пришлите скриншот чека для подтверждения\\."
+    )
+    
+    await update.message.reply_text(
+        payment_text,
+        parse_mode='MarkdownV2',
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("📞 Техподдержка", url="https://t.me/ilyshapretty")
+        ]])
+    )
+    return WAITING_PAYMENT
 
 async def handle_payment_receipt(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message.photo:
@@ -234,14 +213,9 @@ async def handle_payment_receipt(update: Update, context: ContextTypes.DEFAULT_T
         return WAITING_PAYMENT
 
     try:
-        # Создаем директорию для чеков, если она не существует
-        os.makedirs('receipts', exist_ok=True)
-
-        # Сохраняем фото
+        # Чек хранится по file_id. На диск он сохраняется в фоне до отправки
+        # администратору, если включен архив, и в любом случае, если отправка не удалась
         photo = update.message.photo[-1]
-        file = await context.bot.get_file(photo.file_id)
-        receipt_path = f"receipts/{update.effective_user.id}_{update.message.message_id}.jpg"
-        await file.download_to_drive(receipt_path)
 
         # Получаем информацию о пользователе
         user = update.effective_user
@@ -249,25 +223,21 @@ async def handle_payment_receipt(update: Update, context: ContextTypes.DEFAULT_T
         phone = user.phone_number if hasattr(user, 'phone_number') else None
 
         # Сохраняем информацию о платеже
-        session = Session()
-        payment = Payment(
-            user_id=update.effective_user.id,
-            username=username,
-            phone=phone,
-            status='pending',
-            receipt_path=receipt_path,
-            payment_date=datetime.utcnow(),
-            next_payment_date=datetime.utcnow() + timedelta(days=30)
+        payment_id = await run_db(
+            repository.create_payment,
+            update.effective_user.id,
+            username,
+            phone,
+            receipt_file_id=photo.file_id,
+            receipt_file_unique_id=photo.file_unique_id
         )
-        session.add(payment)
-        session.commit()
-        payment_id = payment.id
-        session.close()
 
         # Отправляем уведомление администратору
         admin_id = int(os.getenv('ADMIN_ID'))
+        receipt_bytes = None
+        archive_task = None
         try:
-            admin_bot = Application.builder().token(os.getenv('ADMIN_BOT_TOKEN')).build()
+            admin_notifier = get_notifier(os.getenv('ADMIN_BOT_TOKEN'))
             keyboard = [
                 [
                     InlineKeyboardButton("✅ Подтвердить", callback_data=f"approve_{payment_id}"),
@@ -276,22 +246,49 @@ async def handle_payment_receipt(update: Update, context: ContextTypes.DEFAULT_T
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
             
-            with open(receipt_path, 'rb') as photo_file:
-                await admin_bot.bot.send_photo(
-                    chat_id=admin_id,
-                    photo=photo_file,
-                    caption=f"📨 *Новый платеж*\n\n"
-                           f"👤 *Пользователь:*\n"
-                           f"ID: `{user.id}`\n"
-                           f"Username: {username or 'Не указан'}\n"
-                           f"Телефон: `{phone or 'Не указан'}`\n\n"
-                           f"🆔 *ID платежа:* `{payment_id}`\n"
-                           f"📊 *Статус:* Ожидает подтверждения",
-                    parse_mode='MarkdownV2',
-                    reply_markup=reply_markup
+            if admin_notifier.token == context.bot.token:
+                # Один и тот же бот: отправляем по file_id без передачи файла
+                photo_to_send = photo.file_id
+            else:
+                # file_id другого бота недействителен, поэтому чек один раз
+                # скачивается в память и загружается в админ-бота
+                file = await context.bot.get_file(photo.file_id)
+                photo_to_send = receipt_bytes = bytes(await file.download_as_bytearray())
+            if RECEIPTS_ARCHIVE:
+                archive_task = context.application.create_task(
+                    archive_receipt(
+                        context.bot, payment_id, photo.file_id, user.id, update.message.message_id, receipt_bytes
+                    )
                 )
+            admin_message = await admin_notifier.send_photo(
+                chat_id=admin_id,
+                photo=photo_to_send,
+                caption=f"📨 *Новый платеж*\n\n"
+                       f"👤 *Пользователь:*\n"
+                       f"ID: `{user.id}`\n"
+                       f"Username: {username or 'Не указан'}\n"
+                       f"Телефон: `{phone or 'Не указан'}`\n\n"
+                       f"🆔 *ID платежа:* `{payment_id}`\n"
+                       f"📊 *Статус:* Ожидает подтверждения",
+                parse_mode='MarkdownV2',
+                reply_markup=reply_markup
+            )
+            # Дальше админ-бот показывает чек по своему file_id
+            await run_db(
+                repository.set_receipt_info,
+                payment_id,
+                admin_receipt_file_id=admin_message.photo[-1].file_id
+            )
         except Exception as e:
             logger.error(f"Ошибка при отправке уведомления администратору: {e}")
+            if archive_task is None:
+                # Платеж уже в очереди, а admin_receipt_file_id нет: без копии
+                # на диске админ-бот не сможет показать чек
+                context.application.create_task(
+                    archive_receipt(
+                        context.bot, payment_id, photo.file_id, user.id, update.message.message_id, receipt_bytes
+                    )
+                )
             await update.message.reply_text(
                 "❌ *Произошла ошибка при отправке чека администратору\.*\n"
                 "Пожалуйста, попробуйте позже или обратитесь в техподдержку\.",
@@ -315,109 +312,178 @@ async def handle_payment_receipt(update: Update, context: ContextTypes.DEFAULT_T
         )
         return WAITING_PAYMENT
 
+def write_file(path: str, data: bytes):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+async def archive_receipt(bot, payment_id: int, file_id: str, user_id: int, message_id: int, data: bytes = None):
+    """Фоновое сохранение чека на диск в каталог receipts.
+
+    data - чек, уже скачанный для отправки администратору; без него чек
+    скачивается здесь. Запись файла идет в потоке, чтобы не занимать event loop.
+    """
+    try:
+        receipt_path = f"receipts/{user_id}_{message_id}.jpg"
+        if data is None:
+            file = await bot.get_file(file_id)
+            data = bytes(await file.download_as_bytearray())
+        await asyncio.to_thread(write_file, receipt_path, data)
+        await run_db(repository.set_receipt_info, payment_id, receipt_path=receipt_path)
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении чека платежа {payment_id} на диск: {e}")
+
 async def check_payment_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Проверяем, не является ли сообщение командой меню
     if update.message.text in ['🔐 Купить VPN', '📊 Статус VPN', '👨‍💻 Тех поддержка', '🤖 AmegaAI', 'ℹ️ О нас']:
         return await handle_message(update, context)
 
-    session = Session()
-    try:
-        payment = session.query(Payment).filter_by(
-            user_id=update.effective_user.id,
-            status='pending'
-        ).first()
-
-        if payment and payment.status == 'approved':
-            # Выдаем ключ
-            available_key = session.query(VPNKey).filter_by(is_used=False).first()
-            if available_key:
-                available_key.is_used = True
-                available_key.user_id = update.effective_user.id
-                available_key.activation_date = datetime.now()
-                key = available_key.key
-                identifier = key.split('#')[-1] if '#' in key else None
-                if identifier and identifier.startswith('AmegaVPN-'):
-                    identifier = identifier[len('AmegaVPN-'):]
-                available_key.xui_email = identifier
-                xui_id = None
-                try:
-                    xui_id = key.split('://')[1].split('@')[0]
-                except Exception:
-                    pass
-                available_key.xui_id = xui_id
-                session.commit()
-                
-                keyboard = [
-                    [InlineKeyboardButton("📋 Скопировать ключ", callback_data=f"copy_{available_key.id}")],
-                    [InlineKeyboardButton("📊 Статус VPN", callback_data="vpn_status")]
-                ]
-                
-                await update.message.reply_text(
-                    "🎉 *Оплата подтверждена\!*\n\n"
-                    f"🔑 *Ваш ключ VPN:*\n"
-                    f"`{available_key.key}`\n\n"
-                    "📱 *Используйте его для подключения к VPN сервису*\n\n"
-                    "⚠️ *Важно:* Не передавайте ключ третьим лицам\!",
-                    parse_mode='MarkdownV2',
-                    reply_markup=InlineKeyboardMarkup(keyboard)
-                )
-                
-                await vpn_status(update, context)
-                return ConversationHandler.END
-            else:
-                await update.message.reply_text(
-                    "❌ *Ошибка\!*\n\n"
-                    "К сожалению, в данный момент нет доступных ключей\.\n"
-                    "Пожалуйста, обратитесь в техподдержку\.",
-                    parse_mode='MarkdownV2',
-                    reply_markup=get_keyboard()
-                )
-                return ConversationHandler.END
-        elif payment and payment.status == 'rejected':
-            # Обновляем статус платежа
-            payment.status = 'rejected'
-            session.commit()
-            
-            # Сбрасываем состояние бота
-            context.user_data.clear()
+    payment = await run_db(repository.get_pending_payment, update.effective_user.id)
+
+    if payment and payment.status == 'approved':
+        # Выдаем ключ
+        available_key = await run_db(repository.assign_free_key, update.effective_user.id)
+        vpn_status_cache.invalidate(update.effective_user.id)
+        if available_key:
+            keyboard = [
+                [InlineKeyboardButton("📋 Скопировать ключ", callback_data=f"copy_{available_key.id}")],
+                [InlineKeyboardButton("📊 Статус VPN", callback_data="vpn_status")]
+            ]
             
             await update.message.reply_text(
-                "❌ *Платеж отклонен\!*\n\n"
-                "Пожалуйста, проверьте правильность оплаты и попробуйте снова или обратитесь в техподдержку\.",
+                "🎉 *Оплата подтверждена\!*\n\n"
+                f"🔑 *Ваш ключ VPN:*\n"
+                f"`{available_key.key}`\n\n"
+                "📱 *Используйте его для подключения к VPN сервису*\n\n"
+                "⚠️ *Важно:* Не передавайте ключ третьим лицам\!",
                 parse_mode='MarkdownV2',
-                reply_markup=get_keyboard()
+                reply_markup=InlineKeyboardMarkup(keyboard)
             )
+            
+            await vpn_status(update, context)
             return ConversationHandler.END
         else:
             await update.message.reply_text(
-                "⏳ *Платеж проверяется*\n\n"
-                "Вы получите ключ сразу после подтверждения оплаты\.",
+                "❌ *Ошибка\!*\n\n"
+                "К сожалению, в данный момент нет доступных ключей\.\n"
+                "Пожалуйста, обратитесь в техподдержку\.",
                 parse_mode='MarkdownV2',
                 reply_markup=get_keyboard()
             )
-            return CHECKING_PAYMENT
-    finally:
-        session.close()
+            return ConversationHandler.END
+    elif payment and payment.status == 'rejected':
+        # Обновляем статус платежа
+        await run_db(repository.set_payment_status, payment.id, 'rejected')
+        
+        # Сбрасываем состояние бота
+        context.user_data.clear()
+        
+        await update.message.reply_text(
+            "❌ *Платеж отклонен\!*\n\n"
+            "Пожалуйста, проверьте правильность оплаты и попробуйте снова или обратитесь в техподдержку\.",
+            parse_mode='MarkdownV2',
+            reply_markup=get_keyboard()
+        )
+        return ConversationHandler.END
+    else:
+        await update.message.reply_text(
+            "⏳ *Платеж проверяется*\n\n"
+            "Вы получите ключ сразу после подтверждения оплаты\.",
+            parse_mode='MarkdownV2',
+            reply_markup=get_keyboard()
+        )
+        return CHECKING_PAYMENT
 
-def get_location_from_key(key: str) -> str:
-    """Определяет локацию из ключа VPN"""
-    try:
-        # Ищем часть ключа после #AmegaVPN-vpn-
-        if '#AmegaVPN-vpn-' in key:
-            location_part = key.split('#AmegaVPN-vpn-')[1].split('-')[0].lower()
-            
-            # Словарь соответствия локаций
-            locations = {
-                'germany': 'Германия',
-                'bulgary': 'Болгария',
-                'austria': 'Австрия',
-                'france': 'Франция'
-            }
-            
-            return locations.get(location_part, 'Неизвестная локация')
-    except Exception as e:
-        logger.error(f"Ошибка при определении локации из ключа: {e}")
-    return 'Неизвестная локация'
+# Названия локаций по коду из ключа (столбец vpn_keys.location)
+LOCATIONS = {
+    'germany': 'Германия',
+    'bulgary': 'Болгария',
+    'austria': 'Австрия',
+    'france': 'Франция'
+}
+
+def get_location_name(location: str) -> str:
+    """Название локации по коду, разобранному из ключа при загрузке"""
+    return LOCATIONS.get(location, 'Неизвестная локация')
+
+async def render_vpn_status(user_id: int):
+    """Текст и кнопки статуса VPN пользователя или None, если ключа нет"""
+    version = await run_db(repository.get_user_key_version, user_id)
+    if version is None:
+        return None
+    cached = vpn_status_cache.get(user_id)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    # Получаем ключ пользователя из базы данных
+    logger.debug(f"Поиск ключа VPN для пользователя {user_id} в базе данных")
+    user = await run_db(repository.get_user_key, user_id)
+    
+    if not user:
+        return None
+
+    logger.info(f"Найден ключ VPN для пользователя {user_id}: {user.key}")
+    
+    # Получаем дату покупки ключа
+    purchase_date = user.activation_date
+    if not purchase_date:
+        logger.warning(f"Дата активации не указана для пользователя {user_id}, используем текущую дату")
+        purchase_date = datetime.utcnow()
+        
+    # Срок действия записывается при выдаче ключа, как и для напоминаний об оплате
+    expiry_date = user.expiration_date
+    if not expiry_date:
+        logger.warning(f"Срок действия не указан для пользователя {user_id}, считаем 30 дней с покупки")
+        expiry_date = purchase_date + timedelta(days=30)
+    logger.debug(f"Дата окончания для пользователя {user_id}: {expiry_date}")
+    
+    # Проверяем, не истек ли срок действия (даты в базе хранятся в UTC)
+    if datetime.utcnow() > expiry_date:
+        status_text = "❌ Истек срок действия"
+        logger.info(f"Срок действия истек для пользователя {user_id}")
+    else:
+        status_text = "✅ Активен"
+        logger.info(f"Ключ активен для пользователя {user_id}")
+        
+    # Трафик из последней синхронизации с x-ui
+    traffic_text = ""
+    if user.traffic_updated_at:
+        used_gb = ((user.traffic_up or 0) + (user.traffic_down or 0)) / (1024 ** 3)
+        traffic_text = f"📶 *Трафик:* {used_gb:.2f} ГБ\n"
+        if user.traffic_total:
+            traffic_text = f"📶 *Трафик:* {used_gb:.2f} из {user.traffic_total / (1024 ** 3):.0f} ГБ\n"
+
+    # Форматируем даты
+    purchase_date_str = purchase_date.strftime("%d.%m.%Y")
+    expiry_date_str = expiry_date.strftime("%d.%m.%Y")
+    
+    # Локация разобрана из ключа при загрузке
+    location = get_location_name(user.location)
+    logger.debug(f"Определена локация для пользователя {user_id}: {location}")
+    
+    # Формируем сообщение
+    message_text = (
+        f"📊 *Статус вашего VPN*\n\n"
+        f"🔑 *Ключ:* `{user.key}`\n"
+        f"📡 *Локация:* {location}\n"
+        f"📅 *Дата покупки:* {purchase_date_str}\n"
+        f"⏳ *Срок действия:* {expiry_date_str}\n"
+        f"📊 *Статус:* {status_text}\n"
+        f"{traffic_text}\n"
+    )
+    
+    # Добавляем кнопки
+    keyboard = [
+        [InlineKeyboardButton("📋 Скопировать ключ", callback_data=f"copy_{user.id}")],
+    ]
+    if status_text == "✅ Активен":
+        keyboard.append([InlineKeyboardButton("🔄 Продлить подписку", callback_data="renew_vpn")])
+    
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    # Запись активного ключа не переживает момент окончания срока, чтобы статус не остался "Активен"
+    ttl = (expiry_date - datetime.utcnow()).total_seconds() if status_text == "✅ Активен" else None
+    vpn_status_cache.set(user_id, ((user.id, user.expiration_date), (message_text, reply_markup)), ttl)
+    return message_text, reply_markup
 
 async def vpn_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Проверка статуса VPN"""
@@ -432,84 +498,34 @@ async def vpn_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
             message = update.message
             logger.info(f"Получен запрос статуса VPN от пользователя {user_id}")
 
-        # Получаем ключ пользователя из базы данных
-        with Session() as session:
-            logger.debug(f"Поиск ключа VPN для пользователя {user_id} в базе данных")
-            user = session.query(VPNKey).filter(VPNKey.user_id == user_id).first()
-            
-            if not user:
-                logger.warning(f"Ключ VPN не найден для пользователя {user_id}")
-                text = (
-                    "❌ У вас нет активного ключа VPN.\n\n"
-                    "Для покупки ключа нажмите кнопку '🔐 Купить VPN'."
-                )
-                if update.callback_query:
-                    await update.callback_query.message.reply_text(text)
-                else:
-                    await update.message.reply_text(text)
-                return
-
-            logger.info(f"Найден ключ VPN для пользователя {user_id}: {user.key}")
-            
-            # Получаем дату покупки ключа
-            purchase_date = user.activation_date
-            if not purchase_date:
-                logger.warning(f"Дата активации не указана для пользователя {user_id}, используем текущую дату")
-                purchase_date = datetime.now()
-                
-            # Вычисляем дату окончания (30 дней с момента покупки)
-            expiry_date = purchase_date + timedelta(days=30)
-            logger.debug(f"Дата окончания для пользователя {user_id}: {expiry_date}")
-            
-            # Проверяем, не истек ли срок действия
-            if datetime.now() > expiry_date:
-                status_text = "❌ Истек срок действия"
-                logger.info(f"Срок действия истек для пользователя {user_id}")
-            else:
-                status_text = "✅ Активен"
-                logger.info(f"Ключ активен для пользователя {user_id}")
-                
-            # Форматируем даты
-            purchase_date_str = purchase_date.strftime("%d.%m.%Y")
-            expiry_date_str = expiry_date.strftime("%d.%m.%Y")
-            
-            # Получаем локацию из ключа
-            location = get_location_from_key(user.key)
-            logger.debug(f"Определена локация для пользователя {user_id}: {location}")
-            
-            # Формируем сообщение
-            message_text = (
-                f"📊 *Статус вашего VPN*\n\n"
-                f"🔑 *Ключ:* `{user.key}`\n"
-                f"📡 *Локация:* {location}\n"
-                f"📅 *Дата покупки:* {purchase_date_str}\n"
-                f"⏳ *Срок действия:* {expiry_date_str}\n"
-                f"📊 *Статус:* {status_text}\n\n"
+        status = await render_vpn_status(user_id)
+        if not status:
+            logger.warning(f"Ключ VPN не найден для пользователя {user_id}")
+            text = (
+                "❌ У вас нет активного ключа VPN.\n\n"
+                "Для покупки ключа нажмите кнопку '🔐 Купить VPN'."
             )
-            
-            # Добавляем кнопки
-            keyboard = [
-                [InlineKeyboardButton("📋 Скопировать ключ", callback_data=f"copy_{user.id}")],
-            ]
-            if status_text == "✅ Активен":
-                keyboard.append([InlineKeyboardButton("🔄 Продлить подписку", callback_data="renew_vpn")])
-            
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            logger.debug(f"Отправка сообщения со статусом VPN пользователю {user_id}")
             if update.callback_query:
-                await update.callback_query.message.reply_text(
-                    message_text,
-                    reply_markup=reply_markup,
-                    parse_mode='Markdown'
-                )
+                await update.callback_query.message.reply_text(text)
             else:
-                await update.message.reply_text(
-                    message_text,
-                    reply_markup=reply_markup,
-                    parse_mode='Markdown'
-                )
-            logger.info(f"Сообщение со статусом VPN успешно отправлено пользователю {user_id}")
+                await update.message.reply_text(text)
+            return
+        message_text, reply_markup = status
+        
+        logger.debug(f"Отправка сообщения со статусом VPN пользователю {user_id}")
+        if update.callback_query:
+            await update.callback_query.message.reply_text(
+                message_text,
+                reply_markup=reply_markup,
+                parse_mode='Markdown'
+            )
+        else:
+            await update.message.reply_text(
+                message_text,
+                reply_markup=reply_markup,
+                parse_mode='Markdown'
+            )
+        logger.info(f"Сообщение со статусом VPN успешно отправлено пользователю {user_id}")
             
     except Exception as e:
         logger.error(f"Ошибка при получении статуса VPN: {str(e)}\n{traceback.format_exc()}")
@@ -547,8 +563,7 @@ async def support(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def copy_key(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     key_id = int(query.data[5:])
-    session = Session()
-    key = session.query(VPNKey).filter(VPNKey.id == key_id).first()
+    key = await run_db(repository.get_key_by_id, key_id)
     if key:
         await query.answer(f"Ключ скопирован: {key.key}", show_alert=True)
         await query.message.reply_text(
@@ -564,7 +579,6 @@ async def copy_key(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "Пожалуйста, попробуйте позже или обратитесь в техподдержку\.",
             parse_mode='MarkdownV2'
         )
-    session.close()
 
 async def amegaai(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Переход к AmegaAI боту"""
@@ -635,42 +649,108 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return ConversationHandler.END
 
+def reminder_broadcast_name(day) -> str:
+    return f"payment_reminder:{day.isoformat()}"
+
 # Добавляем функцию для отправки уведомлений об оплате
 async def send_payment_reminder(context: ContextTypes.DEFAULT_TYPE):
     """Отправка напоминаний об оплате"""
-    session = Session()
+    # Дни до окончания считаются от времени по расписанию, поэтому запуск
+    # после перезапуска бота выбирает тех же получателей, что и плановый
+    now = datetime.combine(datetime.utcnow().date(), REMINDER_TIME)
+    reply_markup = get_keyboard()
+
+    async def reminders():
+        # Только ключи, до окончания которых осталось 5, 3 или 1 день, выбираются в базе
+        # по индексу страницами по мере отправки
+        after = None
+        while True:
+            candidates, after = await run_db(repository.get_reminder_candidates_page, now, (5, 3, 1), after)
+            for user_id, days_until_expiration in candidates:
+                message = (
+                    f"⚠️ *Напоминание об оплате\!*\n\n"
+                    f"До окончания подписки осталось *{days_until_expiration}* "
+                    f"{'день' if days_until_expiration == 1 else 'дня' if days_until_expiration in [2,3,4] else 'дней'}\.\n\n"
+                    f"Для продления подписки используйте кнопку '🔐 Купить VPN'\."
+                )
+                yield user_id, {
+                    'text': message,
+                    'parse_mode': 'MarkdownV2',
+                    'reply_markup': reply_markup
+                }
+            if after is None:
+                return
+
+    # Рассылка с лимитами Telegram; имя с датой позволяет продолжить ее после перезапуска,
+    # а запись каждой доставки сразу исключает повторное напоминание после сбоя
+    await broadcast(context.bot, reminder_broadcast_name(now.date()), reminders(), checkpoint_every=1)
+
+async def catch_up_payment_reminder(context: ContextTypes.DEFAULT_TYPE):
+    """Досылает сегодняшние напоминания, если бот был остановлен во время
+    планового запуска или рассылка прервалась"""
     now = datetime.utcnow()
-    
-    # Получаем все активные ключи
-    active_keys = session.query(VPNKey).filter_by(is_used=True).all()
-    
-    for key in active_keys:
-        if key.activation_date:
-            # Вычисляем дату окончания (30 дней с момента активации)
-            expiry_date = key.activation_date + timedelta(days=30)
-            days_until_expiration = (expiry_date - now).days
-            
-            # Отправляем напоминания за 5, 3 и 1 день
-            if days_until_expiration in [5, 3, 1]:
-                try:
-                    message = (
-                        f"⚠️ *Напоминание об оплате\!*\n\n"
-                        f"До окончания подписки осталось *{days_until_expiration}* "
-                        f"{'день' if days_until_expiration == 1 else 'дня' if days_until_expiration in [2,3,4] else 'дней'}\.\n\n"
-                        f"Для продления подписки используйте кнопку '🔐 Купить VPN'\."
-                    )
-                    
-                    await context.bot.send_message(
-                        chat_id=key.user_id,
-                        text=message,
-                        parse_mode='MarkdownV2',
-                        reply_markup=get_keyboard()
-                    )
-                    logger.info(f"Отправлено напоминание пользователю {key.user_id} за {days_until_expiration} дней")
-                except Exception as e:
-                    logger.error(f"Ошибка при отправке напоминания пользователю {key.user_id}: {e}")
-    
-    session.close()
+    if now.time() < REMINDER_TIME:
+        return
+    if await run_db(repository.is_broadcast_finished, reminder_broadcast_name(now.date())):
+        return
+    logger.info("Сегодняшняя рассылка напоминаний не завершена, продолжаем ее")
+    await send_payment_reminder(context)
+
+# Клиент панели x-ui, создается при первом обращении
+_xui_client = None
+
+def get_xui_client() -> AsyncXUIApi:
+    global _xui_client
+    if _xui_client is None:
+        _xui_client = AsyncXUIApi(os.getenv('XUI_HOST'), os.getenv('XUI_PORT'))
+    return _xui_client
+
+async def sync_traffic_stats(context: ContextTypes.DEFAULT_TYPE):
+    """Синхронизация трафика и сроков клиентов x-ui в таблицу vpn_keys"""
+    clients = await run_db(repository.get_xui_clients)
+    if not clients:
+        return
+
+    # Один снимок inbounds/list на всех клиентов вместо запроса на каждого.
+    # Если панель не ответила, в индексе остался прежний снимок: записывать его
+    # с новым traffic_updated_at нельзя
+    xui = get_xui_client()
+    if not await xui.refresh_client_index():
+        logger.warning("Синхронизация трафика пропущена: панель x-ui не ответила")
+        return
+    stats = await xui.get_clients_stats(
+        emails=[client.xui_email for client in clients if client.xui_email],
+        xui_ids=[client.xui_id for client in clients if client.xui_id]
+    )
+    now = datetime.utcnow()
+    rows = []
+    for client in clients:
+        client_stats = stats.get(client.xui_email) or stats.get(client.xui_id)
+        if not client_stats:
+            continue
+        expiry = client_stats['expiry']
+        rows.append({
+            'id': client.id,
+            'traffic_up': client_stats['up'],
+            'traffic_down': client_stats['down'],
+            'traffic_total': client_stats['total'],
+            'xui_expiry': datetime.utcfromtimestamp(expiry / 1000) if expiry > 0 else None,
+            'traffic_updated_at': now
+        })
+
+    updated = await run_db(repository.update_traffic_stats, rows)
+    # Трафик входит в ответ "Статус VPN"
+    if updated:
+        vpn_status_cache.clear()
+    logger.info(f"Синхронизирован трафик {updated} из {len(clients)} клиентов x-ui")
+
+async def log_cache_stats(context: ContextTypes.DEFAULT_TYPE):
+    """Запись счетчиков кэша статуса VPN в лог для мониторинга"""
+    stats = vpn_status_cache.stats()
+    logger.info(
+        f"Кэш статуса VPN: записей {stats['size']}, попаданий {stats['hits']}, "
+        f"промахов {stats['misses']} ({stats['hit_rate']:.0%}), сброшено {stats['invalidations']}"
+    )
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Отправка справки по командам"""
@@ -701,8 +781,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # Получаем ID ключа из callback_data
             key_id = int(query.data[5:])
             # Получаем ключ из базы данных
-            session = Session()
-            key = session.query(VPNKey).filter(VPNKey.id == key_id).first()
+            key = await run_db(repository.get_key_by_id, key_id)
             if key:
                 await query.message.reply_text(
                     f"🔑 *Ваш ключ VPN:*\n`{key.key}`\n\n"
@@ -772,16 +851,14 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
 async def handle_payment_action(update: Update, context: ContextTypes.DEFAULT_TYPE, action: str, payment_id: int):
-    session = Session()
     try:
-        payment = session.query(Payment).filter_by(id=payment_id).first()
+        payment = await run_db(repository.set_payment_status, payment_id, action)
         if not payment:
             logger.error(f"Платеж с ID {payment_id} не найден")
             return
             
-        payment.status = action
-        session.commit()
         logger.info(f"Платеж {payment_id} {action}ed")
+        vpn_status_cache.invalidate(payment.user_id)
         
         # Отправляем уведомление пользователю
         try:
@@ -820,91 +897,115 @@ async def handle_payment_action(update: Update, context: ContextTypes.DEFAULT_TY
         )
     except Exception as e:
         logger.error(f"Ошибка при обработке платежа: {str(e)}")
-    finally:
-        session.close()
 
-def main():
-    try:
-        # Создание приложения с настройками для httpx и персистентности
-        application = (
-            Application.builder()
-            .token(os.getenv('TELEGRAM_TOKEN'))
-            .http_version('1.1')  # Используем HTTP/1.1 вместо HTTP/2
-            .get_updates_http_version('1.1')
-            .persistence(None)  # Отключаем персистентность на уровне приложения
-            .build()
-        )
-        
-        # Создание ConversationHandler для обработки процесса оплаты
-        conv_handler = ConversationHandler(
-            entry_points=[
-                MessageHandler(filters.Regex('^🔐 Купить VPN$'), buy_vpn),
-                CallbackQueryHandler(buy_vpn, pattern='^renew_vpn$')
-            ],
-            states={
-                WAITING_PAYMENT: [
-                    MessageHandler(filters.PHOTO, handle_payment_receipt),
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message)
-                ],
-                CHECKING_PAYMENT: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, check_payment_status)
-                ]
-            },
-            fallbacks=[
-                CommandHandler('start', start),
-                CommandHandler('help', help_command),
-                MessageHandler(filters.Regex('^🔐 Купить VPN$'), buy_vpn),
-                MessageHandler(filters.Regex('^📊 Статус VPN$'), vpn_status),
-                MessageHandler(filters.Regex('^👨‍💻 Тех поддержка$'), support),
-                MessageHandler(filters.Regex('^🤖 AmegaAI$'), amegaai),
-                MessageHandler(filters.Regex('^ℹ️ О нас$'), about_us)
+# Параметры long polling основного бота
+POLLING_OPTIONS = {
+    'drop_pending_updates': True,  # При polling игнорируем накопившиеся обновления при запуске
+    'pool_timeout': 30.0,  # Увеличиваем таймаут пула
+    'read_timeout': 30.0,  # Увеличиваем таймаут чтения
+    'write_timeout': 30.0,  # Увеличиваем таймаут записи
+    'connect_timeout': 30.0  # Увеличиваем таймаут подключения
+}
+
+async def shutdown_clients(application=None):
+    """Закрывает уведомители и клиент x-ui; post_shutdown приложения"""
+    global _xui_client
+    await shutdown_notifiers()
+    if _xui_client is not None:
+        client, _xui_client = _xui_client, None
+        await client.aclose()
+
+def build_application() -> Application:
+    """Создает приложение основного бота со всеми обработчиками и задачами"""
+    # Создание приложения с настройками для httpx и персистентности
+    application = (
+        Application.builder()
+        .token(os.getenv('TELEGRAM_TOKEN'))
+        .base_url(TELEGRAM_API_URL)
+        .http_version('1.1')  # Используем HTTP/1.1 вместо HTTP/2
+        .get_updates_http_version('1.1')
+        .persistence(SQLitePersistence())  # Состояния разговора об оплате переживают перезапуск
+        .concurrent_updates(update_processor_for('BOT'))  # Пользователи параллельно, каждый по очереди
+        .post_shutdown(shutdown_clients)  # Закрываем соединения уведомителя админ-бота и x-ui
+        .build()
+    )
+
+    # Создание ConversationHandler для обработки процесса оплаты
+    conv_handler = ConversationHandler(
+        entry_points=[
+            MessageHandler(filters.Regex('^🔐 Купить VPN$'), buy_vpn),
+            CallbackQueryHandler(buy_vpn, pattern='^renew_vpn$')
+        ],
+        states={
+            WAITING_PAYMENT: [
+                MessageHandler(filters.PHOTO, handle_payment_receipt),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message)
             ],
-            allow_reentry=True,
-            persistent=False,  # Отключаем персистентность для ConversationHandler
-            name='payment_conversation',
-            per_message=False,  # Отключаем отслеживание для каждого сообщения
-            per_chat=True,  # Включаем отслеживание для каждого чата
-            per_user=True  # Включаем отслеживание для каждого пользователя
-        )
+            CHECKING_PAYMENT: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, check_payment_status)
+            ]
+        },
+        fallbacks=[
+            CommandHandler('start', start),
+            CommandHandler('help', help_command),
+            MessageHandler(filters.Regex('^🔐 Купить VPN$'), buy_vpn),
+            MessageHandler(filters.Regex('^📊 Статус VPN$'), vpn_status),
+            MessageHandler(filters.Regex('^👨‍💻 Тех поддержка$'), support),
+            MessageHandler(filters.Regex('^🤖 AmegaAI$'), amegaai),
+            MessageHandler(filters.Regex('^ℹ️ О нас$'), about_us)
+        ],
+        allow_reentry=True,
+        persistent=True,
+        name='payment_conversation',
+        per_message=False,  # Отключаем отслеживание для каждого сообщения
+        per_chat=True,  # Включаем отслеживание для каждого чата
+        per_user=True  # Включаем отслеживание для каждого пользователя
+    )
 
-        # Добавление обработчиков
-        application.add_handler(conv_handler)
-        application.add_handler(CommandHandler("start", start))
-        application.add_handler(CommandHandler("help", help_command))
-        
-        # Добавляем обработчик callback-запросов перед другими обработчиками
-        application.add_handler(CallbackQueryHandler(handle_callback))
-        
-        # Добавляем отдельные обработчики для каждой кнопки меню
-        application.add_handler(MessageHandler(filters.Regex('^🔐 Купить VPN$'), buy_vpn))
-        application.add_handler(MessageHandler(filters.Regex('^📊 Статус VPN$'), vpn_status))
-        application.add_handler(MessageHandler(filters.Regex('^👨‍💻 Тех поддержка$'), support))
-        application.add_handler(MessageHandler(filters.Regex('^🤖 AmegaAI$'), amegaai))
-        application.add_handler(MessageHandler(filters.Regex('^ℹ️ О нас$'), about_us))
-        
-        # Добавляем общий обработчик для остальных сообщений
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    # Добавление обработчиков
+    application.add_handler(conv_handler)
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("help", help_command))
+    
+    # Добавляем обработчик callback-запросов перед другими обработчиками
+    application.add_handler(CallbackQueryHandler(handle_callback))
+    
+    # Добавляем отдельные обработчики для каждой кнопки меню
+    application.add_handler(MessageHandler(filters.Regex('^🔐 Купить VPN$'), buy_vpn))
+    application.add_handler(MessageHandler(filters.Regex('^📊 Статус VPN$'), vpn_status))
+    application.add_handler(MessageHandler(filters.Regex('^👨‍💻 Тех поддержка$'), support))
+    application.add_handler(MessageHandler(filters.Regex('^🤖 AmegaAI$'), amegaai))
+    application.add_handler(MessageHandler(filters.Regex('^ℹ️ О нас$'), about_us))
+    
+    # Добавляем общий обработчик для остальных сообщений
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
 
-        # Добавляем job для отправки напоминаний об оплате
-        if application.job_queue:
-            application.job_queue.run_daily(send_payment_reminder, time=time(hour=12, minute=0))
-        else:
-            logger.warning("JobQueue не доступен. Напоминания об оплате не будут отправляться.")
+    # Добавляем job для отправки напоминаний об оплате
+    if application.job_queue:
+        application.job_queue.run_daily(send_payment_reminder, time=REMINDER_TIME)
+        application.job_queue.run_once(catch_up_payment_reminder, when=REMINDER_CATCH_UP_DELAY)
+    else:
+        logger.warning("JobQueue не доступен. Напоминания об оплате не будут отправляться.")
 
-        # Создание директорий
-        os.makedirs('receipts', exist_ok=True)
-        os.makedirs('img', exist_ok=True)
+    # Добавляем job для синхронизации трафика с x-ui
+    if application.job_queue and os.getenv('XUI_HOST'):
+        application.job_queue.run_repeating(sync_traffic_stats, interval=XUI_SYNC_INTERVAL, first=10)
+
+    if application.job_queue:
+        application.job_queue.run_repeating(log_cache_stats, interval=CACHE_STATS_INTERVAL, first=CACHE_STATS_INTERVAL)
+
+    # Создание директорий
+    os.makedirs('receipts', exist_ok=True)
+    os.makedirs('img', exist_ok=True)
+    return application
+
+def main():
+    try:
+        application = build_application()
 
         # Запуск бота с обработкой ошибок
         logger.info("Запуск бота...")
-        application.run_polling(
-            allowed_updates=Update.ALL_TYPES,
-            drop_pending_updates=True,  # Игнорируем накопившиеся обновления при запуске
-            pool_timeout=30.0,  # Увеличиваем таймаут пула
-            read_timeout=30.0,  # Увеличиваем таймаут чтения
-            write_timeout=30.0,  # Увеличиваем таймаут записи
-            connect_timeout=30.0  # Увеличиваем таймаут подключения
-        )
+        run_application(application, 'BOT', 8443, **POLLING_OPTIONS)
     except Exception as e:
         logger.error(f"Критическая ошибка при запуске бота: {str(e)}\n{traceback.format_exc()}")
         raise
@@ -0,0 +1,168 @@
+"""Массовая рассылка сообщений с соблюдением лимитов Telegram.
+
+Сообщения отправляются несколькими параллельными воркерами через общий
+token bucket (по умолчанию 30 сообщений в секунду на бота) с интервалом не
+меньше секунды между сообщениями в один чат. RetryAfter приостанавливает
+всю рассылку на указанное время, Forbidden (бот заблокирован) не повторяется.
+Доставленные чаты сохраняются пачками, поэтому перезапущенная рассылка с тем
+же именем продолжает с места сбоя; рассылка, дошедшая до конца, отмечается в
+broadcast_runs. Получатели могут приходить из асинхронного источника, который
+читает базу страницами по мере отправки.
+"""
+import asyncio
+import logging
+import os
+import time
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+from db import run_db
+import repository
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', '30'))
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', '20'))
+# Минимальный интервал между сообщениями в один чат, секунды
+PER_CHAT_INTERVAL = 1.0
+MAX_RETRIES = 3
+CHECKPOINT_EVERY = 100
+
+class TokenBucket:
+    """Асинхронный token bucket: не больше rate операций в секунду"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Останавливает выдачу токенов на seconds секунд (после RetryAfter)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    self._updated = time.monotonic()
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class _ChatLimiter:
+    """Интервал между сообщениями в один и тот же чат"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next_allowed = {}
+
+    async def acquire(self, chat_id: int):
+        now = time.monotonic()
+        allowed = self._next_allowed.get(chat_id, now)
+        self._next_allowed[chat_id] = max(allowed, now) + self.interval
+        if allowed > now:
+            await asyncio.sleep(allowed - now)
+
+async def _deliver(bot, bucket: TokenBucket, chat_limiter: _ChatLimiter, chat_id: int, kwargs: dict) -> str:
+    """Отправляет одно сообщение, возвращает sent, blocked или failed"""
+    for attempt in range(MAX_RETRIES + 1):
+        await chat_limiter.acquire(chat_id)
+        await bucket.acquire()
+        try:
+            await bot.send_message(chat_id=chat_id, **kwargs)
+            return 'sent'
+        except RetryAfter as e:
+            logger.warning(f"Лимит Telegram, рассылка приостановлена на {e.retry_after} с")
+            bucket.pause(float(e.retry_after))
+        except Forbidden:
+            return 'blocked'
+        except BadRequest as e:
+            logger.error(f"Сообщение в чат {chat_id} отклонено: {e}")
+            return 'failed'
+        except NetworkError as e:
+            logger.warning(f"Сетевая ошибка при отправке в чат {chat_id}: {e}")
+            await asyncio.sleep(2 ** attempt)
+        except TelegramError as e:
+            logger.error(f"Ошибка при отправке в чат {chat_id}: {e}")
+            return 'failed'
+    return 'failed'
+
+async def _iterate(messages):
+    """Перебирает обычный или асинхронный источник сообщений"""
+    if hasattr(messages, '__aiter__'):
+        async for item in messages:
+            yield item
+    else:
+        for item in messages:
+            yield item
+
+async def broadcast(bot, name: str, messages, rate: float = None, concurrency: int = None,
+                    checkpoint_every: int = None) -> dict:
+    """Рассылает сообщения и возвращает счетчики по статусам.
+
+    name - имя рассылки для контрольных точек, messages - итерируемые или
+    асинхронно итерируемые пары (chat_id, параметры send_message). Чаты, уже
+    обработанные рассылкой с этим именем, пропускаются. Неудачные отправки не
+    сохраняются и будут повторены при следующем запуске. checkpoint_every - сколько доставок
+    накапливать перед записью в базу (1 - записывать каждую).
+    """
+    concurrency = concurrency or BROADCAST_CONCURRENCY
+    checkpoint_every = checkpoint_every or CHECKPOINT_EVERY
+    bucket = TokenBucket(rate or BROADCAST_RATE)
+    chat_limiter = _ChatLimiter(PER_CHAT_INTERVAL)
+    delivered = await run_db(repository.get_delivered_chat_ids, name)
+    counters = {'sent': 0, 'blocked': 0, 'failed': 0, 'skipped': 0}
+    checkpoint = []
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def flush():
+        if checkpoint:
+            records = checkpoint[:]
+            checkpoint.clear()
+            await run_db(repository.save_deliveries, name, records)
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            chat_id, kwargs = item
+            status = await _deliver(bot, bucket, chat_limiter, chat_id, kwargs)
+            counters[status] += 1
+            if status != 'failed':
+                checkpoint.append((chat_id, status))
+                if len(checkpoint) >= checkpoint_every:
+                    await flush()
+
+    started = time.monotonic()
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        async for chat_id, kwargs in _iterate(messages):
+            if chat_id in delivered:
+                counters['skipped'] += 1
+                continue
+            await queue.put((chat_id, kwargs))
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+        await flush()
+    await run_db(repository.finish_broadcast, name)
+
+    elapsed = time.monotonic() - started
+    logger.info(
+        f"Рассылка {name} завершена за {elapsed:.1f} с: отправлено {counters['sent']}, "
+        f"заблокировали бота {counters['blocked']}, ошибок {counters['failed']}, "
+        f"пропущено {counters['skipped']}"
+    )
+    return counters
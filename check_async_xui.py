@@ -0,0 +1,127 @@
+"""Проверка AsyncXUIApi на локальном поддельном сервере 3x-ui.
+
+Поднимает HTTP-сервер, отвечающий как API панели, и проверяет формат
+ответов, кэширование индекса клиентов, повторы при ошибках 5xx, таймауты
+и ограничение числа одновременных запросов. Запуск: python check_async_xui.py
+"""
+import asyncio
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xui_api import AsyncXUIApi
+
+CLIENTS = [
+    {'id': i, 'inboundId': 1, 'email': f'user{i}', 'up': i, 'down': 2 * i, 'total': 10 * i,
+     'enable': i % 2 == 0, 'expiryTime': 1_700_000_000_000 + i}
+    for i in range(1, 101)
+]
+INBOUNDS = {
+    'success': True,
+    'obj': [{
+        'id': 1,
+        'settings': json.dumps({'clients': [{'id': f'uuid-{c["id"]}', 'email': c['email']} for c in CLIENTS]}),
+        'clientStats': CLIENTS,
+    }],
+}
+
+class FakePanel(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    hits = {}
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+    failures_left = 0
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.hits[self.path] = cls.hits.get(self.path, 0) + 1
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            if self.headers.get('X-UI-Token') != 'secret-token':
+                self.send_json(401, {'success': False})
+            elif self.path == '/panel/api/inbounds/list':
+                self.send_json(200, INBOUNDS)
+            elif self.path.startswith('/panel/api/inbounds/getClientStats/'):
+                time.sleep(0.05)
+                self.send_json(200, {'success': True, 'obj': {c['email']: c for c in CLIENTS}})
+            elif self.path == '/panel/api/inbounds/flaky/list':
+                with cls.lock:
+                    fail = cls.failures_left > 0
+                    cls.failures_left -= 1
+                if fail:
+                    self.send_json(503, {'success': False})
+                else:
+                    self.send_json(200, INBOUNDS)
+            elif self.path == '/panel/api/inbounds/slow/list':
+                time.sleep(1)
+                self.send_json(200, INBOUNDS)
+            else:
+                self.send_json(404, {'success': False})
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+async def run_checks(port):
+    errors = []
+
+    def check(condition, message):
+        print(f"{'✅' if condition else '❌'} {message}")
+        if not condition:
+            errors.append(message)
+
+    async with AsyncXUIApi('127.0.0.1', port, token='secret-token', prefix='', scheme='http',
+                           max_connections=4, retries=2, backoff=0.01) as api:
+        statuses = await asyncio.gather(*(api.get_client_status(f'user{i}') for i in range(1, 101)))
+        check(statuses[1] == {'status': 'active', 'expiry': 1_700_000_000_002, 'total': 20, 'used': 6,
+                              'remaining': 14.0},
+              'get_client_status возвращает прежний формат')
+        check(FakePanel.hits.get('/panel/api/inbounds/list') == 1,
+              '100 одновременных запросов статуса дали один запрос к панели')
+        check(await api.get_client_status('missing', 'uuid-7') == statuses[6], 'поиск по UUID клиента')
+        check(await api.get_client_status('missing') is None, 'неизвестный клиент -> None')
+
+        stats = await asyncio.gather(*(api.get_client_stats(1, f'user{i}') for i in range(1, 21)))
+        check(stats[2] == {'up': 3, 'down': 6}, 'get_client_stats возвращает прежний формат')
+        check(FakePanel.max_in_flight <= 4, f'не более 4 одновременных запросов (было {FakePanel.max_in_flight})')
+
+        FakePanel.failures_left = 2
+        flaky = await api._get_json('/api/inbounds/flaky/list')
+        check(flaky is not None and FakePanel.hits.get('/panel/api/inbounds/flaky/list') == 3,
+              'ответы 503 повторяются с задержкой')
+
+        started = time.perf_counter()
+        slow = await api._get_json('/api/inbounds/slow/list', timeout=0.1)
+        elapsed = time.perf_counter() - started
+        check(slow is None and elapsed < 1, f'таймаут запроса соблюдается ({elapsed:.2f} с на 3 попытки)')
+
+    async with AsyncXUIApi('127.0.0.1', port, token='wrong', prefix='', scheme='http') as api:
+        check(await api.get_client_status('user1') is None, 'ошибка авторизации -> None')
+    return errors
+
+def main():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakePanel)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        errors = asyncio.run(run_checks(server.server_address[1]))
+    finally:
+        server.shutdown()
+    if errors:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Проверка числа соединений уведомителя на поддельном сервере Bot API.
+
+Отправляет уведомления о 1000 подтвержденных платежей через общий Notifier
+и падает с ненулевым кодом, если сервер увидел больше соединений, чем
+размер пула. Запуск: python check_notifier.py
+"""
+import asyncio
+import sys
+import threading
+import time
+from fake_bot_api import FakeBotApi, api_url, start_server
+from notifier import Notifier
+
+PAYMENTS_COUNT = 1_000
+POOL_SIZE = 8
+
+class CountingBotApi(FakeBotApi):
+    """Считает соединения и запросы"""
+    connections = 0
+    requests = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with CountingBotApi.lock:
+            CountingBotApi.connections += 1
+
+    def respond(self, method, params):
+        with CountingBotApi.lock:
+            CountingBotApi.requests += 1
+        return super().respond(method, params)
+
+async def approve_payments(base_url):
+    notifier = Notifier('123:test', pool_size=POOL_SIZE, base_url=base_url)
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        notifier.send_message(chat_id=user_id, text='🎉 Оплата подтверждена!')
+        for user_id in range(PAYMENTS_COUNT)
+    ))
+    elapsed = time.perf_counter() - started
+    await notifier.shutdown()
+    return elapsed
+
+def main():
+    server = start_server(CountingBotApi)
+    try:
+        elapsed = asyncio.run(approve_payments(api_url(server)))
+    finally:
+        server.shutdown()
+    print(f"Уведомлений: {PAYMENTS_COUNT} за {elapsed:.2f} с, запросов к API: {CountingBotApi.requests}, "
+          f"соединений: {CountingBotApi.connections}")
+    if CountingBotApi.connections > POOL_SIZE:
+        print(f"❌ Открыто больше {POOL_SIZE} соединений")
+        sys.exit(1)
+    print(f"✅ Соединений не больше размера пула ({POOL_SIZE})")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Проверка supervisor.Supervisor на подставных процессах.
+
+Запускает три процесса: первый пишет только в stdout и молчит в stderr,
+второй пишет только в stderr, третий сразу падает. Вывод обоих работающих
+процессов должен читаться без задержек друг из-за друга, падающий процесс
+должен перезапускаться с растущей задержкой до срабатывания crash loop, а
+SIGTERM самому наблюдателю должен штатно остановить процессы.
+Запуск: python check_supervisor.py
+"""
+import asyncio
+import logging
+import os
+import signal
+import sys
+import tempfile
+import time
+
+RUN_FOR = 3.0
+TICK = 0.05
+
+QUIET_STDERR = f"""
+import signal, sys, time
+def stop(signum, frame):
+    open(sys.argv[1], 'w').write('stopped')
+    sys.exit(0)
+signal.signal(signal.SIGTERM, stop)
+while True:
+    print('tick', time.monotonic(), flush=True)
+    time.sleep({TICK})
+"""
+
+QUIET_STDOUT = f"""
+import sys, time
+while True:
+    print('tock', time.monotonic(), file=sys.stderr, flush=True)
+    time.sleep({TICK})
+"""
+
+CRASHING = """
+import sys
+print('boom', file=sys.stderr)
+sys.exit(3)
+"""
+
+class Collector(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append((time.monotonic(), record.getMessage()))
+
+def script(directory: str, name: str, source: str) -> str:
+    path = os.path.join(directory, name)
+    with open(path, 'w') as f:
+        f.write(source)
+    return path
+
+async def run(tmp: str, collector: Collector):
+    from supervisor import Supervisor, Child
+
+    marker = os.path.join(tmp, 'stopped')
+    supervisor = Supervisor(
+        [
+            Child('stdout', [sys.executable, script(tmp, 'stdout.py', QUIET_STDERR), marker]),
+            Child('stderr', [sys.executable, script(tmp, 'stderr.py', QUIET_STDOUT)]),
+            Child('crash', [sys.executable, script(tmp, 'crash.py', CRASHING)]),
+        ],
+        restart_delay=0.1, max_restart_delay=0.8, stable_uptime=10,
+        crash_loop_restarts=5, crash_loop_window=10, crash_loop_delay=60,
+        stop_timeout=2, report_interval=3600,
+    )
+    asyncio.get_running_loop().call_later(RUN_FOR, os.kill, os.getpid(), signal.SIGTERM)
+    started = time.monotonic()
+    await supervisor.run()
+    return supervisor, time.monotonic() - started, os.path.exists(marker)
+
+def main():
+    collector = Collector()
+    logging.getLogger('supervisor').addHandler(collector)
+    logging.getLogger('supervisor').setLevel(logging.INFO)
+    with tempfile.TemporaryDirectory() as tmp:
+        supervisor, elapsed, stopped_gracefully = asyncio.run(run(tmp, collector))
+
+    messages = [message for _, message in collector.records]
+    ticks = [at for at, message in collector.records if message.startswith('[stdout] tick')]
+    tocks = [at for at, message in collector.records if message.startswith('[stderr] tock')]
+    crash_starts = [at for at, message in collector.records if message.startswith('✅ crash запущен')]
+    children = {child.name: child for child in supervisor.children}
+    delays = [float(message.rsplit('через ', 1)[1].split()[0])
+              for message in messages if message.startswith('❌ crash завершился')]
+
+    print(f"Строк stdout: {len(ticks)}, строк stderr: {len(tocks)} за {RUN_FOR:.0f} с")
+    print(f"Запусков падающего процесса: {len(crash_starts)}, задержки перезапуска: "
+          + ', '.join(f'{delay:.2f}' for delay in delays))
+    print(f"Остановка заняла {elapsed - RUN_FOR:.2f} с")
+    for message in messages:
+        if message.startswith('📊'):
+            print(message)
+
+    failures = []
+    expected_lines = RUN_FOR / TICK * 0.7
+    if len(ticks) < expected_lines or len(tocks) < expected_lines:
+        failures.append('вывод процессов читался с задержками')
+    if max(b - a for a, b in zip(ticks, ticks[1:])) > 0.5:
+        failures.append('чтение stdout блокировалось на молчащем stderr')
+    if len(crash_starts) != 5 or delays[:4] != [0.1, 0.2, 0.4, 0.8] or delays[4] != 60:
+        failures.append('перезапуски без экспоненциальной задержки')
+    if not children['crash'].crash_loop or children['crash'].restarts != 4:
+        failures.append('crash loop не обнаружен')
+    if not stopped_gracefully or children['stdout'].last_exit != 0:
+        failures.append('процесс не получил SIGTERM для штатной остановки')
+    if children['stdout'].restarts or children['stderr'].restarts:
+        failures.append('работающие процессы перезапускались')
+    if elapsed - RUN_FOR > 1.5:
+        failures.append('остановка заняла слишком много времени')
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print('✅ Вывод читается параллельно, перезапуски с задержкой, SIGTERM передается процессам')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""Проверка параллельной обработки обновлений с очередью на пользователя.
+
+Прогоняет через Application с PerUserUpdateProcessor по несколько
+обновлений от каждого из N пользователей; обработчик спит HANDLER_DELAY.
+Независимые пользователи должны обслуживаться параллельно (общее время
+около STEPS * HANDLER_DELAY, а не N * STEPS * HANDLER_DELAY), обновления
+одного пользователя - по одному и в порядке отправки, а число одновременных
+обработчиков не должно превышать лимит. Разговор об оплате в
+ConversationHandler должен пройти все шаги у каждого пользователя.
+Затем один пользователь отправляет CHATTY_UPDATES сообщений подряд, а второй -
+одно: очередь первого не должна задерживать второго.
+Запуск: python check_update_processor.py [пользователей]
+"""
+import asyncio
+import sys
+import time
+from fake_bot_api import api_url, start_server
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+MAX_CONCURRENT = 64
+HANDLER_DELAY = 0.05
+STEPS = ('buy', 'receipt', 'check')
+WAITING_PAYMENT, CHECKING_PAYMENT = range(1, 3)
+CHATTY_UPDATES = 200
+
+def message(update_id: int, user_id: int, text: str) -> dict:
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'User'},
+            'text': text,
+        }
+    }
+
+def synthetic_updates():
+    """Шаги разговора вперемешку: каждый пользователь отправляет их подряд"""
+    update_id = 0
+    for user_id in range(1, USERS + 1):
+        for step in STEPS:
+            update_id += 1
+            yield message(update_id, user_id, step)
+
+async def run(base_url: str):
+    from telegram import Update
+    from telegram.ext import Application, ConversationHandler, MessageHandler, filters
+    from update_processor import PerUserUpdateProcessor
+
+    updates = list(synthetic_updates())
+    received = {}  # пользователь -> шаги в порядке обработки
+    active_users = set()
+    stats = {'active': 0, 'max_active': 0, 'overlaps': 0}
+    done = asyncio.Event()
+
+    def step(next_state):
+        async def handler(update, context):
+            user_id = update.effective_user.id
+            if user_id in active_users:
+                stats['overlaps'] += 1
+            active_users.add(user_id)
+            stats['active'] += 1
+            stats['max_active'] = max(stats['max_active'], stats['active'])
+            await asyncio.sleep(HANDLER_DELAY)
+            received.setdefault(user_id, []).append(update.message.text)
+            stats['active'] -= 1
+            active_users.discard(user_id)
+            if sum(map(len, received.values())) == len(updates):
+                done.set()
+            return next_state
+        return handler
+
+    application = (
+        Application.builder()
+        .token('123:test')
+        .base_url(base_url)
+        .concurrent_updates(PerUserUpdateProcessor(MAX_CONCURRENT))
+        .build()
+    )
+    buy, receipt, check = (filters.Regex(f'^{name}$') for name in STEPS)
+    application.add_handler(ConversationHandler(
+        entry_points=[MessageHandler(buy, step(WAITING_PAYMENT))],
+        states={
+            WAITING_PAYMENT: [MessageHandler(receipt, step(CHECKING_PAYMENT))],
+            CHECKING_PAYMENT: [MessageHandler(check, step(ConversationHandler.END))],
+        },
+        fallbacks=[],
+    ))
+
+    await application.initialize()
+    await application.start()
+    started = time.perf_counter()
+    for data in updates:
+        await application.update_queue.put(Update.de_json(data, application.bot))
+    try:
+        await asyncio.wait_for(done.wait(), timeout=120)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - started
+    await application.stop()
+    await application.shutdown()
+    return received, stats, elapsed
+
+async def run_chatty(base_url: str):
+    """Секунды до обработки единственного сообщения второго пользователя"""
+    from telegram import Update
+    from telegram.ext import Application, MessageHandler, filters
+    from update_processor import PerUserUpdateProcessor
+
+    handled = asyncio.Event()
+
+    async def handler(update, context):
+        await asyncio.sleep(HANDLER_DELAY)
+        if update.effective_user.id == 2:
+            handled.set()
+
+    application = (
+        Application.builder()
+        .token('123:test')
+        .base_url(base_url)
+        .concurrent_updates(PerUserUpdateProcessor(MAX_CONCURRENT))
+        .build()
+    )
+    application.add_handler(MessageHandler(filters.TEXT, handler))
+    await application.initialize()
+    await application.start()
+    started = time.perf_counter()
+    for update_id in range(1, CHATTY_UPDATES + 1):
+        await application.update_queue.put(Update.de_json(message(update_id, 1, 'spam'), application.bot))
+    await application.update_queue.put(Update.de_json(message(CHATTY_UPDATES + 1, 2, 'hello'), application.bot))
+    try:
+        await asyncio.wait_for(handled.wait(), timeout=CHATTY_UPDATES * HANDLER_DELAY * 2)
+    except asyncio.TimeoutError:
+        pass
+    waited = time.perf_counter() - started
+    # stop дожидается остатка очереди первого пользователя
+    await application.stop()
+    await application.shutdown()
+    return waited
+
+def main():
+    server = start_server()
+    try:
+        received, stats, elapsed = asyncio.run(run(api_url(server)))
+        chatty_wait = asyncio.run(run_chatty(api_url(server)))
+    finally:
+        server.shutdown()
+
+    sequential = USERS * len(STEPS) * HANDLER_DELAY
+    # Лимит обработчиков делит пользователей на волны
+    ideal = -(-USERS // MAX_CONCURRENT) * len(STEPS) * HANDLER_DELAY
+    print(f"Пользователей: {USERS}, обновлений: {USERS * len(STEPS)}, лимит {MAX_CONCURRENT}")
+    print(f"Время: {elapsed:.2f} с (последовательно было бы {sequential:.1f} с, минимум {ideal:.2f} с)")
+    print(f"Одновременных обработчиков: до {stats['max_active']}")
+    print(f"Сообщение второго пользователя за {CHATTY_UPDATES} сообщениями первого "
+          f"обработано через {chatty_wait:.2f} с")
+
+    failures = []
+    unordered = [user_id for user_id, steps in received.items() if steps != list(STEPS)]
+    if len(received) != USERS or unordered:
+        failures.append(f"разговор прошел не у всех: {USERS - len(received)} без обновлений, "
+                        f"{len(unordered)} с нарушенным порядком или пропусками")
+    if stats['overlaps']:
+        failures.append(f"обновления одного пользователя пересекались {stats['overlaps']} раз")
+    if stats['max_active'] > MAX_CONCURRENT:
+        failures.append(f"превышен лимит обработчиков: {stats['max_active']}")
+    if elapsed > ideal * 2 + 0.5:
+        failures.append("пользователи обслуживались не параллельно")
+    if chatty_wait > HANDLER_DELAY * 4:
+        failures.append("очередь одного пользователя задерживает других")
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print('✅ Пользователи обслуживаются параллельно и не ждут чужих очередей, обновления каждого - по порядку')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Проверка разбора ключей VLESS на случайных и испорченных ключах.
+
+Для сгенерированных корректных ключей поля должны совпасть с исходными, а
+xui_id и xui_email - с прежним разбором через split. Случайно испорченные
+ключи должны либо разбираться в корректные поля, либо вызывать ValueError,
+но не другое исключение. Запуск: python check_vless_parser.py
+"""
+import random
+import string
+import sys
+from vless import parse_vless
+
+SEED = 20240101
+VALID_COUNT = 20_000
+MUTATIONS_COUNT = 200_000
+
+LOCATIONS = ['germany', 'bulgary', 'austria', 'france']
+MALFORMED = [
+    '', ' ', 'vless://', 'vless://@host:443', 'vless://uuid@:443', 'vless://uuid@host',
+    'vless://uuid@host:', 'vless://uuid@host:0', 'vless://uuid@host:70000', 'vless://uuid@host:port',
+    'vmess://uuid@host:443', 'uuid@host:443', 'vless://uuid@ho st:443', 'vless://uuid@[::1:443',
+    'vless://uuid@host:443?type=tcp #name', 'vless://a@b@host:443',
+]
+
+def old_identifiers(key):
+    """Прежний разбор xui_email и xui_id через split"""
+    identifier = key.split('#')[-1] if '#' in key else None
+    if identifier and identifier.startswith('AmegaVPN-'):
+        identifier = identifier[len('AmegaVPN-'):]
+    try:
+        xui_id = key.split('://')[1].split('@')[0]
+    except Exception:
+        xui_id = None
+    return identifier, xui_id
+
+def random_key(rng):
+    uuid = '-'.join(''.join(rng.choices('0123456789abcdef', k=n)) for n in (8, 4, 4, 4, 12))
+    host = rng.choice([
+        '.'.join(str(rng.randint(0, 255)) for _ in range(4)),
+        f"{''.join(rng.choices(string.ascii_lowercase, k=8))}.example.com",
+        '[2001:db8::1]',
+    ])
+    port = rng.randint(1, 65535)
+    location = rng.choice(LOCATIONS)
+    transport = rng.choice(['tcp', 'ws', 'grpc'])
+    security = rng.choice(['reality', 'tls', 'none'])
+    query = f"type={transport}&security={security}&sni=mirror.yandex.ru&fp=chrome&spx=%2F"
+    fragment = f"AmegaVPN-vpn-{location}-{rng.randint(1, 9999)}-user"
+    key = f"vless://{uuid}@{host}:{port}?{query}#{fragment}"
+    return key, (uuid, host.strip('[]'), port, location, transport, security)
+
+def mutate(rng, key):
+    chars = list(key)
+    for _ in range(rng.randint(1, 4)):
+        action = rng.random()
+        position = rng.randrange(len(chars) + 1)
+        if action < 0.4 and chars:
+            del chars[min(position, len(chars) - 1)]
+        elif action < 0.8:
+            chars.insert(position, rng.choice(string.printable + '@:#?[]%Ж'))
+        else:
+            chars = chars[:position]
+    return ''.join(chars)
+
+def check_parsed(key, parsed):
+    assert parsed.xui_id and parsed.host, key
+    assert 0 < parsed.port < 65536, key
+    assert not any(ch.isspace() for ch in parsed.host), key
+
+def main():
+    rng = random.Random(SEED)
+    errors = []
+
+    valid = []
+    for _ in range(VALID_COUNT):
+        key, (uuid, host, port, location, transport, security) = random_key(rng)
+        valid.append(key)
+        parsed = parse_vless(key)
+        expected_email, expected_id = old_identifiers(key)
+        if (parsed.xui_id, parsed.xui_email) != (expected_id, expected_email):
+            errors.append(f"расходится с прежним разбором: {key}")
+        if (parsed.xui_id, parsed.host, parsed.port, parsed.location, parsed.transport, parsed.security) != \
+                (uuid, host, port, location, transport, security):
+            errors.append(f"неверные поля: {key} -> {parsed}")
+
+    for key in MALFORMED:
+        try:
+            parse_vless(key)
+            errors.append(f"некорректный ключ разобран: {key!r}")
+        except ValueError:
+            pass
+
+    parsed_count = rejected_count = 0
+    for _ in range(MUTATIONS_COUNT):
+        key = mutate(rng, rng.choice(valid))
+        try:
+            check_parsed(key, parse_vless(key))
+            parsed_count += 1
+        except ValueError:
+            rejected_count += 1
+        except Exception as e:
+            errors.append(f"{type(e).__name__} на ключе {key!r}: {e}")
+
+    print(f"Корректных ключей: {VALID_COUNT}, испорченных: {MUTATIONS_COUNT} "
+          f"(разобрано {parsed_count}, отклонено {rejected_count})")
+    if errors:
+        for error in errors[:20]:
+            print(f"  {error}")
+        print(f"❌ Ошибок разбора: {len(errors)}")
+        sys.exit(1)
+    print('✅ Разбор ключей корректен')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import create_engine, event, Column, Integer, String, Boolean, DateTime
+from sqlalchemy.orm import declarative_base, sessionmaker
+from dotenv import load_dotenv
+from migrations import apply_migrations
+
+# Загрузка переменных окружения
+load_dotenv()
+
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///vpn_keys.db')
+# Количество потоков, в которых выполняются запросы к базе данных
+DB_WORKERS = int(os.getenv('DB_WORKERS', '4'))
+
+# Создание базы данных
+Base = declarative_base()
+engine = create_engine(DATABASE_URL, connect_args={'timeout': 30})
+# expire_on_commit=False позволяет читать поля объектов после закрытия сессии
+Session = sessionmaker(bind=engine, expire_on_commit=False)
+
+@event.listens_for(engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL позволяет читать базу параллельно с записью"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA busy_timeout=30000')
+    cursor.close()
+
+class VPNKey(Base):
+    __tablename__ = 'vpn_keys'
+
+    id = Column(Integer, primary_key=True)
+    key = Column(String, unique=True)
+    is_used = Column(Boolean, default=False)
+    user_id = Column(Integer, nullable=True)
+    username = Column(String, nullable=True)
+    phone = Column(String, nullable=True)
+    email = Column(String, nullable=True)  # Старое поле, можно оставить для обратной совместимости
+    xui_email = Column(String, nullable=True)  # Новый идентификатор для x-ui
+    xui_id = Column(String, nullable=True)  # Новый ID клиента из x-ui
+    # Поля ключа VLESS, заполняются при загрузке ключа (repository.import_keys)
+    host = Column(String, nullable=True)
+    port = Column(Integer, nullable=True)
+    location = Column(String, nullable=True)
+    transport = Column(String, nullable=True)
+    security = Column(String, nullable=True)
+    sni = Column(String, nullable=True)
+    activation_date = Column(DateTime, default=datetime.utcnow)
+    expiration_date = Column(DateTime)
+    # Трафик и срок клиента в x-ui, обновляются задачей синхронизации
+    traffic_up = Column(Integer, nullable=True)
+    traffic_down = Column(Integer, nullable=True)
+    traffic_total = Column(Integer, nullable=True)
+    xui_expiry = Column(DateTime, nullable=True)
+    traffic_updated_at = Column(DateTime, nullable=True)
+
+class Payment(Base):
+    __tablename__ = 'payments'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer)
+    username = Column(String, nullable=True)
+    phone = Column(String, nullable=True)
+    status = Column(String)  # pending, approved, rejected
+    receipt_path = Column(String, nullable=True)
+    # file_id чека действует только для бота, который его получил
+    receipt_file_id = Column(String, nullable=True)  # в основном боте
+    receipt_file_unique_id = Column(String, nullable=True)
+    admin_receipt_file_id = Column(String, nullable=True)  # в админ-боте
+    payment_date = Column(DateTime, default=datetime.utcnow)
+    next_payment_date = Column(DateTime)
+    approved_at = Column(DateTime, nullable=True)  # для статистики подтверждений по дням
+
+class MediaFile(Base):
+    """file_id статических файлов, уже загруженных в Telegram"""
+    __tablename__ = 'media_files'
+
+    bot_id = Column(Integer, primary_key=True)  # file_id действует только для своего бота
+    path = Column(String, primary_key=True)
+    sha256 = Column(String)  # при изменении содержимого файл загружается заново
+    file_id = Column(String)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class BroadcastDelivery(Base):
+    """Получатели рассылки, которым сообщение уже доставлено"""
+    __tablename__ = 'broadcast_deliveries'
+
+    broadcast = Column(String, primary_key=True)  # имя рассылки, например payment_reminder:2024-01-31
+    chat_id = Column(Integer, primary_key=True)
+    status = Column(String)  # sent, blocked
+    sent_at = Column(DateTime, default=datetime.utcnow)
+
+class BroadcastRun(Base):
+    """Рассылки, дошедшие до конца списка получателей"""
+    __tablename__ = 'broadcast_runs'
+
+    name = Column(String, primary_key=True)
+    finished_at = Column(DateTime, default=datetime.utcnow)
+
+class ConversationState(Base):
+    """Состояния ConversationHandler, переживающие перезапуск бота"""
+    __tablename__ = 'conversation_states'
+
+    name = Column(String, primary_key=True)  # имя обработчика, например payment_conversation
+    key = Column(String, primary_key=True)  # ключ разговора в JSON, например [chat_id, user_id]
+    state = Column(String)  # состояние в JSON
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+# Создаем таблицы, если они не существуют, и применяем миграции
+def init_db():
+    Base.metadata.create_all(engine)
+    apply_migrations(engine)
+
+# Отдельный пул потоков для работы с базой, чтобы запросы не блокировали event loop
+_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix='db')
+
+async def run_db(func, *args, **kwargs):
+    """Выполняет синхронную функцию работы с базой в пуле потоков базы данных"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
@@ -0,0 +1,80 @@
+"""Поддельный сервер Bot API для скриптов check_*.py и bench_*.py.
+
+FakeBotApi отвечает на getMe, getUpdates (длинный опрос без обновлений),
+send* (отправленное сообщение) и на остальные методы - True. Скрипты с
+особым поведением сервера (задержки, ошибки, счетчики) наследуют класс и
+переопределяют respond() или setup(). Сервер запускается в фоновом потоке:
+
+    server = start_server()
+    ... Bot('123:test', base_url=api_url(server)) ...
+    server.shutdown()
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'AmegaVPN', 'username': 'amega_bot'}
+
+def ok(result) -> dict:
+    return {'ok': True, 'result': result}
+
+def error(code: int, description: str, **parameters) -> dict:
+    payload = {'ok': False, 'error_code': code, 'description': description}
+    if parameters:
+        payload['parameters'] = parameters
+    return payload
+
+class FakeBotApi(BaseHTTPRequestHandler):
+    """Обработчик запросов к методам Bot API"""
+    protocol_version = 'HTTP/1.1'
+    # Сколько длится длинный опрос getUpdates без обновлений, секунды
+    poll_delay = 0.5
+
+    def log_message(self, *args):
+        pass
+
+    def params(self, raw: bytes) -> dict:
+        """Параметры запроса: PTB отправляет JSON или форму"""
+        if not raw:
+            return {}
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            return json.loads(raw)
+        return {name: values[0] for name, values in parse_qs(raw.decode()).items()}
+
+    def respond(self, method: str, params: dict) -> dict:
+        """Ответ на вызов метода в формате Bot API"""
+        if method == 'getMe':
+            return ok(BOT_USER)
+        if method == 'getUpdates':
+            time.sleep(self.poll_delay)
+            return ok([])
+        if method.startswith('send'):
+            chat_id = int(params.get('chat_id', 1))
+            return ok({'message_id': 1, 'date': int(time.time()), 'chat': {'id': chat_id, 'type': 'private'}})
+        return ok(True)
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        method = self.path.rsplit('/', 1)[-1]
+        payload = self.respond(method, self.params(raw))
+        body = json.dumps(payload).encode()
+        try:
+            self.send_response(200 if payload['ok'] else payload['error_code'])
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Клиент закрыл соединение, например бот остановился во время длинного опроса
+
+def start_server(handler=FakeBotApi) -> ThreadingHTTPServer:
+    """Запускает сервер на свободном локальном порту в фоновом потоке"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def api_url(server: ThreadingHTTPServer) -> str:
+    """base_url для Bot и ApplicationBuilder, TELEGRAM_API_URL для ботов"""
+    return f'http://127.0.0.1:{server.server_address[1]}/bot'
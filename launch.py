@@ -0,0 +1,87 @@
+"""Запуск приложения бота через long polling или webhook.
+
+Режим выбирается переменными окружения с префиксом бота (BOT_ для
+основного, ADMIN_BOT_ для админ-бота):
+
+    <PREFIX>_UPDATE_MODE             polling (по умолчанию) или webhook
+    <PREFIX>_WEBHOOK_URL             внешний адрес, например https://vpn.example.com
+    <PREFIX>_WEBHOOK_LISTEN          адрес локального HTTP-сервера (127.0.0.1)
+    <PREFIX>_WEBHOOK_PORT            порт локального HTTP-сервера
+    <PREFIX>_WEBHOOK_PATH            путь webhook (по умолчанию имя бота)
+    <PREFIX>_WEBHOOK_SECRET          секрет заголовка X-Telegram-Bot-Api-Secret-Token
+    <PREFIX>_WEBHOOK_MAX_CONNECTIONS одновременные соединения Telegram (40)
+
+Адрес Bot API задается TELEGRAM_API_URL, например для локального сервера
+telegram-bot-api (http://127.0.0.1:8081/bot).
+
+В режиме webhook накопившиеся обновления не сбрасываются: Telegram
+доставит сообщения, отправленные во время перезапуска.
+"""
+import logging
+import os
+import secrets
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org/bot')
+
+def webhook_settings(prefix: str, default_port: int) -> dict:
+    """Параметры run_webhook для бота или None, если выбран polling"""
+    mode = os.getenv(f'{prefix}_UPDATE_MODE', 'polling').lower()
+    if mode != 'webhook':
+        return None
+    base_url = os.getenv(f'{prefix}_WEBHOOK_URL')
+    if not base_url:
+        raise RuntimeError(f"{prefix}_UPDATE_MODE=webhook требует {prefix}_WEBHOOK_URL")
+    url_path = os.getenv(f'{prefix}_WEBHOOK_PATH', prefix.lower()).strip('/')
+    secret_token = os.getenv(f'{prefix}_WEBHOOK_SECRET')
+    if not secret_token:
+        # Секрет без настройки меняется при каждом запуске вместе с регистрацией webhook
+        secret_token = secrets.token_urlsafe(32)
+    return {
+        'listen': os.getenv(f'{prefix}_WEBHOOK_LISTEN', '127.0.0.1'),
+        'port': int(os.getenv(f'{prefix}_WEBHOOK_PORT', str(default_port))),
+        'url_path': url_path,
+        'webhook_url': f"{base_url.rstrip('/')}/{url_path}",
+        'secret_token': secret_token,
+        'max_connections': int(os.getenv(f'{prefix}_WEBHOOK_MAX_CONNECTIONS', '40')),
+    }
+
+def run_application(application, prefix: str, default_port: int, **polling_kwargs):
+    """Запускает приложение в режиме, выбранном для бота с префиксом prefix"""
+    settings = webhook_settings(prefix, default_port)
+    if settings is None:
+        logger.info("Получение обновлений через long polling")
+        application.run_polling(allowed_updates=Update.ALL_TYPES, **polling_kwargs)
+        return
+    logger.info(
+        f"Получение обновлений через webhook {settings['webhook_url']} "
+        f"(слушаем {settings['listen']}:{settings['port']})"
+    )
+    application.run_webhook(
+        allowed_updates=Update.ALL_TYPES,
+        drop_pending_updates=False,
+        **settings
+    )
+
+async def start_updater(application, prefix: str, default_port: int, **polling_kwargs):
+    """Запускает получение обновлений в уже работающем event loop.
+
+    Используется, когда в одном процессе работают несколько приложений
+    (multibot.py) и блокирующий run_application не подходит.
+    """
+    settings = webhook_settings(prefix, default_port)
+    if settings is None:
+        logger.info(f"{prefix}: получение обновлений через long polling")
+        await application.updater.start_polling(allowed_updates=Update.ALL_TYPES, **polling_kwargs)
+        return
+    logger.info(
+        f"{prefix}: получение обновлений через webhook {settings['webhook_url']} "
+        f"(слушаем {settings['listen']}:{settings['port']})"
+    )
+    await application.updater.start_webhook(
+        allowed_updates=Update.ALL_TYPES,
+        drop_pending_updates=False,
+        **settings
+    )
@@ -0,0 +1,107 @@
+"""Общая настройка логирования для bot.py, admin_bot.py и xui_api.py.
+
+Все записи попадают в очередь через единственный QueueHandler на корневом
+логгере, а запись на диск и в консоль выполняет QueueListener в отдельном
+потоке, поэтому логирование не блокирует event loop.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# text или json (одна JSON-запись на строку)
+LOG_OUTPUT = os.getenv('LOG_OUTPUT', 'text')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+
+_listener = None
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись как одну строку JSON"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+class _QueueHandler(QueueHandler):
+    """QueueHandler, который в потоке приложения только подставляет аргументы.
+
+    Время, уровень и формат строки оформляет поток записи, а трассировка
+    исключения сохраняется отдельно, чтобы JsonFormatter вывел ее в своем поле.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_traceback_formatter = logging.Formatter()
+
+def _file_handler(path: str, logger_name: str, formatter: logging.Formatter):
+    handler = RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    handler.setFormatter(formatter)
+    if logger_name:
+        # Только записи этого логгера и его потомков
+        handler.addFilter(logging.Filter(logger_name))
+    return handler
+
+def setup_logging(log_files: dict, level: str = None, output: str = None, console: bool = True):
+    """Настраивает неблокирующее логирование процесса.
+
+    log_files - соответствие {имя логгера: путь к файлу}; пустое имя означает
+    все записи процесса. Повторный вызов ничего не меняет.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    os.makedirs('logs', exist_ok=True)
+    if (output or LOG_OUTPUT) == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(LOG_FORMAT)
+
+    handlers = [_file_handler(path, name, formatter) for name, path in log_files.items()]
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_QueueHandler(log_queue))
+    root.setLevel((level or LOG_LEVEL).upper())
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    # Дописываем оставшиеся в очереди записи при завершении процесса
+    atexit.register(stop_logging)
+    return _listener
+
+def stop_logging():
+    """Останавливает поток записи логов, дописав очередь"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
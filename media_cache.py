@@ -0,0 +1,54 @@
+"""Отправка статических изображений по сохраненному file_id.
+
+Файл загружается в Telegram один раз; полученный file_id хранится в таблице
+media_files вместе с SHA-256 содержимого, поэтому после изменения файла он
+загружается заново. Если Telegram отклоняет устаревший file_id, файл тоже
+загружается повторно.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+from telegram.error import BadRequest
+from db import run_db
+import repository
+
+logger = logging.getLogger(__name__)
+
+# (bot_id, путь) -> (mtime, размер, sha256, file_id)
+_cache = {}
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+async def _lookup(bot_id: int, path: str):
+    """Возвращает (sha256, file_id) для текущего содержимого файла"""
+    stat = os.stat(path)  # FileNotFoundError передается вызывающему
+    cached = _cache.get((bot_id, path))
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2], cached[3]
+    sha256 = await asyncio.to_thread(_file_digest, path)
+    file_id = await run_db(repository.get_media_file_id, bot_id, path, sha256)
+    _cache[(bot_id, path)] = (stat.st_mtime_ns, stat.st_size, sha256, file_id)
+    return sha256, file_id
+
+async def send_cached_photo(bot, chat_id: int, path: str, **kwargs):
+    """Отправляет изображение из файла, по возможности без повторной загрузки"""
+    sha256, file_id = await _lookup(bot.id, path)
+    if file_id:
+        try:
+            return await bot.send_photo(chat_id=chat_id, photo=file_id, **kwargs)
+        except BadRequest as e:
+            logger.warning(f"file_id для {path} отклонен ({e}), файл будет загружен заново")
+
+    with open(path, 'rb') as photo:
+        message = await bot.send_photo(chat_id=chat_id, photo=photo, **kwargs)
+    file_id = message.photo[-1].file_id
+    stat = os.stat(path)
+    _cache[(bot.id, path)] = (stat.st_mtime_ns, stat.st_size, sha256, file_id)
+    await run_db(repository.save_media_file_id, bot.id, path, sha256, file_id)
+    return message
@@ -0,0 +1,122 @@
+"""Версионные миграции схемы базы данных.
+
+Текущая версия схемы хранится в PRAGMA user_version. Каждая миграция
+выполняется один раз, по порядку, в отдельной транзакции.
+"""
+import logging
+from vless import parse_vless
+
+logger = logging.getLogger(__name__)
+
+def _add_column(conn, table: str, column: str, column_type: str):
+    """Добавляет столбец, если его еще нет (для баз, созданных старыми версиями)"""
+    columns = [row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+def _migration_1(conn):
+    """Столбцы x-ui, которые раньше добавлялись отдельными скриптами"""
+    _add_column(conn, 'vpn_keys', 'xui_email', 'VARCHAR')
+    _add_column(conn, 'vpn_keys', 'xui_id', 'VARCHAR')
+
+def _migration_2(conn):
+    """Индексы для горячих запросов по ключам и платежам"""
+    # Ключ пользователя (vpn_status, buy_vpn)
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_vpn_keys_user_id ON vpn_keys (user_id, is_used)"
+    )
+    # Выборка и подсчет по признаку использования (списки, статистика и выдача
+    # свободного ключа: rowid в конце индекса дает порядок по id)
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_vpn_keys_is_used ON vpn_keys (is_used)"
+    )
+    # Платежи пользователя по статусу (check_payment_status)
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_payments_user_status ON payments (user_id, status)"
+    )
+    # Очередь ожидающих платежей (show_pending_payments)
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_payments_status_date ON payments (status, payment_date)"
+    )
+
+def _migration_3(conn):
+    """Столбцы трафика x-ui, которые заполняет задача синхронизации"""
+    _add_column(conn, 'vpn_keys', 'traffic_up', 'INTEGER')
+    _add_column(conn, 'vpn_keys', 'traffic_down', 'INTEGER')
+    _add_column(conn, 'vpn_keys', 'traffic_total', 'INTEGER')
+    _add_column(conn, 'vpn_keys', 'xui_expiry', 'DATETIME')
+    _add_column(conn, 'vpn_keys', 'traffic_updated_at', 'DATETIME')
+
+def _migration_4(conn):
+    """Идентификаторы файлов Telegram для отправки чеков без повторной загрузки"""
+    _add_column(conn, 'payments', 'receipt_file_id', 'VARCHAR')
+    _add_column(conn, 'payments', 'receipt_file_unique_id', 'VARCHAR')
+    _add_column(conn, 'payments', 'admin_receipt_file_id', 'VARCHAR')
+
+def _migration_5(conn):
+    """Срок действия у всех выданных ключей и индекс для выбора напоминаний"""
+    # Раньше ключ, выданный без платежа, получал пустой срок; считаем его как 30 дней с активации
+    conn.exec_driver_sql(
+        "UPDATE vpn_keys SET expiration_date = datetime(activation_date, '+30 days') "
+        "WHERE expiration_date IS NULL AND activation_date IS NOT NULL AND is_used = 1"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_vpn_keys_expiration ON vpn_keys (expiration_date) WHERE is_used = 1"
+    )
+
+def _migration_6(conn):
+    """Разобранные поля ключей VLESS в отдельных столбцах"""
+    for column, column_type in [('host', 'VARCHAR'), ('port', 'INTEGER'), ('location', 'VARCHAR'),
+                                ('transport', 'VARCHAR'), ('security', 'VARCHAR'), ('sni', 'VARCHAR')]:
+        _add_column(conn, 'vpn_keys', column, column_type)
+    rows = []
+    for key_id, key in conn.exec_driver_sql("SELECT id, key FROM vpn_keys WHERE key IS NOT NULL"):
+        try:
+            parsed = parse_vless(key)
+        except ValueError:
+            # Ключи неизвестного формата сохраняют прежние xui_email/xui_id
+            logger.warning(f"Ключ {key_id} не разобран: неверный формат VLESS")
+            continue
+        rows.append({'id': key_id, **parsed._asdict()})
+    if rows:
+        conn.exec_driver_sql(
+            "UPDATE vpn_keys SET xui_id = :xui_id, xui_email = :xui_email, host = :host, port = :port, "
+            "location = :location, transport = :transport, security = :security, sni = :sni WHERE id = :id",
+            rows
+        )
+
+def _migration_7(conn):
+    """Время подтверждения платежа и индексы для статистики по дням"""
+    _add_column(conn, 'payments', 'approved_at', 'DATETIME')
+    # Для старых платежей время подтверждения неизвестно, берем дату платежа
+    conn.exec_driver_sql(
+        "UPDATE payments SET approved_at = payment_date WHERE status = 'approved' AND approved_at IS NULL"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_payments_payment_date ON payments (payment_date)"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_payments_approved_at ON payments (approved_at) WHERE approved_at IS NOT NULL"
+    )
+
+MIGRATIONS = [
+    _migration_1,
+    _migration_2,
+    _migration_3,
+    _migration_4,
+    _migration_5,
+    _migration_6,
+    _migration_7,
+]
+
+def apply_migrations(engine):
+    """Применяет все миграции, версия которых больше текущей версии схемы"""
+    with engine.connect() as conn:
+        version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+    for number, migration in enumerate(MIGRATIONS, start=1):
+        if number <= version:
+            continue
+        with engine.begin() as conn:
+            migration(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {number}")
+        logger.info(f"Применена миграция {number}: {migration.__doc__}")
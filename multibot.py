@@ -0,0 +1,83 @@
+"""Основной и админ-бот в одном процессе.
+
+Оба Application работают в одном event loop: движок базы с пулом потоков
+run_db, клиент x-ui и уведомители общие, а уведомление от имени другого бота
+отправляется через Bot его приложения, без отдельного пула соединений.
+Режим получения обновлений каждого бота настраивается как при отдельном
+запуске (launch.py). Запуск: python multibot.py или RUN_MODE=single python run.py
+"""
+import asyncio
+import logging
+import signal
+import sys
+import traceback
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from logging_setup import setup_logging
+
+# Логирование настраивается до импорта ботов: их setup_logging тогда ничего не меняет.
+# Админ-бот пишет через корневой логгер, поэтому его записи попадают в общий файл
+setup_logging({
+    '': 'logs/log.txt',
+    'bot': 'logs/bot.log',
+    'XUIApi': 'logs/xui_api.log',
+})
+
+import bot
+import admin_bot
+from launch import start_updater
+from notifier import use_application_bot
+
+logger = logging.getLogger(__name__)
+
+# Модуль бота, префикс настроек запуска, порт webhook по умолчанию и параметры polling
+BOTS = (
+    (bot, 'BOT', 8443, bot.POLLING_OPTIONS),
+    (admin_bot, 'ADMIN_BOT', 8444, {}),
+)
+
+async def run():
+    """Работает до SIGTERM/SIGINT, затем останавливает оба приложения"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    applications = [module.build_application() for module, *_ in BOTS]
+    try:
+        for application in applications:
+            await application.initialize()
+            # Уведомители другого бота отправляют через Bot этого приложения
+            use_application_bot(application.bot)
+            if application.post_init:
+                await application.post_init(application)
+        for application, (_, prefix, port, polling_options) in zip(applications, BOTS):
+            await start_updater(application, prefix, port, **polling_options)
+            await application.start()
+        logger.info("Основной и админ-бот запущены в одном процессе")
+        await stop.wait()
+    finally:
+        for application in applications:
+            if application.updater.running:
+                await application.updater.stop()
+            if application.running:
+                await application.stop()
+                if application.post_stop:
+                    await application.post_stop(application)
+        for application in applications:
+            await application.shutdown()
+            if application.post_shutdown:
+                await application.post_shutdown(application)
+        logger.info("Боты остановлены")
+
+def main():
+    try:
+        asyncio.run(run())
+    except Exception as e:
+        logger.critical(f"Фатальная ошибка: {str(e)}\n{traceback.format_exc()}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Долгоживущие клиенты Bot API для уведомлений между ботами.
+
+Основной бот отправляет чеки администратору через админ-бота, а админ-бот
+отправляет пользователю ключ через основной бот. Для каждого токена
+создается один Bot с общим пулом соединений, который инициализируется при
+первом обращении и закрывается вместе с приложением. Если оба бота работают
+в одном процессе (multibot.py), уведомитель использует Bot приложения
+другого бота и его пул соединений.
+"""
+import asyncio
+import logging
+import os
+from telegram import Bot
+from telegram.request import HTTPXRequest
+from launch import TELEGRAM_API_URL
+
+logger = logging.getLogger(__name__)
+
+# Размер пула соединений одного уведомителя и число одновременных запросов
+NOTIFIER_POOL_SIZE = int(os.getenv('NOTIFIER_POOL_SIZE', '8'))
+
+class Notifier:
+    """Ленивая обертка над Bot для отправки сообщений от имени другого бота"""
+
+    def __init__(self, token: str, pool_size: int = None, base_url: str = None, bot: Bot = None):
+        self.token = token
+        self.pool_size = pool_size or NOTIFIER_POOL_SIZE
+        self.base_url = base_url or TELEGRAM_API_URL
+        # Готовый Bot закрывает его владелец, а не уведомитель
+        self._bot = bot
+        self._owns_bot = bot is None
+        self._init_lock = asyncio.Lock()
+        # Запросы сверх размера пула ждут здесь, а не падают по таймауту пула
+        self._semaphore = asyncio.Semaphore(self.pool_size)
+
+    async def get_bot(self) -> Bot:
+        """Возвращает инициализированный Bot, создавая его при первом вызове"""
+        if self._bot is None:
+            async with self._init_lock:
+                if self._bot is None:
+                    bot = Bot(
+                        self.token,
+                        base_url=self.base_url,
+                        request=HTTPXRequest(connection_pool_size=self.pool_size, pool_timeout=30.0)
+                    )
+                    await bot.initialize()
+                    self._bot = bot
+        return self._bot
+
+    async def send_message(self, **kwargs):
+        bot = await self.get_bot()
+        async with self._semaphore:
+            return await bot.send_message(**kwargs)
+
+    async def send_photo(self, **kwargs):
+        bot = await self.get_bot()
+        async with self._semaphore:
+            return await bot.send_photo(**kwargs)
+
+    async def shutdown(self):
+        """Закрывает пул соединений"""
+        if self._bot is not None:
+            bot, self._bot = self._bot, None
+            if self._owns_bot:
+                await bot.shutdown()
+
+_notifiers = {}
+
+def get_notifier(token: str) -> Notifier:
+    """Возвращает общий уведомитель для токена"""
+    notifier = _notifiers.get(token)
+    if notifier is None:
+        notifier = _notifiers[token] = Notifier(token)
+    return notifier
+
+def use_application_bot(bot: Bot) -> Notifier:
+    """Уведомления от имени бота идут через уже инициализированный Bot его приложения"""
+    notifier = _notifiers[bot.token] = Notifier(bot.token, bot=bot)
+    return notifier
+
+async def shutdown_notifiers(application=None):
+    """Закрывает все уведомители; подходит как post_shutdown приложения"""
+    for notifier in list(_notifiers.values()):
+        try:
+            await notifier.shutdown()
+        except Exception as e:
+            logger.error(f"Ошибка при закрытии уведомителя: {e}")
+    _notifiers.clear()
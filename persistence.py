@@ -0,0 +1,119 @@
+"""Хранение состояний ConversationHandler в базе бота.
+
+Application раз в update_interval секунд передает все изменившиеся
+состояния разговоров; они накапливаются и записываются в таблицу
+conversation_states одной транзакцией на цикл, а не на каждое обновление.
+Данные пользователей, чатов и бота не хранятся: обработчики их не используют.
+"""
+import asyncio
+import json
+import logging
+import os
+from telegram.ext import BasePersistence, PersistenceInput
+from db import run_db
+import repository
+
+logger = logging.getLogger(__name__)
+
+# Как часто записывать изменения состояний, секунды
+PERSISTENCE_INTERVAL = float(os.getenv('PERSISTENCE_INTERVAL', '5'))
+
+class SQLitePersistence(BasePersistence):
+    """Состояния разговоров в таблице conversation_states с пакетной записью"""
+
+    def __init__(self, update_interval: float = None):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=False, callback_data=False),
+            update_interval=PERSISTENCE_INTERVAL if update_interval is None else update_interval
+        )
+        self._conversations = {}
+        self._pending = {}  # (name, ключ в JSON) -> состояние в JSON или None
+        self._next_write = None
+        self._write_lock = asyncio.Lock()
+
+    async def get_conversations(self, name: str) -> dict:
+        if name not in self._conversations:
+            stored = await run_db(repository.get_conversation_states, name)
+            self._conversations[name] = {
+                tuple(json.loads(key)): json.loads(state) for key, state in stored.items()
+            }
+            logger.info(f"Восстановлено разговоров {name}: {len(stored)}")
+        return dict(self._conversations[name])
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        conversation = self._conversations.setdefault(name, {})
+        if conversation.get(key) == new_state:
+            return
+        if new_state is None:
+            conversation.pop(key, None)
+        else:
+            conversation[key] = new_state
+        self._pending[(name, json.dumps(list(key)))] = None if new_state is None else json.dumps(new_state)
+        await self._write_soon()
+
+    async def _write_soon(self):
+        """Общая запись для всех изменений текущего цикла Application.update_persistence.
+
+        Application вызывает update_* параллельно через asyncio.gather; задача
+        записи запускается после них, поэтому забирает все изменения цикла.
+        """
+        if self._next_write is None:
+            self._next_write = asyncio.create_task(self._write_pending())
+        await asyncio.shield(self._next_write)
+
+    async def _write_pending(self):
+        async with self._write_lock:
+            # Изменения, пришедшие после этой точки, попадут в следующую запись
+            self._next_write = None
+            if not self._pending:
+                return
+            changes = [(name, key, state) for (name, key), state in self._pending.items()]
+            self._pending.clear()
+            await run_db(repository.save_conversation_states, changes)
+            logger.debug(f"Записано состояний разговоров: {len(changes)}")
+
+    async def flush(self) -> None:
+        if self._next_write is not None:
+            await asyncio.gather(self._next_write, return_exceptions=True)
+        await self._write_pending()
+
+    # Данные пользователей, чатов, бота и callback_data не сохраняются
+
+    async def get_user_data(self) -> dict:
+        return {}
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        pass
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
@@ -0,0 +1,504 @@
+"""Синхронные функции доступа к данным.
+
+Все функции открывают собственную сессию и возвращают отсоединенные объекты,
+поэтому из асинхронных обработчиков их вызывают через db.run_db.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete, func, literal, union_all, cast, tuple_, String
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from db import Session, VPNKey, Payment, MediaFile, BroadcastDelivery, BroadcastRun, ConversationState
+from vless import VlessKey, parse_vless
+
+# Размер пачки при массовой загрузке ключей
+IMPORT_CHUNK_SIZE = 5000
+# Кандидатов для напоминаний за один запрос
+REMINDER_PAGE_SIZE = 1000
+# Ключей на странице списка в админ-боте; 10 ключей VLESS помещаются в одно сообщение
+KEYS_PAGE_SIZE = 10
+
+# Ключи
+
+def user_key_query(user_id: int):
+    return select(VPNKey).filter(VPNKey.user_id == user_id).limit(1)
+
+def get_user_key(user_id: int):
+    with Session() as session:
+        return session.scalars(user_key_query(user_id)).first()
+
+def user_key_version_query(user_id: int):
+    """id и срок ключа, который вернет get_user_key: по ним проверяется кэш статуса VPN"""
+    return select(VPNKey.id, VPNKey.expiration_date).filter(VPNKey.user_id == user_id).limit(1)
+
+def get_user_key_version(user_id: int):
+    """Возвращает (id, expiration_date) ключа пользователя или None"""
+    with Session() as session:
+        row = session.execute(user_key_version_query(user_id)).first()
+        return tuple(row) if row else None
+
+def active_key_query(user_id: int):
+    return select(VPNKey).filter_by(user_id=user_id, is_used=True).limit(1)
+
+def get_active_key(user_id: int):
+    with Session() as session:
+        return session.scalars(active_key_query(user_id)).first()
+
+def get_key_by_id(key_id: int):
+    with Session() as session:
+        return session.query(VPNKey).filter(VPNKey.id == key_id).first()
+
+def reminder_candidates_query(now: datetime, days=(5, 3, 1), after: tuple = None, limit: int = REMINDER_PAGE_SIZE):
+    """Ключи, истекающие в пределах окна напоминаний, по (expiration_date, id)
+    после курсора after (по индексу ix_vpn_keys_expiration)"""
+    query = (
+        select(VPNKey.id, VPNKey.user_id, VPNKey.expiration_date)
+        .filter_by(is_used=True)
+        .where(
+            VPNKey.expiration_date >= now + timedelta(days=min(days)),
+            VPNKey.expiration_date < now + timedelta(days=max(days) + 1)
+        )
+    )
+    if after is not None:
+        query = query.where(tuple_(VPNKey.expiration_date, VPNKey.id) > tuple_(*after))
+    return query.order_by(VPNKey.expiration_date, VPNKey.id).limit(limit)
+
+def get_reminder_candidates_page(now: datetime, days=(5, 3, 1), after: tuple = None,
+                                 limit: int = REMINDER_PAGE_SIZE):
+    """Страница кандидатов для напоминаний.
+
+    Возвращает ([(user_id, дней до окончания)], курсор следующей страницы или
+    None на последней). Рассылка запрашивает страницы по мере отправки, поэтому
+    в памяти не больше одной страницы.
+    """
+    with Session() as session:
+        rows = session.execute(reminder_candidates_query(now, days, after, limit)).all()
+    candidates = []
+    for key_id, user_id, expiration_date in rows:
+        days_left = (expiration_date - now).days
+        if user_id is not None and days_left in days:
+            candidates.append((user_id, days_left))
+    next_after = (rows[-1].expiration_date, rows[-1].id) if len(rows) == limit else None
+    return candidates, next_after
+
+def _keys_query(columns, is_used: bool = None):
+    query = select(*columns)
+    return query if is_used is None else query.filter_by(is_used=is_used)
+
+def keys_page_query(is_used: bool = None, after_id: int = 0, limit: int = KEYS_PAGE_SIZE):
+    """Страница ключей после after_id по возрастанию id"""
+    return (
+        _keys_query((VPNKey.id, VPNKey.key, VPNKey.is_used, VPNKey.user_id), is_used)
+        .where(VPNKey.id > after_id)
+        .order_by(VPNKey.id)
+        .limit(limit)
+    )
+
+def list_keys_page(is_used: bool = None, after_id: int = None, before_id: int = None, limit: int = KEYS_PAGE_SIZE):
+    """Страница ключей с keyset-пагинацией по id.
+
+    after_id - следующая страница, before_id - предыдущая. Возвращает
+    (строки id, key, is_used, user_id; есть ли предыдущая; есть ли следующая).
+    """
+    with Session() as session:
+        if before_id is not None:
+            rows = session.execute(
+                _keys_query((VPNKey.id, VPNKey.key, VPNKey.is_used, VPNKey.user_id), is_used)
+                .where(VPNKey.id < before_id)
+                .order_by(VPNKey.id.desc())
+                .limit(limit)
+            ).all()[::-1]
+        else:
+            rows = session.execute(keys_page_query(is_used, after_id or 0, limit)).all()
+        if not rows:
+            return rows, False, False
+        has_prev = session.execute(
+            _keys_query((VPNKey.id,), is_used).where(VPNKey.id < rows[0].id).limit(1)
+        ).first() is not None
+        has_next = session.execute(
+            _keys_query((VPNKey.id,), is_used).where(VPNKey.id > rows[-1].id).limit(1)
+        ).first() is not None
+        return rows, has_prev, has_next
+
+def iter_keys(is_used: bool = None, batch_size: int = 1000):
+    """Генератор строк ключей для выгрузки; база читается порциями.
+
+    Выполняется целиком в одном потоке, поэтому из обработчиков его
+    потребляют внутри функции, переданной в db.run_db.
+    """
+    with Session() as session:
+        result = session.execute(
+            _keys_query(
+                (VPNKey.id, VPNKey.key, VPNKey.is_used, VPNKey.user_id, VPNKey.username,
+                 VPNKey.xui_email, VPNKey.location, VPNKey.activation_date, VPNKey.expiration_date),
+                is_used
+            )
+            .order_by(VPNKey.id)
+            .execution_options(yield_per=batch_size)
+        )
+        yield from result
+
+def xui_clients_query():
+    return select(VPNKey.id, VPNKey.xui_email, VPNKey.xui_id).filter_by(is_used=True)
+
+def get_xui_clients():
+    """Возвращает (id, xui_email, xui_id) выданных ключей для синхронизации с x-ui"""
+    with Session() as session:
+        return session.execute(xui_clients_query()).all()
+
+def update_traffic_stats(rows):
+    """Записывает трафик x-ui пакетным UPDATE по первичному ключу.
+
+    rows - список словарей с ключом id и столбцами трафика.
+    """
+    if not rows:
+        return 0
+    with Session() as session:
+        session.execute(update(VPNKey), rows)
+        session.commit()
+    return len(rows)
+
+def keys_count_query():
+    """Всего ключей и использовано ключей одним запросом.
+
+    Общее число SQLite считает по страницам индекса без перебора строк, поэтому
+    два подзапроса быстрее одного GROUP BY is_used по всем строкам.
+    """
+    return select(
+        select(func.count()).select_from(VPNKey).scalar_subquery(),
+        select(func.count()).select_from(VPNKey).filter_by(is_used=True).scalar_subquery(),
+    )
+
+def count_keys():
+    """Возвращает (всего ключей, использовано ключей)"""
+    with Session() as session:
+        return tuple(session.execute(keys_count_query()).one())
+
+# Вставка идет напрямую через executemany драйвера: обработка параметров
+# SQLAlchemy на миллионе строк занимает больше времени, чем сама запись
+_INSERT_KEYS_SQL = (
+    f"INSERT INTO vpn_keys (key, is_used, activation_date, {', '.join(VlessKey._fields)}) "
+    f"VALUES (?, 0, ?{', ?' * len(VlessKey._fields)}) ON CONFLICT (key) DO NOTHING"
+)
+
+def _insert_keys(rows) -> int:
+    """Вставляет пачку разобранных ключей, существующие пропускает; возвращает число вставленных"""
+    with Session() as session:
+        result = session.connection().exec_driver_sql(_INSERT_KEYS_SQL, rows)
+        session.commit()
+        return result.rowcount
+
+def import_keys(lines, chunk_size: int = IMPORT_CHUNK_SIZE, on_chunk=None) -> dict:
+    """Загружает ключи из итерируемых строк пачками INSERT ... ON CONFLICT DO NOTHING.
+
+    Строки читаются по мере вставки, поэтому память ограничена размером пачки.
+    Уже загруженные ключи (в том числе выданные пользователям) не изменяются.
+    Возвращает счетчики inserted, duplicate и invalid; on_chunk, если задан,
+    вызывается со счетчиками каждой пачки.
+    """
+    totals = {'inserted': 0, 'duplicate': 0, 'invalid': 0}
+    rows = []
+    invalid = 0
+    # Формат, в котором SQLAlchemy хранит DateTime в SQLite
+    loaded_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f')
+
+    def flush():
+        inserted = _insert_keys(rows) if rows else 0
+        counts = {'inserted': inserted, 'duplicate': len(rows) - inserted, 'invalid': invalid}
+        for name, value in counts.items():
+            totals[name] += value
+        rows.clear()
+        if on_chunk:
+            on_chunk(counts)
+
+    for line in lines:
+        key = line.strip()
+        if not key:
+            continue
+        try:
+            rows.append((key, loaded_at, *parse_vless(key)))
+        except ValueError:
+            invalid += 1
+        if len(rows) + invalid >= chunk_size:
+            flush()
+            invalid = 0
+    if rows or invalid:
+        flush()
+    return totals
+
+def assign_free_key(user_id: int, username: str = None, phone: str = None, expiration_date: datetime = None):
+    """Выдает пользователю первый свободный ключ, возвращает его или None"""
+    with Session() as session:
+        available_key = _claim_free_key(session, user_id, username, phone, expiration_date)
+        session.commit()
+        return available_key
+
+def claim_free_key_query(user_id: int, username: str = None, phone: str = None, expiration_date: datetime = None):
+    """UPDATE ... RETURNING, который занимает первый свободный ключ.
+
+    Поиск и занятие ключа выполняются одним оператором под блокировкой записи,
+    поэтому два параллельных подтверждения не получат один и тот же ключ.
+    """
+    free_key_id = (
+        select(VPNKey.id)
+        .where(VPNKey.is_used == False)
+        .order_by(VPNKey.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    values = {
+        'is_used': True,
+        'user_id': user_id,
+        'activation_date': datetime.utcnow(),
+        # Без явного срока ключ действует 30 дней, как считает статус VPN
+        'expiration_date': expiration_date or datetime.utcnow() + timedelta(days=30),
+    }
+    if username is not None:
+        values['username'] = username
+    if phone is not None:
+        values['phone'] = phone
+    return (
+        update(VPNKey)
+        .where(VPNKey.id == free_key_id, VPNKey.is_used == False)
+        .values(**values)
+        .returning(VPNKey.id)
+    )
+
+def _claim_free_key(session, user_id, username, phone, expiration_date):
+    """Атомарно занимает свободный ключ, возвращает его или None"""
+    claimed = session.execute(claim_free_key_query(user_id, username, phone, expiration_date)).first()
+    if not claimed:
+        return None
+    return session.get(VPNKey, claimed.id, populate_existing=True)
+
+# Статические файлы
+
+def get_media_file_id(bot_id: int, path: str, sha256: str):
+    """Возвращает file_id файла, если он загружался с тем же содержимым"""
+    with Session() as session:
+        media = session.get(MediaFile, (bot_id, path))
+        if media and media.sha256 == sha256:
+            return media.file_id
+        return None
+
+def save_media_file_id(bot_id: int, path: str, sha256: str, file_id: str):
+    with Session() as session:
+        session.merge(MediaFile(bot_id=bot_id, path=path, sha256=sha256, file_id=file_id, updated_at=datetime.utcnow()))
+        session.commit()
+
+# Рассылки
+
+def get_delivered_chat_ids(broadcast: str) -> set:
+    """Чаты, которые рассылка уже обработала (для продолжения после сбоя)"""
+    with Session() as session:
+        return set(session.scalars(
+            select(BroadcastDelivery.chat_id).filter_by(broadcast=broadcast)
+        ))
+
+def save_deliveries(broadcast: str, records):
+    """Сохраняет пачку (chat_id, status); повторные записи игнорируются"""
+    if not records:
+        return
+    now = datetime.utcnow()
+    with Session() as session:
+        session.execute(
+            sqlite_insert(BroadcastDelivery).on_conflict_do_nothing(),
+            [
+                {'broadcast': broadcast, 'chat_id': chat_id, 'status': status, 'sent_at': now}
+                for chat_id, status in records
+            ]
+        )
+        session.commit()
+
+def finish_broadcast(name: str):
+    """Отмечает, что рассылка дошла до конца списка получателей"""
+    with Session() as session:
+        session.merge(BroadcastRun(name=name, finished_at=datetime.utcnow()))
+        session.commit()
+
+def is_broadcast_finished(name: str) -> bool:
+    with Session() as session:
+        return session.get(BroadcastRun, name) is not None
+
+# Состояния разговоров
+
+def get_conversation_states(name: str) -> dict:
+    """Сохраненные состояния разговора name: {ключ в JSON: состояние в JSON}"""
+    with Session() as session:
+        return dict(session.execute(
+            select(ConversationState.key, ConversationState.state).filter_by(name=name)
+        ).all())
+
+def save_conversation_states(changes):
+    """Сохраняет пачку (name, key, state) одной транзакцией; state=None удаляет запись"""
+    now = datetime.utcnow()
+    upserts = [
+        {'name': name, 'key': key, 'state': state, 'updated_at': now}
+        for name, key, state in changes if state is not None
+    ]
+    with Session() as session:
+        for name, key, state in changes:
+            if state is None:
+                session.execute(
+                    delete(ConversationState).filter_by(name=name, key=key)
+                )
+        if upserts:
+            insert = sqlite_insert(ConversationState)
+            session.execute(
+                insert.on_conflict_do_update(
+                    index_elements=['name', 'key'],
+                    set_={'state': insert.excluded.state, 'updated_at': insert.excluded.updated_at}
+                ),
+                upserts
+            )
+        session.commit()
+
+# Платежи
+
+def create_payment(user_id: int, username: str, phone: str, receipt_path: str = None,
+                   receipt_file_id: str = None, receipt_file_unique_id: str = None) -> int:
+    """Сохраняет платеж со статусом pending, возвращает его ID"""
+    with Session() as session:
+        payment = Payment(
+            user_id=user_id,
+            username=username,
+            phone=phone,
+            status='pending',
+            receipt_path=receipt_path,
+            receipt_file_id=receipt_file_id,
+            receipt_file_unique_id=receipt_file_unique_id,
+            payment_date=datetime.utcnow(),
+            next_payment_date=datetime.utcnow() + timedelta(days=30)
+        )
+        session.add(payment)
+        session.commit()
+        return payment.id
+
+def set_receipt_info(payment_id: int, **values):
+    """Обновляет сведения о чеке: admin_receipt_file_id и/или receipt_path"""
+    with Session() as session:
+        session.execute(update(Payment).where(Payment.id == payment_id).values(**values))
+        session.commit()
+
+def pending_payment_query(user_id: int):
+    return select(Payment).filter_by(user_id=user_id, status='pending').limit(1)
+
+def get_pending_payment(user_id: int):
+    with Session() as session:
+        return session.scalars(pending_payment_query(user_id)).first()
+
+def pending_payments_query(after: tuple = None, limit: int = 1):
+    """Ожидающие платежи по (payment_date, id) после курсора after = (payment_date, id)"""
+    query = select(Payment).filter_by(status='pending')
+    if after is not None:
+        query = query.where(tuple_(Payment.payment_date, Payment.id) > tuple_(*after))
+    return query.order_by(Payment.payment_date, Payment.id).limit(limit)
+
+def get_pending_payments_page(after_id: int = None, limit: int = 1):
+    """Очередь ожидающих платежей по дате, начиная после платежа after_id.
+
+    Возвращает (платежи страницы, есть ли еще платежи дальше, всего ожидающих).
+    after_id может указывать на уже обработанный платеж: курсором служит его
+    (payment_date, id).
+    """
+    with Session() as session:
+        after = None
+        if after_id is not None:
+            cursor = session.execute(
+                select(Payment.payment_date, Payment.id).where(Payment.id == after_id)
+            ).first()
+            after = tuple(cursor) if cursor else None
+        payments = session.execute(pending_payments_query(after, limit + 1)).scalars().all()
+        pending_count = session.execute(
+            select(func.count()).select_from(Payment).filter_by(status='pending')
+        ).scalar()
+        return payments[:limit], len(payments) > limit, pending_count
+
+def set_payment_status(payment_id: int, status: str):
+    """Обновляет статус платежа, возвращает платеж или None"""
+    with Session() as session:
+        payment = session.query(Payment).filter_by(id=payment_id).first()
+        if payment:
+            payment.status = status
+            if status == 'approved':
+                payment.approved_at = datetime.utcnow()
+            session.commit()
+        return payment
+
+def approve_payment(payment_id: int):
+    """Подтверждает платеж и выдает ключ.
+
+    Возвращает (платеж, ключ); ключ равен None, если свободных ключей нет
+    или платеж уже обработан, тогда статус платежа не меняется.
+    """
+    with Session() as session:
+        # Транзакция начинается с записи: платеж переводится в approved только
+        # из pending, поэтому повторное нажатие не выдаст второй ключ
+        approved = session.execute(
+            update(Payment)
+            .where(Payment.id == payment_id, Payment.status == 'pending')
+            .values(status='approved', approved_at=datetime.utcnow())
+            .returning(Payment.id)
+        ).first()
+        payment = session.get(Payment, payment_id, populate_existing=True)
+        if not payment or not approved:
+            return payment, None
+        available_key = _claim_free_key(
+            session, payment.user_id, payment.username, payment.phone, payment.next_payment_date
+        )
+        if not available_key:
+            # Транзакция откатывается при закрытии сессии
+            payment.status = 'pending'
+            payment.approved_at = None
+            return payment, None
+        session.commit()
+        return payment, available_key
+
+# Статистика
+
+def statistics_query(now: datetime, days: int = 30):
+    """Все агрегаты статистики одним запросом: строки (метрика, группа, количество).
+
+    Метрики: keys (по is_used), payments (по статусу), new_payments и
+    approvals (по дням за days календарных дней по сегодняшний включительно),
+    expiries (по дням с текущего момента до конца days-го дня начиная с
+    сегодняшнего). Границы совпадают с рядами по дням в админ-боте. Каждая
+    часть идет по своему индексу.
+    """
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    since = today - timedelta(days=days - 1)
+    until = today + timedelta(days=days)
+    payment_day = func.date(Payment.payment_date)
+    approval_day = func.date(Payment.approved_at)
+    expiry_day = func.date(VPNKey.expiration_date)
+    return union_all(
+        select(literal('keys'), cast(VPNKey.is_used, String), func.count())
+        .group_by(VPNKey.is_used),
+        select(literal('payments'), Payment.status, func.count())
+        .group_by(Payment.status),
+        select(literal('new_payments'), payment_day, func.count())
+        .where(Payment.payment_date >= since)
+        .group_by(payment_day),
+        select(literal('approvals'), approval_day, func.count())
+        .where(Payment.approved_at >= since)
+        .group_by(approval_day),
+        select(literal('expiries'), expiry_day, func.count())
+        .where(VPNKey.is_used == True, VPNKey.expiration_date >= now, VPNKey.expiration_date < until)
+        .group_by(expiry_day),
+    )
+
+def get_statistics(now: datetime, days: int = 30) -> dict:
+    """Сводная статистика ключей и платежей с рядами по дням"""
+    stats = {
+        'keys': {'total': 0, 'used': 0, 'free': 0},
+        'payments': {},
+        'new_payments': {},
+        'approvals': {},
+        'expiries': {},
+    }
+    with Session() as session:
+        for metric, group, count in session.execute(statistics_query(now, days)):
+            if metric == 'keys':
+                stats['keys']['used' if group == '1' else 'free'] += count
+                stats['keys']['total'] += count
+            else:
+                stats[metric][group] = count
+    return stats
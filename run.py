@@ -1,11 +1,11 @@
+import asyncio
 import os
 import sys
 import subprocess
-import time
-import signal
 from dotenv import load_dotenv
 import logging
 import traceback
+from supervisor import Supervisor, Child
 
 # Настройка логирования
 logging.basicConfig(
@@ -58,42 +58,6 @@ def check_env():
         return False
     return True
 
-def run_bot(script_name, max_retries=3, retry_delay=5):
-    """Запуск бота в отдельном процессе с автоматическим перезапуском"""
-    retries = 0
-    while retries < max_retries:
-        try:
-            process = subprocess.Popen(
-                [sys.executable, script_name],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True,
-                bufsize=1  # Линейная буферизация
-            )
-            logger.info(f"✅ {script_name} успешно запущен")
-            return process
-        except Exception as e:
-            retries += 1
-            logger.error(f"❌ Ошибка при запуске {script_name} (попытка {retries}/{max_retries}): {e}")
-            if retries < max_retries:
-                logger.info(f"⏳ Ожидание {retry_delay} секунд перед повторной попыткой...")
-                time.sleep(retry_delay)
-            else:
-                logger.error(f"❌ Не удалось запустить {script_name} после {max_retries} попыток")
-                return None
-
-def restart_bot(process, script_name):
-    """Перезапуск бота при сбое"""
-    if process:
-        try:
-            process.terminate()
-            process.wait(timeout=5)
-        except:
-            process.kill()
-    
-    logger.info(f"🔄 Перезапуск {script_name}...")
-    return run_bot(script_name)
-
 def main():
     # Создаем директорию для логов, если её нет
     os.makedirs('logs', exist_ok=True)
@@ -111,84 +75,21 @@ def main():
         logger.error("❌ Пожалуйста, заполните все необходимые переменные в файле .env")
         return
     
-    # Запускаем боты
+    # Запускаем боты: RUN_MODE=single - оба в одном процессе (multibot.py),
+    # иначе отдельными процессами, админ-бот через 5 секунд после основного
     logger.info("🚀 Запуск ботов...")
-    
-    # Запускаем основной бот
-    main_bot = run_bot("bot.py")
-    if not main_bot:
-        logger.error("❌ Не удалось запустить основной бот")
-        return
-    
-    # Ждем 5 секунд перед запуском админ-бота
-    time.sleep(5)
-    
-    # Запускаем админ-бот
-    admin_bot = run_bot("admin_bot.py")
-    if not admin_bot:
-        logger.error("❌ Не удалось запустить админ-бот")
-        main_bot.terminate()
-        return
-    
-    def signal_handler(signum, frame):
-        logger.info("\n🛑 Остановка ботов...")
-        if main_bot:
-            main_bot.terminate()
-        if admin_bot:
-            admin_bot.terminate()
-        logger.info("✅ Боты остановлены")
-        sys.exit(0)
-    
-    # Регистрируем обработчик сигналов
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
-    
+    if os.getenv('RUN_MODE', 'processes') == 'single':
+        children = [Child('Боты', [sys.executable, 'multibot.py'])]
+    else:
+        children = [
+            Child('Основной бот', [sys.executable, 'bot.py']),
+            Child('Админ-бот', [sys.executable, 'admin_bot.py'], start_delay=5),
+        ]
+    supervisor = Supervisor(children)
     try:
-        # Мониторим вывод ботов
-        while True:
-            if main_bot:
-                try:
-                    output = main_bot.stdout.readline()
-                    if output:
-                        logger.info(f"[Основной бот] {output.strip()}")
-                    
-                    # Проверяем наличие ошибок
-                    error = main_bot.stderr.readline()
-                    if error:
-                        logger.error(f"[Основной бот] Ошибка: {error.strip()}")
-                except Exception as e:
-                    logger.error(f"Ошибка при чтении вывода основного бота: {e}")
-                    main_bot = restart_bot(main_bot, "bot.py")
-            
-            if admin_bot:
-                try:
-                    output = admin_bot.stdout.readline()
-                    if output:
-                        logger.info(f"[Админ-бот] {output.strip()}")
-                    
-                    # Проверяем наличие ошибок
-                    error = admin_bot.stderr.readline()
-                    if error:
-                        logger.error(f"[Админ-бот] Ошибка: {error.strip()}")
-                except Exception as e:
-                    logger.error(f"Ошибка при чтении вывода админ-бота: {e}")
-                    admin_bot = restart_bot(admin_bot, "admin_bot.py")
-            
-            # Проверяем, не завершились ли боты
-            if main_bot and main_bot.poll() is not None:
-                logger.error("❌ Основной бот завершил работу")
-                main_bot = restart_bot(main_bot, "bot.py")
-            
-            if admin_bot and admin_bot.poll() is not None:
-                logger.error("❌ Админ-бот завершил работу")
-                admin_bot = restart_bot(admin_bot, "admin_bot.py")
-            
-            time.sleep(0.1)
-    except KeyboardInterrupt:
-        signal_handler(signal.SIGINT, None)
+        asyncio.run(supervisor.run())
     except Exception as e:
         logger.error(f"Критическая ошибка: {e}\n{traceback.format_exc()}")
-        signal_handler(signal.SIGTERM, None)
 
 if __name__ == "__main__":
     logger.info("Запуск бота...")
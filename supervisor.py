@@ -0,0 +1,223 @@
+"""Запуск процессов ботов с перезапуском при падении.
+
+Вывод всех дочерних процессов читается одновременно в event loop, поэтому
+молчащий поток одного бота не задерживает чтение остальных. Упавший процесс
+перезапускается с экспоненциально растущей задержкой; если процесс падает
+SUPERVISOR_CRASH_LOOP_RESTARTS раз за SUPERVISOR_CRASH_LOOP_WINDOW секунд,
+перезапуск откладывается на SUPERVISOR_CRASH_LOOP_DELAY секунд. SIGTERM и
+SIGINT передаются процессам как SIGTERM для штатной остановки; SIGUSR1
+выводит аптайм и число перезапусков, они же выводятся раз в
+SUPERVISOR_REPORT_INTERVAL секунд и при остановке.
+"""
+import asyncio
+import logging
+import os
+import signal
+import time
+from collections import deque
+from datetime import timedelta
+
+logger = logging.getLogger(__name__)
+
+RESTART_DELAY = float(os.getenv('SUPERVISOR_RESTART_DELAY', '1'))
+MAX_RESTART_DELAY = float(os.getenv('SUPERVISOR_MAX_RESTART_DELAY', '60'))
+# Проработав столько секунд, процесс считается стабильным и задержка сбрасывается
+STABLE_UPTIME = float(os.getenv('SUPERVISOR_STABLE_UPTIME', '60'))
+CRASH_LOOP_RESTARTS = int(os.getenv('SUPERVISOR_CRASH_LOOP_RESTARTS', '5'))
+CRASH_LOOP_WINDOW = float(os.getenv('SUPERVISOR_CRASH_LOOP_WINDOW', '300'))
+CRASH_LOOP_DELAY = float(os.getenv('SUPERVISOR_CRASH_LOOP_DELAY', '300'))
+# Сколько ждать штатной остановки после SIGTERM, прежде чем убить процесс
+STOP_TIMEOUT = float(os.getenv('SUPERVISOR_STOP_TIMEOUT', '15'))
+REPORT_INTERVAL = float(os.getenv('SUPERVISOR_REPORT_INTERVAL', '3600'))
+# Максимальная длина строки вывода; более длинные строки пропускаются
+LINE_LIMIT = 1024 * 1024
+
+def _format_duration(seconds: float) -> str:
+    return str(timedelta(seconds=int(seconds)))
+
+class Child:
+    """Процесс под наблюдением и его статистика"""
+
+    def __init__(self, name: str, args: list, start_delay: float = 0.0):
+        self.name = name
+        self.args = list(args)
+        self.start_delay = start_delay
+        self.process = None
+        self.started_at = None  # time.monotonic() запуска текущего процесса
+        self.total_uptime = 0.0
+        self.restarts = 0
+        self.last_exit = None
+        self.crash_loop = False
+        self._crashes = deque()  # время падений в пределах окна crash loop
+
+    @property
+    def uptime(self) -> float:
+        return time.monotonic() - self.started_at if self.started_at is not None else 0.0
+
+    def stats(self) -> dict:
+        return {
+            'running': self.process is not None,
+            'uptime': self.uptime,
+            'total_uptime': self.total_uptime + self.uptime,
+            'restarts': self.restarts,
+            'last_exit': self.last_exit,
+            'crash_loop': self.crash_loop,
+        }
+
+class Supervisor:
+    """Запускает процессы, перезапускает упавшие и останавливает все по сигналу"""
+
+    def __init__(self, children: list, restart_delay: float = RESTART_DELAY,
+                 max_restart_delay: float = MAX_RESTART_DELAY, stable_uptime: float = STABLE_UPTIME,
+                 crash_loop_restarts: int = CRASH_LOOP_RESTARTS, crash_loop_window: float = CRASH_LOOP_WINDOW,
+                 crash_loop_delay: float = CRASH_LOOP_DELAY, stop_timeout: float = STOP_TIMEOUT,
+                 report_interval: float = REPORT_INTERVAL):
+        self.children = children
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.stable_uptime = stable_uptime
+        self.crash_loop_restarts = crash_loop_restarts
+        self.crash_loop_window = crash_loop_window
+        self.crash_loop_delay = crash_loop_delay
+        self.stop_timeout = stop_timeout
+        self.report_interval = report_interval
+        self._stopping = None
+
+    def stop(self):
+        """Начинает штатную остановку всех процессов"""
+        if not self._stopping.is_set():
+            logger.info("🛑 Остановка ботов...")
+            self._stopping.set()
+
+    def report(self):
+        """Выводит аптайм и число перезапусков каждого процесса"""
+        for child in self.children:
+            stats = child.stats()
+            state = f"работает {_format_duration(stats['uptime'])}" if stats['running'] else 'остановлен'
+            logger.info(
+                f"📊 {child.name}: {state}, всего в работе {_format_duration(stats['total_uptime'])}, "
+                f"перезапусков {stats['restarts']}, последний код выхода {stats['last_exit']}"
+                + (', crash loop' if stats['crash_loop'] else '')
+            )
+
+    async def run(self):
+        """Работает до SIGTERM/SIGINT или вызова stop()"""
+        self._stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.stop)
+        loop.add_signal_handler(signal.SIGUSR1, self.report)
+        tasks = [asyncio.create_task(self._supervise(child)) for child in self.children]
+        reporter = asyncio.create_task(self._report_periodically())
+        try:
+            await self._stopping.wait()
+            await asyncio.gather(*(self._terminate(child) for child in self.children))
+            await asyncio.gather(*tasks)
+        finally:
+            reporter.cancel()
+            for task in tasks:
+                task.cancel()
+            for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGUSR1):
+                loop.remove_signal_handler(signum)
+        self.report()
+        logger.info("✅ Боты остановлены")
+
+    async def _sleep(self, seconds: float) -> bool:
+        """Ждет seconds секунд; True, если за это время началась остановка"""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), seconds)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _report_periodically(self):
+        while not await self._sleep(self.report_interval):
+            self.report()
+
+    async def _supervise(self, child: Child):
+        delay = self.restart_delay
+        if child.start_delay and await self._sleep(child.start_delay):
+            return
+        while not self._stopping.is_set():
+            uptime = 0.0
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *child.args,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    env={**os.environ, 'PYTHONUNBUFFERED': '1'},
+                    limit=LINE_LIMIT,
+                )
+            except OSError as e:
+                logger.error(f"❌ Ошибка при запуске {child.name}: {e}")
+            else:
+                child.process = process
+                child.started_at = time.monotonic()
+                logger.info(f"✅ {child.name} запущен (pid {process.pid})")
+                if self._stopping.is_set():
+                    await self._terminate(child)
+                await asyncio.gather(self._read(child, process.stdout), self._read(child, process.stderr))
+                child.last_exit = await process.wait()
+                uptime = child.uptime
+                child.total_uptime += uptime
+                child.process = None
+                child.started_at = None
+            if self._stopping.is_set():
+                logger.info(f"{child.name} остановлен с кодом {child.last_exit}")
+                return
+
+            now = time.monotonic()
+            if uptime >= self.stable_uptime:
+                delay = self.restart_delay
+                child.crash_loop = False
+                child._crashes.clear()
+            child._crashes.append(now)
+            while child._crashes[0] < now - self.crash_loop_window:
+                child._crashes.popleft()
+            if len(child._crashes) >= self.crash_loop_restarts:
+                child.crash_loop = True
+                wait = self.crash_loop_delay
+                logger.error(
+                    f"❌ {child.name} упал {len(child._crashes)} раз за {self.crash_loop_window:.0f} с, "
+                    f"следующая попытка через {wait:.0f} с"
+                )
+            else:
+                wait = delay
+                delay = min(delay * 2, self.max_restart_delay)
+            logger.error(
+                f"❌ {child.name} завершился с кодом {child.last_exit} после {uptime:.1f} с работы, "
+                f"перезапуск через {wait:.1f} с"
+            )
+            if await self._sleep(wait):
+                return
+            child.restarts += 1
+            logger.info(f"🔄 Перезапуск {child.name} (перезапусков: {child.restarts})")
+
+    async def _read(self, child: Child, stream: asyncio.StreamReader):
+        """Пересылает строки вывода процесса в лог до закрытия потока"""
+        while True:
+            try:
+                line = await stream.readline()
+            except ValueError:
+                logger.warning(f"[{child.name}] строка вывода длиннее {LINE_LIMIT} байт пропущена")
+                continue
+            if not line:
+                return
+            text = line.decode('utf-8', errors='replace').rstrip()
+            if text:
+                logger.info(f"[{child.name}] {text}")
+
+    async def _terminate(self, child: Child):
+        process = child.process
+        if process is None or process.returncode is not None:
+            return
+        try:
+            process.terminate()
+        except ProcessLookupError:
+            return
+        try:
+            await asyncio.wait_for(process.wait(), self.stop_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ {child.name} не остановился за {self.stop_timeout:.0f} с, завершаем принудительно")
+            process.kill()
+            await process.wait()
@@ -0,0 +1,75 @@
+"""Параллельная обработка обновлений с сохранением порядка для каждого пользователя.
+
+Обновления разных пользователей обрабатываются одновременно (не больше
+заданного числа), а обновления одного пользователя - строго по очереди, в
+порядке поступления, чтобы состояние ConversationHandler оставалось
+согласованным. Число параллельных обработчиков задается переменной
+<PREFIX>_CONCURRENT_UPDATES (BOT_ или ADMIN_BOT_), 1 - последовательная
+обработка, как раньше.
+"""
+import logging
+import os
+from collections import deque
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """До max_concurrent обработчиков одновременно, по одному на пользователя"""
+
+    def __init__(self, max_concurrent: int):
+        super().__init__(max_concurrent_updates=max_concurrent)
+        self.max_concurrent = max_concurrent
+        # Ключ пользователя -> обновления, ждущие за тем, что обрабатывается сейчас
+        self._queues = {}
+
+    @staticmethod
+    def _user_key(update: object):
+        if isinstance(update, Update):
+            if update.effective_user:
+                return ('user', update.effective_user.id)
+            if update.effective_chat:
+                return ('chat', update.effective_chat.id)
+        return None
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        key = self._user_key(update)
+        if key is None:
+            await coroutine
+            return
+
+        queue = self._queues.get(key)
+        if queue is not None:
+            # Обновление пользователя уже обрабатывается: встаем за ним в очередь и
+            # сразу освобождаем место, чтобы очередь одного пользователя не занимала
+            # места других. Очередь выполнит задача, которая обрабатывает первое.
+            queue.append(coroutine)
+            return
+
+        queue = self._queues[key] = deque()
+        try:
+            while coroutine is not None:
+                try:
+                    await coroutine
+                except Exception:
+                    logger.exception(f"Ошибка при обработке обновления {key}")
+                coroutine = queue.popleft() if queue else None
+        finally:
+            del self._queues[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+def update_processor_for(prefix: str, default: int = 16):
+    """Значение для ApplicationBuilder.concurrent_updates бота с префиксом prefix.
+
+    False оставляет последовательную обработку по умолчанию.
+    """
+    max_concurrent = int(os.getenv(f'{prefix}_CONCURRENT_UPDATES', str(default)))
+    if max_concurrent <= 1:
+        return False
+    return PerUserUpdateProcessor(max_concurrent)
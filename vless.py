@@ -0,0 +1,67 @@
+"""Разбор ключей VLESS из панели x-ui.
+
+Ключ имеет вид vless://<uuid>@<host>:<port>?type=tcp&security=reality&...#AmegaVPN-vpn-germany-23-user.
+Он разбирается один раз при загрузке в базу, а обработчики бота читают
+готовые столбцы vpn_keys.
+"""
+import re
+from typing import NamedTuple, Optional
+from urllib.parse import unquote
+
+# Префикс названия ключа, который x-ui добавляет к email клиента
+REMARK_PREFIX = 'AmegaVPN-'
+
+_VLESS_RE = re.compile(
+    r'vless://(?P<uuid>[^@/?#\s]+)@'
+    r'(?P<host>\[[0-9A-Fa-f:.]+\]|[^:/?#@\[\]\s]+)'
+    r':(?P<port>\d{1,5})'
+    r'/?(?:\?(?P<query>[^#\s]*))?'
+    r'(?:#(?P<fragment>\S*))?',
+    re.IGNORECASE
+)
+# Нужные параметры запроса; остальные (pbk, sid, fp...) не разбираются
+_PARAM_RE = re.compile(r'(?:^|&)(type|security|sni)=([^&]*)')
+
+def _unquote(value: str) -> str:
+    return unquote(value) if '%' in value else value
+
+class VlessKey(NamedTuple):
+    xui_id: str
+    xui_email: Optional[str]
+    host: str
+    port: int
+    location: Optional[str]
+    transport: str
+    security: Optional[str]
+    sni: Optional[str]
+
+def parse_vless(key: str) -> VlessKey:
+    """Разбирает ключ VLESS, при неверном формате выбрасывает ValueError"""
+    match = _VLESS_RE.fullmatch(key.strip())
+    if not match:
+        raise ValueError(f"Неверный формат ключа VLESS: {key[:80]!r}")
+    port = int(match['port'])
+    if not 0 < port < 65536:
+        raise ValueError(f"Неверный порт в ключе VLESS: {port}")
+    params = dict(_PARAM_RE.findall(match['query'] or ''))
+
+    xui_email = location = None
+    if match['fragment']:
+        xui_email = _unquote(match['fragment'])
+        if xui_email.startswith(REMARK_PREFIX):
+            xui_email = xui_email[len(REMARK_PREFIX):]
+        # Email клиента вида vpn-<локация>-<номер>-user
+        parts = xui_email.split('-')
+        if len(parts) > 1 and parts[0] == 'vpn' and parts[1]:
+            location = parts[1].lower()
+
+    return VlessKey(
+        xui_id=_unquote(match['uuid']),
+        xui_email=xui_email or None,
+        host=match['host'].strip('[]').lower(),
+        port=port,
+        location=location,
+        transport=_unquote(params.get('type', 'tcp')),
+        security=_unquote(params.get('security', '')) or None,
+        sni=_unquote(params.get('sni', '')) or None,
+    )
@@ -1,26 +1,124 @@
 import requests
+import httpx
+import asyncio
 import json
 import logging
 from typing import Optional, Dict, Any
 from datetime import datetime
 import os
+import threading
+import time
 
-# Создаем директорию для логов, если её нет
-os.makedirs('logs', exist_ok=True)
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/xui_api.log', encoding='utf-8'),
-        logging.StreamHandler()  # Также выводим в консоль
-    ]
-)
+# Обработчики и уровень логирования настраивает точка входа (bot.py), а не библиотека
 logger = logging.getLogger('XUIApi')
 
+# Время жизни индекса клиентов в секундах
+XUI_INDEX_TTL = float(os.getenv('XUI_INDEX_TTL', '60'))
+# Параметры асинхронного клиента: таймаут запроса, размер пула соединений, число повторов
+XUI_TIMEOUT = float(os.getenv('XUI_TIMEOUT', '10'))
+XUI_MAX_CONNECTIONS = int(os.getenv('XUI_MAX_CONNECTIONS', '10'))
+XUI_RETRIES = int(os.getenv('XUI_RETRIES', '3'))
+# Максимальная длина фрагмента ответа панели в логе
+XUI_LOG_EXCERPT = int(os.getenv('XUI_LOG_EXCERPT', '500'))
+
+class _Excerpt:
+    """Фрагмент ответа панели для лога.
+
+    Сериализуется и обрезается только при форматировании записи, поэтому
+    при выключенном уровне DEBUG ничего не стоит.
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        value = self.value
+        text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+        if len(text) <= XUI_LOG_EXCERPT:
+            return text
+        return f"{text[:XUI_LOG_EXCERPT]}... ({len(text)} символов)"
+
+def _redact_headers(headers: Dict[str, str]) -> Dict[str, str]:
+    return {name: '***' if name == 'X-UI-Token' else value for name, value in headers.items()}
+
+def _client_uuids(inbound: Dict[str, Any]) -> Dict[str, str]:
+    """Возвращает соответствие email -> UUID клиента из настроек inbound"""
+    try:
+        settings = inbound.get('settings') or '{}'
+        if isinstance(settings, str):
+            settings = json.loads(settings)
+        return {
+            client['email']: client['id']
+            for client in settings.get('clients', [])
+            if client.get('email') and client.get('id')
+        }
+    except (ValueError, TypeError, AttributeError):
+        return {}
+
+def _build_client_index(inbounds: list):
+    """Строит индексы clientStats по email и по xui_id из снимка inbounds/list"""
+    by_email = {}
+    by_id = {}
+    for inbound in inbounds:
+        uuids = _client_uuids(inbound)
+        for client in inbound.get('clientStats') or []:
+            client = dict(client, inboundId=client.get('inboundId', inbound.get('id')))
+            email = client.get('email')
+            if email:
+                by_email[email] = client
+            if client.get('id') is not None:
+                by_id[str(client['id'])] = client
+            if email in uuids:
+                by_id[uuids[email]] = client
+    return by_email, by_id
+
+def _client_status(client: Dict[str, Any]) -> Dict[str, Any]:
+    """Статус клиента в формате get_client_status по записи clientStats"""
+    used_bytes = client.get('up', 0) + client.get('down', 0)
+    total_gb = float(client.get('total', 0)) / (1024 * 1024 * 1024)  # Конвертируем байты в ГБ
+    used_gb = used_bytes / (1024 * 1024 * 1024)
+    remaining_gb = max(0, total_gb - used_gb)
+    return {
+        'status': 'active' if client.get('enable', True) else 'disabled',
+        'expiry': client.get('expiryTime', 0),
+        'total': client.get('total', 0),
+        'used': used_bytes,
+        'remaining': remaining_gb * (1024 * 1024 * 1024)
+    }
+
+def _client_traffic(stats: Dict[str, Any], email: str) -> Dict[str, int]:
+    """Трафик клиента в формате get_client_stats по ответу getClientStats"""
+    client_stats = (stats.get('obj') or {}).get(email, {})
+    return {
+        'up': client_stats.get('up', 0),
+        'down': client_stats.get('down', 0)
+    }
+
+def _clients_traffic(by_email: Dict[str, Any], by_id: Dict[str, Any], emails=None, xui_ids=None) -> Dict[str, Dict[str, Any]]:
+    """Трафик и срок нескольких клиентов из индекса.
+
+    Возвращает словарь {email или xui_id из запроса: данные клиента};
+    отсутствующие в панели клиенты пропускаются.
+    """
+    result = {}
+    lookups = [(email, by_email) for email in emails or []]
+    lookups += [(str(xui_id), by_id) for xui_id in xui_ids or []]
+    for identifier, index in lookups:
+        client = index.get(identifier)
+        if client is not None:
+            result[identifier] = {
+                'inbound_id': client.get('inboundId'),
+                'email': client.get('email'),
+                'up': client.get('up', 0),
+                'down': client.get('down', 0),
+                'total': client.get('total', 0),
+                'expiry': client.get('expiryTime', 0)
+            }
+    return result
+
 class XUIApi:
-    def __init__(self, host: str, port: int, username: str = None, password: str = None, token: str = None, prefix: str = None):
+    def __init__(self, host: str, port: int, username: str = None, password: str = None, token: str = None, prefix: str = None, index_ttl: float = None):
         self.prefix = prefix or os.getenv('XUI_PREFIX', '').strip('/')
         if self.prefix:
             self.base_url = f"https://{host}:{port}/{self.prefix}/panel"
@@ -28,13 +126,21 @@ class XUIApi:
             self.base_url = f"https://{host}:{port}/panel"
         self.token = token or os.getenv('XUI_TOKEN')
         self.session = requests.Session()
-        logger.info(f"Инициализация XUIApi с URL: {self.base_url} (токен: {self.token[:10]}...)")
+        # Индекс клиентов панели по email и по xui_id
+        self.index_ttl = index_ttl or XUI_INDEX_TTL
+        self._clients_by_email = {}
+        self._clients_by_id = {}
+        self._index_updated_at = None
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread = None
+        self._stop_refresh = threading.Event()
+        logger.info("Инициализация XUIApi с URL: %s (токен задан: %s)", self.base_url, bool(self.token))
 
-    def get_client_status(self, email: str, xui_id: str = None) -> Dict[str, Any]:
-        print(f"[DEBUG] Вызван get_client_status: email={email}, xui_id={xui_id}")
+    def _fetch_inbounds(self) -> Optional[list]:
+        """Загружает список inbounds панели, возвращает его или None при ошибке"""
         try:
             list_url = f"{self.base_url}/api/inbounds/list"
-            logger.debug(f"[get_client_status] URL: {list_url}, email: {email}, xui_id: {xui_id}")
+            logger.debug("[_fetch_inbounds] url=%s", list_url)
             
             headers = {
                 'Accept': 'application/json, text/plain, */*',
@@ -46,7 +152,8 @@ class XUIApi:
                 'Referer': f"{self.base_url}/",
                 'Connection': 'keep-alive'
             }
-            logger.debug(f"[get_client_status] Headers: {headers}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[_fetch_inbounds] headers=%s", _redact_headers(headers))
             
             response = self.session.get(
                 list_url,
@@ -54,76 +161,134 @@ class XUIApi:
                 verify=False,  # Отключаем проверку SSL для тестирования
                 allow_redirects=True  # Разрешаем редиректы
             )
-            logger.debug(f"[get_client_status] Response status: {response.status_code}")
-            logger.debug(f"[get_client_status] Response text: {response.text[:500]}...")  # Логируем только первые 500 символов
+            logger.debug("[_fetch_inbounds] status=%s bytes=%s", response.status_code, len(response.content))
             
             if response.status_code == 307:
-                logger.error("[get_client_status] Получен редирект - возможно, неверный токен или URL")
+                logger.error("[_fetch_inbounds] Получен редирект - возможно, неверный токен или URL")
                 return None
                 
             response.raise_for_status()
             
             if not response.text:
-                logger.error("[get_client_status] Получен пустой ответ от сервера")
+                logger.error("[_fetch_inbounds] Получен пустой ответ от сервера")
                 return None
                 
             try:
                 inbounds = response.json()
             except json.JSONDecodeError as e:
-                logger.error(f"[get_client_status] Ошибка при разборе JSON: {str(e)}")
-                logger.error(f"[get_client_status] Содержимое ответа: {response.text[:500]}...")
+                logger.error("[_fetch_inbounds] Ошибка при разборе JSON: %s; ответ: %s", e, _Excerpt(response.text))
                 return None
                 
-            logger.debug(f"[get_client_status] Полученные данные inbounds: {json.dumps(inbounds, indent=2)}")
+            logger.debug("[_fetch_inbounds] response=%s", _Excerpt(inbounds))
             
             if not isinstance(inbounds, dict):
-                logger.error(f"[get_client_status] Неверный формат ответа: {inbounds}")
+                logger.error("[_fetch_inbounds] Неверный формат ответа: %s", _Excerpt(inbounds))
                 return None
                 
             if not inbounds.get('success'):
-                logger.error(f"[get_client_status] Ошибка получения списка inbounds: {inbounds.get('msg', 'Неизвестная ошибка')}")
+                logger.error("[_fetch_inbounds] Ошибка получения списка inbounds: %s", inbounds.get('msg', 'Неизвестная ошибка'))
                 return None
-                
-            # Ищем клиента по email или id в поле clientStats
-            for inbound in inbounds.get('obj', []):
-                client_stats = inbound.get('clientStats', [])
-                for client in client_stats:
-                    found = False
-                    if client.get('email') == email:
-                        found = True
-                    if xui_id and client.get('id') == xui_id:
-                        found = True
-                    if found:
-                        real_email = client.get('email')
-                        logger.info(f"[get_client_status] Найден клиент с email {real_email} или id {xui_id}")
-                        # Используем данные из clientStats
-                        used_bytes = client.get('up', 0) + client.get('down', 0)
-                        total_gb = float(client.get('total', 0)) / (1024 * 1024 * 1024)  # Конвертируем байты в ГБ
-                        used_gb = used_bytes / (1024 * 1024 * 1024)
-                        remaining_gb = max(0, total_gb - used_gb)
-                        result = {
-                            'status': 'active' if client.get('enable', True) else 'disabled',
-                            'expiry': client.get('expiryTime', 0),
-                            'total': client.get('total', 0),
-                            'used': used_bytes,
-                            'remaining': remaining_gb * (1024 * 1024 * 1024)
-                        }
-                        logger.debug(f"[get_client_status] Результат для клиента: {json.dumps(result, indent=2)}")
-                        return result
-                        
-            logger.warning(f"[get_client_status] Клиент с email {email} или id {xui_id} не найден")
+            
+            return inbounds.get('obj') or []
+            
+        except Exception:
+            logger.exception("[_fetch_inbounds] Ошибка при получении списка inbounds")
             return None
+
+    def _index_is_fresh(self, max_age: float) -> bool:
+        updated_at = self._index_updated_at
+        return updated_at is not None and time.monotonic() - updated_at <= max_age
+
+    def refresh_client_index(self, max_age: float = None) -> bool:
+        """Перестраивает индекс клиентов по одному снимку inbounds/list.
+
+        Если задан max_age и индекс моложе его, панель не опрашивается: так
+        одновременные запросы при устаревшем индексе дают одно обращение к панели.
+        Возвращает False, если панель не ответила; тогда остается прежний индекс.
+        """
+        with self._refresh_lock:
+            if max_age is not None and self._index_is_fresh(max_age):
+                return True
+            inbounds = self._fetch_inbounds()
+            if inbounds is None:
+                return False
+            by_email, by_id = _build_client_index(inbounds)
+            # Замена словарей атомарна, читатели видят либо старый, либо новый индекс
+            self._clients_by_email = by_email
+            self._clients_by_id = by_id
+            self._index_updated_at = time.monotonic()
+            logger.info("[refresh_client_index] Индекс клиентов обновлен: %s клиентов", len(by_email))
+            return True
+
+    def invalidate_client_index(self):
+        """Помечает индекс устаревшим, следующий запрос статуса обновит его"""
+        self._index_updated_at = None
+
+    def _ensure_client_index(self):
+        if not self._index_is_fresh(self.index_ttl):
+            self.refresh_client_index(max_age=self.index_ttl)
+
+    def start_index_refresh(self, interval: float = None):
+        """Запускает фоновое обновление индекса клиентов раз в interval секунд"""
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            return
+        interval = interval or self.index_ttl
+        self._stop_refresh.clear()
+
+        def refresh_loop():
+            while not self._stop_refresh.is_set():
+                self.refresh_client_index()
+                self._stop_refresh.wait(interval)
+
+        self._refresh_thread = threading.Thread(target=refresh_loop, name='xui-index-refresh', daemon=True)
+        self._refresh_thread.start()
+
+    def stop_index_refresh(self):
+        """Останавливает фоновое обновление индекса клиентов"""
+        self._stop_refresh.set()
+        if self._refresh_thread:
+            self._refresh_thread.join(timeout=5)
+            self._refresh_thread = None
+
+    def get_client_status(self, email: str, xui_id: str = None, force_refresh: bool = False) -> Dict[str, Any]:
+        """Статус клиента из индекса; панель опрашивается не чаще раза за index_ttl"""
+        try:
+            if force_refresh:
+                self.refresh_client_index()
+            else:
+                self._ensure_client_index()
             
-        except Exception as e:
-            import traceback
-            logger.error(f"[get_client_status] Ошибка при получении статуса клиента: {str(e)}\n{traceback.format_exc()}")
+            # Ищем клиента по email или id в индексе clientStats
+            client = self._clients_by_email.get(email)
+            if client is None and xui_id:
+                client = self._clients_by_id.get(str(xui_id))
+            if client is None:
+                logger.warning("[get_client_status] Клиент не найден: email=%s xui_id=%s", email, xui_id)
+                return None
+            
+            logger.debug("[get_client_status] Найден клиент: email=%s xui_id=%s", client.get('email'), xui_id)
+            # Используем данные из clientStats
+            result = _client_status(client)
+            logger.debug("[get_client_status] result=%s", _Excerpt(result))
+            return result
+            
+        except Exception:
+            logger.exception("[get_client_status] Ошибка при получении статуса клиента")
             return None
 
+    def get_clients_stats(self, emails=None, xui_ids=None, force_refresh: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Трафик и срок многих клиентов по одному снимку inbounds/list"""
+        if force_refresh:
+            self.refresh_client_index()
+        else:
+            self._ensure_client_index()
+        return _clients_traffic(self._clients_by_email, self._clients_by_id, emails, xui_ids)
+
     def get_client_stats(self, inbound_id: int, email: str) -> Optional[Dict[str, int]]:
         """Получение статистики использования клиента"""
         try:
             stats_url = f"{self.base_url}/api/inbounds/getClientStats/{inbound_id}"
-            logger.debug(f"[get_client_stats] URL: {stats_url}, inbound_id: {inbound_id}, email: {email}")
+            logger.debug("[get_client_stats] url=%s inbound_id=%s email=%s", stats_url, inbound_id, email)
             response = self.session.get(
                 stats_url,
                 headers={
@@ -132,8 +297,7 @@ class XUIApi:
                     'X-UI-Token': self.token,
                 }
             )
-            logger.debug(f"[get_client_stats] Response status: {response.status_code}")
-            logger.debug(f"[get_client_stats] Response text: {response.text}")
+            logger.debug("[get_client_stats] status=%s bytes=%s", response.status_code, len(response.content))
             response.raise_for_status()
             if not response.text:
                 logger.error("[get_client_stats] Получен пустой ответ от сервера")
@@ -141,21 +305,187 @@ class XUIApi:
             try:
                 stats = response.json()
             except json.JSONDecodeError as e:
-                logger.error(f"[get_client_stats] Ошибка при разборе JSON: {str(e)}")
-                logger.error(f"[get_client_stats] Содержимое ответа: {response.text}")
+                logger.error("[get_client_stats] Ошибка при разборе JSON: %s; ответ: %s", e, _Excerpt(response.text))
                 return None
-            logger.debug(f"[get_client_stats] Полученные данные статистики: {json.dumps(stats, indent=2)}")
+            logger.debug("[get_client_stats] response=%s", _Excerpt(stats))
             if not stats.get('success'):
-                logger.error(f"[get_client_stats] Ошибка получения статистики: {stats}")
+                logger.error("[get_client_stats] Ошибка получения статистики: %s", _Excerpt(stats))
                 return None
-            client_stats = stats.get('obj', {}).get(email, {})
-            result = {
-                'up': client_stats.get('up', 0),
-                'down': client_stats.get('down', 0)
-            }
-            logger.debug(f"[get_client_stats] Статистика для клиента: {json.dumps(result, indent=2)}")
+            result = _client_traffic(stats, email)
+            logger.debug("[get_client_stats] result=%s", result)
             return result
-        except Exception as e:
-            import traceback
-            logger.error(f"[get_client_stats] Ошибка при получении статистики клиента: {str(e)}\n{traceback.format_exc()}")
-            return None 
\ No newline at end of file
+        except Exception:
+            logger.exception("[get_client_stats] Ошибка при получении статистики клиента")
+            return None
+
+
+class _RetryableResponse(Exception):
+    """Ответ панели 5xx, после которого запрос стоит повторить"""
+
+class AsyncXUIApi:
+    """Асинхронный клиент 3x-ui на httpx.AsyncClient.
+
+    Соединения с панелью переиспользуются, число одновременных запросов
+    ограничено размером пула, каждый запрос выполняется с таймаутом и
+    повторяется с экспоненциальной задержкой при сетевых ошибках и ответах 5xx.
+    Методы возвращают данные в том же виде, что и XUIApi.
+    """
+
+    def __init__(self, host: str, port: int, token: str = None, prefix: str = None, index_ttl: float = None,
+                 timeout: float = None, max_connections: int = None, retries: int = None,
+                 backoff: float = 0.5, http2: bool = False, scheme: str = 'https', verify: bool = False):
+        self.prefix = prefix or os.getenv('XUI_PREFIX', '').strip('/')
+        if self.prefix:
+            self.base_url = f"{scheme}://{host}:{port}/{self.prefix}/panel"
+        else:
+            self.base_url = f"{scheme}://{host}:{port}/panel"
+        self.token = token or os.getenv('XUI_TOKEN')
+        self.retries = XUI_RETRIES if retries is None else retries
+        self.backoff = backoff
+        max_connections = max_connections or XUI_MAX_CONNECTIONS
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("Пакет h2 не установлен, используется HTTP/1.1")
+                http2 = False
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={
+                'Accept': 'application/json, text/plain, */*',
+                'Content-Type': 'application/json',
+                'X-UI-Token': self.token or '',
+                'Origin': self.base_url,
+                'Referer': f"{self.base_url}/",
+            },
+            timeout=httpx.Timeout(timeout or XUI_TIMEOUT),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            http2=http2,
+            verify=verify,
+        )
+        self._semaphore = asyncio.Semaphore(max_connections)
+        # Индекс клиентов панели по email и по xui_id
+        self.index_ttl = index_ttl or XUI_INDEX_TTL
+        self._clients_by_email = {}
+        self._clients_by_id = {}
+        self._index_updated_at = None
+        self._refresh_lock = asyncio.Lock()
+        self._refresh_task = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        """Останавливает фоновое обновление индекса и закрывает пул соединений"""
+        await self.stop_index_refresh()
+        await self._client.aclose()
+
+    async def _get_json(self, path: str, timeout: float = None) -> Optional[Dict[str, Any]]:
+        """GET к API панели с повторами; возвращает ответ с success=true или None"""
+        request_timeout = httpx.USE_CLIENT_DEFAULT if timeout is None else timeout
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._semaphore:
+                    response = await self._client.get(path, timeout=request_timeout)
+                logger.debug("[%s] status=%s bytes=%s", path, response.status_code, len(response.content))
+                if response.status_code >= 500:
+                    raise _RetryableResponse(f"HTTP {response.status_code}")
+                if response.status_code == 307:
+                    logger.error("[%s] Получен редирект - возможно, неверный токен или URL", path)
+                    return None
+                response.raise_for_status()
+                data = response.json()
+            except (httpx.TransportError, _RetryableResponse) as e:
+                if attempt == self.retries:
+                    logger.error("[%s] Панель недоступна после %s попыток: %r", path, attempt + 1, e)
+                    return None
+                delay = self.backoff * 2 ** attempt
+                logger.warning("[%s] Ошибка запроса (%r), повтор через %.1f с", path, e, delay)
+                await asyncio.sleep(delay)
+                continue
+            except (httpx.HTTPStatusError, ValueError) as e:
+                logger.error("[%s] Ошибка ответа панели: %r", path, e)
+                return None
+            if not isinstance(data, dict) or not data.get('success'):
+                logger.error("[%s] Неуспешный ответ панели: %s", path, _Excerpt(data))
+                return None
+            return data
+        return None
+
+    def _index_is_fresh(self, max_age: float) -> bool:
+        updated_at = self._index_updated_at
+        return updated_at is not None and time.monotonic() - updated_at <= max_age
+
+    async def refresh_client_index(self, max_age: float = None, timeout: float = None) -> bool:
+        """Перестраивает индекс клиентов по одному снимку inbounds/list"""
+        async with self._refresh_lock:
+            if max_age is not None and self._index_is_fresh(max_age):
+                return True
+            inbounds = await self._get_json('/api/inbounds/list', timeout=timeout)
+            if inbounds is None:
+                return False
+            self._clients_by_email, self._clients_by_id = _build_client_index(inbounds.get('obj') or [])
+            self._index_updated_at = time.monotonic()
+            logger.info("[refresh_client_index] Индекс клиентов обновлен: %s клиентов", len(self._clients_by_email))
+            return True
+
+    def invalidate_client_index(self):
+        """Помечает индекс устаревшим, следующий запрос статуса обновит его"""
+        self._index_updated_at = None
+
+    def start_index_refresh(self, interval: float = None):
+        """Запускает фоновую задачу обновления индекса клиентов"""
+        if self._refresh_task and not self._refresh_task.done():
+            return
+        interval = interval or self.index_ttl
+
+        async def refresh_loop():
+            while True:
+                await self.refresh_client_index()
+                await asyncio.sleep(interval)
+
+        self._refresh_task = asyncio.get_running_loop().create_task(refresh_loop())
+
+    async def stop_index_refresh(self):
+        """Останавливает фоновую задачу обновления индекса клиентов"""
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    async def get_client_status(self, email: str, xui_id: str = None, force_refresh: bool = False,
+                                timeout: float = None) -> Optional[Dict[str, Any]]:
+        """Статус клиента из индекса; панель опрашивается не чаще раза за index_ttl"""
+        if force_refresh:
+            await self.refresh_client_index(timeout=timeout)
+        elif not self._index_is_fresh(self.index_ttl):
+            await self.refresh_client_index(max_age=self.index_ttl, timeout=timeout)
+        client = self._clients_by_email.get(email)
+        if client is None and xui_id:
+            client = self._clients_by_id.get(str(xui_id))
+        if client is None:
+            logger.warning("[get_client_status] Клиент не найден: email=%s xui_id=%s", email, xui_id)
+            return None
+        return _client_status(client)
+
+    async def get_clients_stats(self, emails=None, xui_ids=None, force_refresh: bool = False,
+                                timeout: float = None) -> Dict[str, Dict[str, Any]]:
+        """Трафик и срок многих клиентов по одному снимку inbounds/list"""
+        if force_refresh:
+            await self.refresh_client_index(timeout=timeout)
+        elif not self._index_is_fresh(self.index_ttl):
+            await self.refresh_client_index(max_age=self.index_ttl, timeout=timeout)
+        return _clients_traffic(self._clients_by_email, self._clients_by_id, emails, xui_ids)
+
+    async def get_client_stats(self, inbound_id: int, email: str, timeout: float = None) -> Optional[Dict[str, int]]:
+        """Получение статистики использования клиента"""
+        stats = await self._get_json(f'/api/inbounds/getClientStats/{inbound_id}', timeout=timeout)
+        if stats is None:
+            return None
+        return _client_traffic(stats, email)